@@ -0,0 +1,258 @@
+"""Admission control for write endpoints: rate limits and load shedding.
+
+Rate limits are token buckets in Redis, one per (rule, route, client IP) and
+one per (rule, route, wishlist_id cookie). A single Lua script refills and
+charges every bucket of a request atomically, using the Redis clock so all
+workers agree on time. A request that would overdraw any bucket is refused
+with 429 and Retry-After, and charges none of them. When Redis is
+unreachable, limits fail open, as the cache does.
+
+Load shedding applies to views that write to MySQL and is per worker. At
+most MAX_WRITES writes run at once, and a write is refused with 503 while
+fewer than READ_RESERVE pooled MySQL connections are free. Bursts of writes
+then queue in the client rather than in the pool, and reads keep their
+connections.
+"""
+import functools
+import ipaddress
+import logging
+import math
+import os
+import socket
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+try:
+    import metrics
+    import parts_service
+    from redis_client import get_async_redis, get_redis
+except Exception:
+    from app import metrics, parts_service
+    from app.redis_client import get_async_redis, get_redis
+
+log = logging.getLogger(__name__)
+
+
+def _parse_rule(spec: str) -> Tuple[int, float]:
+    # "N/S": N requests per S seconds, in bursts of up to N.
+    count, _, seconds = spec.partition('/')
+    return int(count), float(seconds or 1)
+
+
+ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'TRUE').upper() == 'TRUE'
+RULES: Dict[str, Tuple[int, float]] = {
+    'parts_write': _parse_rule(os.getenv('RATE_LIMIT_PARTS_WRITE', '30/60')),
+    'parts_bulk': _parse_rule(os.getenv('RATE_LIMIT_PARTS_BULK', '5/60')),
+    'favourite': _parse_rule(os.getenv('RATE_LIMIT_FAVOURITE', '120/60')),
+}
+# Proxies whose X-Real-IP header names the client: comma-separated
+# addresses, CIDRs or host names (e.g. "nginx"). From anyone else the
+# header is ignored, since a client could set it to get a fresh bucket.
+TRUSTED_PROXIES = [p.strip() for p in os.getenv('RATE_LIMIT_TRUSTED_PROXIES', '').split(',') if p.strip()]
+# Host names in TRUSTED_PROXIES are re-resolved this often (containers move).
+PROXY_RESOLVE_EVERY = 60.0
+BACKOFF = float(os.getenv('RATE_LIMIT_BACKOFF', '5'))
+
+MAX_WRITES = int(os.getenv('WRITE_CONCURRENCY', '4'))
+READ_RESERVE = int(os.getenv('WRITE_SHED_READ_RESERVE', '2'))
+SHED_RETRY_AFTER = 1
+
+KEY_PREFIX = 'ratelimit:'
+
+# KEYS: the buckets; ARGV: capacity, refill per ms, cost. Writing after
+# TIME relies on effects replication, the default since Redis 5.
+# Returns {allowed, retry after ms, tokens left in the emptiest bucket}.
+_BUCKET_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local levels = {}
+local wait = 0
+for i, key in ipairs(KEYS) do
+  local b = redis.call('HMGET', key, 'tokens', 'ts')
+  local tokens = tonumber(b[1]) or capacity
+  local ts = tonumber(b[2]) or now
+  tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+  levels[i] = tokens
+  if tokens < cost then
+    wait = math.max(wait, math.ceil((cost - tokens) / rate))
+  end
+end
+if wait > 0 then
+  return {0, wait, 0}
+end
+local ttl = math.ceil(capacity / rate)
+local left = capacity
+for i, key in ipairs(KEYS) do
+  redis.call('HSET', key, 'tokens', tostring(levels[i] - cost), 'ts', now)
+  redis.call('PEXPIRE', key, ttl)
+  left = math.min(left, levels[i] - cost)
+end
+return {1, 0, math.floor(left)}
+"""
+
+_scripts: Dict[int, object] = {}
+_down_until = 0.0
+
+
+def _script(r):
+    if id(r) not in _scripts:
+        _scripts[id(r)] = r.register_script(_BUCKET_SCRIPT)
+    return _scripts[id(r)]
+
+
+def _call(rule: str, route: str, ip: Optional[str], wishlist_id: Optional[str]):
+    """(keys, args) for the bucket script, or None when nothing is limited."""
+    if not ENABLED or rule not in RULES or time.monotonic() < _down_until:
+        return None
+    capacity, seconds = RULES[rule]
+    keys = []
+    if ip:
+        keys.append(f"{KEY_PREFIX}{rule}:{route}:ip:{ip}")
+    if wishlist_id:
+        keys.append(f"{KEY_PREFIX}{rule}:{route}:w:{wishlist_id}")
+    if not keys:
+        return None
+    return keys, [capacity, capacity / (seconds * 1000.0), 1]
+
+
+def _result(rule: str, reply) -> Optional[int]:
+    allowed, wait_ms = int(reply[0]), int(reply[1])
+    if allowed:
+        return None
+    metrics.ADMISSION_REJECTED.labels(rule, 'rate_limit').inc()
+    return max(1, math.ceil(wait_ms / 1000.0))
+
+
+def _fail():
+    global _down_until
+    _down_until = time.monotonic() + BACKOFF
+
+
+def check(rule: str, route: str, ip: Optional[str], wishlist_id: Optional[str] = None) -> Optional[int]:
+    """Charge one request; returns None if allowed, else seconds to wait."""
+    call = _call(rule, route, ip, wishlist_id)
+    if call is None:
+        return None
+    try:
+        r = get_redis()
+        return _result(rule, _script(r)(keys=call[0], args=call[1], client=r))
+    except Exception:
+        _fail()
+        return None
+
+
+async def check_async(rule: str, route: str, ip: Optional[str], wishlist_id: Optional[str] = None) -> Optional[int]:
+    """``check`` on the redis.asyncio client, for asgi.py."""
+    call = _call(rule, route, ip, wishlist_id)
+    if call is None:
+        return None
+    try:
+        r = get_async_redis()
+        return _result(rule, await _script(r)(keys=call[0], args=call[1], client=r))
+    except Exception:
+        _fail()
+        return None
+
+
+_proxy_networks: list = []
+_proxies_resolved_at = None
+
+
+def _trusted_networks():
+    global _proxy_networks, _proxies_resolved_at
+    now = time.monotonic()
+    if _proxies_resolved_at is not None and now - _proxies_resolved_at < PROXY_RESOLVE_EVERY:
+        return _proxy_networks
+    networks = []
+    for entry in TRUSTED_PROXIES:
+        try:
+            networks.append(ipaddress.ip_network(entry, strict=False))
+            continue
+        except ValueError:
+            pass
+        try:
+            for info in socket.getaddrinfo(entry, None):
+                networks.append(ipaddress.ip_network(info[4][0]))
+        except socket.gaierror:
+            log.warning("cannot resolve trusted proxy %s", entry)
+    _proxy_networks, _proxies_resolved_at = networks, now
+    return networks
+
+
+def _is_trusted_proxy(remote_addr: Optional[str]) -> bool:
+    if not TRUSTED_PROXIES or not remote_addr:
+        return False
+    try:
+        addr = ipaddress.ip_address(remote_addr)
+    except ValueError:
+        return False
+    return any(addr in net for net in _trusted_networks())
+
+
+def client_ip(headers, remote_addr: Optional[str]) -> Optional[str]:
+    if _is_trusted_proxy(remote_addr):
+        real = headers.get('X-Real-IP')
+        if real:
+            return real.strip()
+    return remote_addr
+
+
+class _WriteGate:
+    """Per-process cap on concurrent writes, plus the pool headroom check."""
+
+    def __init__(self, limit: int):
+        self._lock = threading.Lock()
+        self._limit = limit
+        self._active = 0
+
+    def enter(self) -> bool:
+        with self._lock:
+            if self._active >= self._limit or not _pool_has_headroom():
+                return False
+            self._active += 1
+            return True
+
+    def leave(self):
+        with self._lock:
+            self._active -= 1
+
+
+def _pool_has_headroom() -> bool:
+    stats = parts_service.pool_stats()
+    capacity = stats['size'] + stats['max_overflow']
+    return stats['in_use'] < capacity - READ_RESERVE
+
+
+_writes = _WriteGate(MAX_WRITES)
+
+
+def limit_writes(rule: str, shed: bool = True):
+    """Flask view decorator: rate-limit under ``rule``, then shed on overload.
+
+    Buckets are per route (method and URL rule), so a client that is
+    limited on one write endpoint can still use the others.
+    """
+    def decorate(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            from flask import jsonify, request
+            route = f"{request.method} {request.url_rule.rule if request.url_rule else request.path}"
+            retry_after = check(rule, route, client_ip(request.headers, request.remote_addr),
+                                request.cookies.get('wishlist_id'))
+            if retry_after:
+                return jsonify({'error': 'rate limit exceeded'}), 429, {'Retry-After': str(retry_after)}
+            if not shed:
+                return view(*args, **kwargs)
+            if not _writes.enter():
+                metrics.ADMISSION_REJECTED.labels(rule, 'overload').inc()
+                return jsonify({'error': 'server busy, retry shortly'}), 503, {'Retry-After': str(SHED_RETRY_AFTER)}
+            try:
+                return view(*args, **kwargs)
+            finally:
+                _writes.leave()
+        return wrapper
+    return decorate
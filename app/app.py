@@ -1,27 +1,129 @@
 import os
+import random
 import time
-from flask import Flask, render_template, request, redirect, url_for, abort, jsonify
-
-from parts_api import bp as parts_bp
+from contextlib import contextmanager
+from flask import Flask, Response, before_render_template, g, render_template, request, redirect, template_rendered, url_for, abort, jsonify
+from markupsafe import Markup
+
+from parts_api import bp as parts_bp, queue_image, save_image_upload
+import admission
+import db_router
+import health
+import images
+import location_stats
+import metrics
+import parts_cache
 import parts_service
 import wishlist_service
 
 app = Flask(__name__)
 app.register_blueprint(parts_bp)
 
+metrics.instrument_module(parts_service, 'parts_service', [
+    'list_parts', 'list_parts_page', 'list_parts_rows', 'get_part', 'get_parts', 'get_parts_rows', 'search_parts',
+    'create_part', 'create_parts', 'update_part', 'delete_part', 'validate_token',
+])
+metrics.instrument_module(wishlist_service, 'wishlist_service', [
+    'add_favorite', 'remove_favorite', 'list_favorites', 'is_favorite',
+    'add_favorites', 'remove_favorites', 'are_favorites', 'merge_wishlist', 'top_favorites',
+])
+
+
+@app.before_request
+def _metrics_start():
+    g.metrics_token = metrics.start_request()
+    g.metrics_started = time.perf_counter()
+
+
+@app.after_request
+def _metrics_finish(response):
+    token = g.pop('metrics_token', None)
+    if token is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.finish_request(token, request.method, route, response.status_code,
+                               time.perf_counter() - g.metrics_started)
+    return response
+
+
+# Read-your-writes: after a client's own write, its reads skip the replicas
+# until this cookie (a unix timestamp) has passed.
+RYW_COOKIE = 'db_rw_until'
+
+
+@app.before_request
+def _db_route_start():
+    try:
+        pinned = float(request.cookies.get(RYW_COOKIE, 0)) > time.time()
+    except ValueError:
+        pinned = False
+    g.db_route_tokens = db_router.start_request(pinned)
+
+
+@app.after_request
+def _db_route_finish(response):
+    tokens = g.pop('db_route_tokens', None)
+    if tokens is not None and db_router.finish_request(tokens):
+        window = parts_service.READ_YOUR_WRITES
+        response.set_cookie(RYW_COOKIE, f"{time.time() + window:.3f}", max_age=int(window) + 1,
+                            httponly=True, samesite='Lax')
+    return response
+
+
+@before_render_template.connect_via(app)
+def _template_start(sender, template, context, **extra):
+    g.setdefault('template_starts', []).append(time.perf_counter())
+
+
+@template_rendered.connect_via(app)
+def _template_done(sender, template, context, **extra):
+    starts = g.get('template_starts')
+    if starts:
+        metrics.TEMPLATE_RENDER.labels(template.name or 'inline').observe(time.perf_counter() - starts.pop())
 
+# Start dependency checks as soon as the worker imports the app
+health.ensure_started()
+
+
+@contextmanager
 def get_db_conn():
-    # Delegate to the service layer which handles MySQL connections
+    # Delegate to the service layer which hands out pooled MySQL connections
     try:
-        from parts_service import get_conn
+        from parts_service import connection
     except Exception:
-        from app.parts_service import get_conn
-    return get_conn()
+        from app.parts_service import connection
+    # Callers only read, so a replica may serve them
+    with connection(replica_ok=True) as conn:
+        yield conn
+
+
+# Rendered listing grids per worker, keyed by (listing version, limit).
+# Writers bump the version (parts_cache.LIST_VERSION_KEY), which retires
+# every cached grid; GRID_TTL bounds staleness if a bump is ever lost.
+GRID_TTL = float(os.getenv('GRID_CACHE_TTL', '60'))
+_grid_cache = {}
+
+
+def _listing_grid(limit: int = 50) -> Markup:
+    version = parts_cache.list_version()
+    if version is None:
+        # Redis is down, so writes cannot be observed; render fresh.
+        return Markup(render_template("_parts_grid.html", parts=parts_service.list_parts(limit=limit)))
+    key = (version, limit)
+    hit = _grid_cache.get(key)
+    now = time.monotonic()
+    if hit and hit[0] > now:
+        return hit[1]
+    html = Markup(render_template("_parts_grid.html", parts=parts_service.list_parts(limit=limit)))
+    # Keep only the current version around.
+    for stale in [k for k in _grid_cache if k[0] != version]:
+        _grid_cache.pop(stale, None)
+    _grid_cache[key] = (now + GRID_TTL, html)
+    return html
 
 
 @app.get("/")
 def index():
-    parts = parts_service.list_parts(limit=50)
+    grid = _listing_grid(limit=50)
     pending = request.args.get('pending')
     # ensure wishlist cookie and fetch wishlist items
     wid = request.cookies.get('wishlist_id')
@@ -34,17 +136,13 @@ def index():
         except Exception:
             wishlist = set()
 
-    # Fetch part details for items in wishlist to show in sidebar
-    wishlist_items = []
+    # Fetch part details for items in wishlist to show in sidebar (one batched query)
     try:
-        for pid in wishlist:
-            p = parts_service.get_part(int(pid))
-            if p:
-                wishlist_items.append(p)
+        wishlist_items = parts_service.get_parts(sorted(wishlist))
     except Exception:
         wishlist_items = []
 
-    resp = render_template("index.html", parts=parts, now=time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), pending=pending, wishlist=wishlist, wishlist_items=wishlist_items)
+    resp = render_template("index.html", grid=grid, now=time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), pending=pending, wishlist=wishlist, wishlist_items=wishlist_items)
     from flask import make_response
     response = make_response(resp)
     if not request.cookies.get('wishlist_id'):
@@ -61,6 +159,7 @@ def edit_part_get(part_id):
 
 
 @app.post('/parts/<int:part_id>/edit')
+@admission.limit_writes('parts_write')
 def edit_part_post(part_id):
     data = request.form.to_dict()
     if 'price' in data and data.get('price') not in (None, ''):
@@ -68,28 +167,44 @@ def edit_part_post(part_id):
             data['price'] = int(data['price'])
         except Exception:
             return "Price must be integer", 400
+    upload = save_image_upload()
+    if isinstance(upload, tuple):
+        return upload
     ok = parts_service.update_part(part_id, data)
     if not ok:
+        images.discard_upload(upload)
         abort(404)
+    if upload or images.needs_processing(data.get('image_url')):
+        queue_image(part_id, upload)
     return redirect(url_for('index'))
 
 
+@app.get('/livez')
+def livez():
+    # Liveness: the process is serving requests. Never touches dependencies.
+    return jsonify({"status": "ok"})
+
+
+@app.get('/readyz')
+def readyz():
+    # Readiness: cached results from the background checker (see health.py)
+    deps = health.snapshot()
+    ok = health.ready(deps)
+    return jsonify({"status": "ready" if ok else "unavailable", "dependencies": deps}), 200 if ok else 503
+
+
 @app.get('/healthz')
 def healthz():
-    conn = get_db_conn()
-    db_status = 'connected' if conn else 'unavailable'
-    if conn:
-        try:
-            cur = conn.cursor()
-            cur.execute("CREATE TABLE IF NOT EXISTS healthcheck (ts TIMESTAMP DEFAULT NOW())")
-            conn.commit()
-        except Exception:
-            db_status = 'error'
-        finally:
-            conn.close()
-    return jsonify({"status": "ok", "db": db_status})
+    deps = health.snapshot()
+    db_status = {'up': 'connected', 'down': 'unavailable'}.get(deps['mysql']['status'], deps['mysql']['status'])
+    return jsonify({"status": "ok", "db": db_status, "pool": parts_service.pool_stats(), "cache": parts_cache.stats()})
 
 
+@app.get('/metrics')
+def metrics_endpoint():
+    # Prometheus text format, aggregated across gunicorn workers
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
 
 
 @app.get('/validate/<token>')
@@ -106,24 +221,15 @@ def validate_token_route(token):
 
 @app.get('/parts/all')
 def parts_all():
-    conn = get_db_conn()
-    if not conn:
-        return jsonify({'error': 'db unavailable'}), 503
-    try:
-        cur = conn.cursor()
-        # Use location as a proxy for category and count distinct descriptions
-        cur.execute(
-            "SELECT location AS category, COUNT(DISTINCT description) AS distinct_descriptions"
-            " FROM parts GROUP BY location ORDER BY RAND()"
-        )
-        rows = []
-        for r in cur.fetchall():
-            rows.append({
-                'category': r[0],
-                'distinct_descriptions': int(r[1]) if r[1] is not None else 0,
-            })
-        return jsonify(rows)
-    finally:
-        conn.close()
+    with get_db_conn() as conn:
+        if not conn:
+            return jsonify({'error': 'db unavailable'}), 503
+        # Use location as a proxy for category; counts of distinct descriptions
+        # are maintained incrementally in part_location_stats.
+        rows = location_stats.read(conn)
+    random.shuffle(rows)
+    return jsonify(rows)
+
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=8000)
@@ -0,0 +1,387 @@
+"""Async serving mode: ``uvicorn asgi:app``.
+
+The index page and the read and wishlist routes of parts_api are served
+natively here, on async MySQL and Redis calls (async_service), so a worker
+keeps serving other requests while one waits on I/O, and independent
+lookups such as the listing and the wishlist run concurrently. Responses,
+cookies, ETags and cache keys match the Flask routes they replace.
+
+Everything else (writes, search, export, health and metrics) falls
+through to the unchanged Flask app, which runs in a thread pool. The sync
+gunicorn service keeps running alongside and both share MySQL and Redis;
+keep ``/parts/stream`` on gunicorn, since through the thread pool every
+SSE client would hold one of the ASGI_WSGI_THREADS threads.
+"""
+import asyncio
+import contextlib
+import json
+import os
+import time
+
+from a2wsgi import WSGIMiddleware
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from markupsafe import Markup
+from starlette.applications import Starlette
+from starlette.exceptions import HTTPException
+from starlette.responses import HTMLResponse, JSONResponse, Response
+from starlette.routing import Mount, Route
+from starlette.staticfiles import StaticFiles
+from werkzeug.http import http_date, parse_date, parse_etags
+
+from app import app as flask_app
+import admission
+import async_service
+import metrics
+import parts_api
+import parts_cache
+import parts_json
+import redis_client
+import wishlist_service
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# Threads for the mounted Flask app; its handlers block.
+WSGI_THREADS = int(os.getenv('ASGI_WSGI_THREADS', '10'))
+WISHLIST_MAX_AGE = 60 * 60 * 24 * 365
+GRID_TTL = float(os.getenv('GRID_CACHE_TTL', '60'))
+
+templates = Environment(
+    loader=FileSystemLoader(os.path.join(HERE, 'templates')),
+    autoescape=select_autoescape(['html']),
+    enable_async=True,
+)
+
+metrics.instrument_module(async_service, 'parts_service', [
+    'list_parts_page', 'list_parts_rows', 'facet_counts', 'get_part', 'get_parts', 'get_parts_rows',
+])
+metrics.instrument_module(async_service, 'wishlist_service', [
+    'add_favorite', 'remove_favorite', 'add_favorites', 'remove_favorites',
+    'list_favorites', 'are_favorites', 'merge_wishlist', 'top_favorites',
+])
+
+
+class FlaskJSON(JSONResponse):
+    # Same body as flask.jsonify in production: sorted keys, compact.
+    def render(self, content) -> bytes:
+        return (json.dumps(content, sort_keys=True, separators=(',', ':')) + '\n').encode()
+
+
+def _json(content, status_code=200, headers=None):
+    return FlaskJSON(content, status_code=status_code, headers=headers)
+
+
+def instrumented(rule):
+    """Per-request metrics under the Flask rule name, as app.py records them."""
+    def decorate(handler):
+        async def endpoint(request):
+            token = metrics.start_request()
+            started = time.perf_counter()
+            status = 500
+            try:
+                response = await handler(request)
+                status = response.status_code
+                return response
+            except HTTPException as e:
+                status = e.status_code
+                raise
+            finally:
+                metrics.finish_request(token, request.method, rule, status, time.perf_counter() - started)
+        return endpoint
+    return decorate
+
+
+async def _render(name, **context) -> str:
+    started = time.perf_counter()
+    try:
+        return await templates.get_template(name).render_async(**context)
+    finally:
+        metrics.TEMPLATE_RENDER.labels(name).observe(time.perf_counter() - started)
+
+
+def _not_modified(request, etag, last_modified=None) -> bool:
+    if_none_match = parse_etags(request.headers.get('if-none-match'))
+    if if_none_match:
+        return if_none_match.contains_weak(etag)
+    since = parse_date(request.headers.get('if-modified-since'))
+    if last_modified and since:
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+
+def _validators(etag, cache_control, last_modified=None):
+    headers = {'ETag': f'"{etag}"', 'Cache-Control': cache_control}
+    if last_modified:
+        headers['Last-Modified'] = http_date(last_modified)
+    return headers
+
+
+def _set_wishlist_cookie(response, wid):
+    response.set_cookie('wishlist_id', wid, max_age=WISHLIST_MAX_AGE, samesite=None)
+
+
+async def _rate_limited(request, rule, route):
+    """A 429 response if the client is over ``rule`` (see admission), else None."""
+    retry_after = await admission.check_async(
+        rule, f"{request.method} {route}",
+        admission.client_ip(request.headers, request.client.host if request.client else None),
+        request.cookies.get('wishlist_id'))
+    if retry_after:
+        return _json({'error': 'rate limit exceeded'}, 429, headers={'Retry-After': str(retry_after)})
+    return None
+
+
+def _fields(request):
+    """(fields, None), or (None, 400 response) for unknown fields; see parts_api.fields_arg."""
+    try:
+        return parts_api.fields_arg(request.query_params), None
+    except ValueError as e:
+        return None, _json(parts_api.fields_error(e), 400)
+
+
+def _raw_json(body: str, headers=None):
+    return Response(body, media_type='application/json', headers=headers)
+
+
+def _int_arg(request, name):
+    value = request.query_params.get(name)
+    return int(value) if value not in (None, '') else None
+
+
+# Rendered grids keyed by (listing version, limit); see app._listing_grid.
+_grid_cache = {}
+
+
+async def _listing_grid(limit: int = 50) -> Markup:
+    version = await parts_cache.list_version_async()
+    if version is None:
+        return Markup(await _render('_parts_grid.html', parts=await async_service.list_parts(limit=limit)))
+    key = (version, limit)
+    hit = _grid_cache.get(key)
+    now = time.monotonic()
+    if hit and hit[0] > now:
+        return hit[1]
+    html = Markup(await _render('_parts_grid.html', parts=await async_service.list_parts(limit=limit)))
+    for stale in [k for k in _grid_cache if k[0] != version]:
+        _grid_cache.pop(stale, None)
+    _grid_cache[key] = (now + GRID_TTL, html)
+    return html
+
+
+async def _wishlist_with_items(wid):
+    if not wid:
+        return set(), []
+    try:
+        wishlist = await async_service.list_favorites(wid)
+    except Exception:
+        return set(), []
+    try:
+        return wishlist, await async_service.get_parts(sorted(wishlist))
+    except Exception:
+        return wishlist, []
+
+
+@instrumented('/')
+async def index(request):
+    wid = request.cookies.get('wishlist_id')
+    # The listing and the wishlist are independent: fetch them concurrently.
+    grid, (wishlist, wishlist_items) = await asyncio.gather(
+        _listing_grid(limit=50), _wishlist_with_items(wid))
+    html = await _render(
+        'index.html', grid=grid, now=time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        pending=request.query_params.get('pending'), wishlist=wishlist, wishlist_items=wishlist_items)
+    response = HTMLResponse(html)
+    if not wid:
+        _set_wishlist_cookie(response, wishlist_service.new_wishlist_id())
+    return response
+
+
+@instrumented('/parts')
+async def parts_list(request):
+    try:
+        limit = int(request.query_params.get('limit', parts_api.DEFAULT_PAGE_SIZE))
+        min_price = _int_arg(request, 'min_price')
+        max_price = _int_arg(request, 'max_price')
+    except Exception:
+        return _json({'error': 'limit, min_price and max_price must be integers'}, 400)
+    fields, error = _fields(request)
+    if error:
+        return error
+    limit = max(1, min(limit, parts_api.MAX_PAGE_SIZE))
+    location = request.query_params.get('location') or None
+    cursor = request.query_params.get('cursor')
+    want_facets = not cursor and request.query_params.get('facets') not in ('0', 'false', 'no')
+    filters = dict(limit=limit, cursor=cursor, location=location, min_price=min_price, max_price=max_price)
+
+    async def no_facets():
+        return None
+
+    try:
+        # The page and the facet counts do not depend on each other.
+        (parts, next_cursor), facets = await asyncio.gather(
+            async_service.list_parts_rows(fields, **filters) if fields else async_service.list_parts_page(**filters),
+            async_service.facet_counts(location, min_price, max_price) if want_facets else no_facets(),
+        )
+    except ValueError:
+        return _json({'error': 'invalid cursor'}, 400)
+    if fields:
+        etag = parts_api.rows_etag(fields, limit, next_cursor, facets, parts)
+        headers = _validators(etag, parts_api.LIST_CACHE_CONTROL)
+        if _not_modified(request, etag):
+            return Response(status_code=304, headers=headers)
+        return _raw_json(parts_json.page_body(fields, parts, next_cursor, facets), headers=headers)
+    etag = parts_api.list_etag(limit, next_cursor, facets, parts)
+    headers = _validators(etag, parts_api.LIST_CACHE_CONTROL)
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    body = {'items': parts, 'next': next_cursor}
+    if facets is not None:
+        body['facets'] = facets
+    return _json(body, headers=headers)
+
+
+@instrumented('/parts/popular')
+async def parts_popular(request):
+    try:
+        limit = int(request.query_params.get('limit', parts_api.DEFAULT_POPULAR))
+    except ValueError:
+        return _json({'error': 'limit must be an integer'}, 400)
+    limit = max(1, min(limit, parts_api.MAX_POPULAR))
+    location = request.query_params.get('location')
+    try:
+        top = await async_service.top_favorites(limit * 2, location)
+    except Exception:
+        return _json({'error': 'leaderboard unavailable'}, 503)
+    counts = dict(top)
+    items = (await async_service.get_parts([pid for pid, _ in top], validated_only=True))[:limit]
+    for p in items:
+        p['favourites'] = counts[p['id']]
+    return _json({'items': items, 'location': location}, headers={'Cache-Control': 'public, max-age=30'})
+
+
+@instrumented('/parts/<int:part_id>')
+async def parts_get(request):
+    fields, error = _fields(request)
+    if error:
+        return error
+    p = await async_service.get_part(request.path_params['part_id'])
+    if not p:
+        raise HTTPException(404)
+    etag = parts_api.part_etag(p, fields)
+    last_modified = parts_api.parse_ts(p.get('updated_at'))
+    headers = _validators(etag, parts_api.ITEM_CACHE_CONTROL, last_modified)
+    if _not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+    return _json(parts_json.project(p, fields) if fields else p, headers=headers)
+
+
+@instrumented('/parts/<int:part_id>/favourite')
+async def parts_favourite(request):
+    limited = await _rate_limited(request, 'favourite', '/parts/<int:part_id>/favourite')
+    if limited:
+        return limited
+    part_id = request.path_params['part_id']
+    wid = request.cookies.get('wishlist_id')
+    created = not wid
+    if created:
+        wid = wishlist_service.new_wishlist_id()
+    part = await async_service.get_part(part_id)
+    await async_service.add_favorite(wid, part_id, part.get('location') if part else None)
+    response = _json({'id': part_id, 'favorited': True})
+    if created:
+        _set_wishlist_cookie(response, wid)
+    return response
+
+
+@instrumented('/parts/<int:part_id>/favourite')
+async def parts_unfavourite(request):
+    limited = await _rate_limited(request, 'favourite', '/parts/<int:part_id>/favourite')
+    if limited:
+        return limited
+    part_id = request.path_params['part_id']
+    wid = request.cookies.get('wishlist_id')
+    if wid:
+        await async_service.remove_favorite(wid, part_id)
+    return _json({'id': part_id, 'favorited': False})
+
+
+@instrumented('/wishlist')
+async def get_wishlist(request):
+    wid = request.cookies.get('wishlist_id')
+    ids_arg = request.query_params.get('ids')
+    if not wid:
+        return _json({} if ids_arg else [])
+    if ids_arg:
+        try:
+            ids = [int(x) for x in ids_arg.split(',') if x.strip()]
+        except Exception:
+            return _json({'error': 'ids must be integers'}, 400)
+        return _json({str(k): v for k, v in (await async_service.are_favorites(wid, ids)).items()})
+    vals = sorted(await async_service.list_favorites(wid))
+    if request.query_params.get('expand') in ('1', 'true', 'yes'):
+        fields, error = _fields(request)
+        if error:
+            return error
+        if fields:
+            return _raw_json(parts_json.list_body(fields, await async_service.get_parts_rows(vals, fields)))
+        return _json(await async_service.get_parts(vals))
+    return _json(vals)
+
+
+@instrumented('/wishlist')
+async def update_wishlist(request):
+    limited = await _rate_limited(request, 'favourite', '/wishlist')
+    if limited:
+        return limited
+    try:
+        data = await request.json()
+    except Exception:
+        data = None
+    data = data if isinstance(data, dict) else {}
+    wid = request.cookies.get('wishlist_id')
+    created = not wid
+    if created:
+        wid = wishlist_service.new_wishlist_id()
+    try:
+        add = [int(x) for x in data.get('add') or []]
+        remove = [int(x) for x in data.get('remove') or []]
+    except Exception:
+        return _json({'error': 'add/remove must be lists of integers'}, 400)
+    locations = {p['id']: p.get('location') for p in await async_service.get_parts(add)} if add else {}
+    # Sequential on purpose: an id in both lists ends up removed, as in Flask.
+    out = {
+        'added': await async_service.add_favorites(wid, add, locations),
+        'removed': await async_service.remove_favorites(wid, remove),
+    }
+    if data.get('merge'):
+        out['size'] = await async_service.merge_wishlist(str(data['merge']), wid, delete_source=False)
+    response = _json(out)
+    if created:
+        _set_wishlist_cookie(response, wid)
+    return response
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    await async_service.start()
+    try:
+        yield
+    finally:
+        await async_service.close()
+        await redis_client.close_async_redis()
+
+
+routes = [
+    Route('/', index, methods=['GET']),
+    Route('/parts', parts_list, methods=['GET']),
+    Route('/parts/popular', parts_popular, methods=['GET']),
+    Route('/parts/{part_id:int}', parts_get, methods=['GET']),
+    Route('/parts/{part_id:int}/favourite', parts_favourite, methods=['POST']),
+    Route('/parts/{part_id:int}/favourite', parts_unfavourite, methods=['DELETE']),
+    Route('/wishlist', get_wishlist, methods=['GET']),
+    Route('/wishlist', update_wishlist, methods=['POST']),
+    Mount('/static', StaticFiles(directory=os.path.join(HERE, 'static')), name='static'),
+    # Anything not matched above (including other methods on the same
+    # paths) is handled by Flask.
+    Mount('/', WSGIMiddleware(flask_app, workers=WSGI_THREADS)),
+]
+
+app = Starlette(routes=routes, lifespan=lifespan)
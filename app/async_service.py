@@ -0,0 +1,331 @@
+"""Async read paths for the ASGI app (see asgi.py).
+
+Counterparts of the parts_service reads and wishlist_service calls that the
+async routes need. SQL, cache keys, Lua scripts and result shapes all come
+from those modules, so the sync and async apps serve the same data and
+invalidate each other's cache entries.
+
+MySQL is reached through one aiomysql pool per worker process, on the
+primary only: replica routing (db_router) stays with the sync app, and
+reading from the primary trivially keeps read-your-writes. Redis uses the
+process's ``redis.asyncio`` client.
+"""
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+try:
+    import metrics
+    import parts_cache
+    import parts_service
+    import wishlist_service
+    from redis_client import get_async_redis
+except Exception:
+    from app import metrics, parts_cache, parts_service, wishlist_service
+    from app.redis_client import get_async_redis
+
+DBUnavailable = parts_service.DBUnavailable
+
+# One event loop serves many requests at once, so the pool is larger than
+# a sync worker's; keep POOL_SIZE x workers under MySQL's max_connections.
+POOL_MIN = int(os.getenv('DB_ASYNC_POOL_MIN', '1'))
+POOL_SIZE = int(os.getenv('DB_ASYNC_POOL_SIZE', '20'))
+POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '5'))
+POOL_RECYCLE = int(float(os.getenv('DB_POOL_MAX_IDLE', '300')))
+
+_pool = None
+_pool_lock: Optional[asyncio.Lock] = None
+
+
+async def _get_pool():
+    global _pool, _pool_lock
+    if _pool is not None:
+        return _pool
+    if _pool_lock is None:
+        _pool_lock = asyncio.Lock()
+    async with _pool_lock:
+        if _pool is None:
+            import aiomysql
+            s = parts_service.DB_SETTINGS
+            _pool = await aiomysql.create_pool(
+                host=s['host'], port=s['port'], user=s['user'], password=s['password'], db=s['database'],
+                minsize=POOL_MIN, maxsize=POOL_SIZE, pool_recycle=POOL_RECYCLE,
+                # Every statement stands alone, like the sync pool's rollback on checkin.
+                autocommit=True,
+                connect_timeout=POOL_TIMEOUT,
+            )
+    return _pool
+
+
+async def start():
+    """Open the pool early so the first requests do not pay for it."""
+    try:
+        await _get_pool()
+    except Exception as e:
+        print(f"[async_service] DB not available yet: {e}")
+
+
+async def close():
+    global _pool
+    if _pool is not None:
+        _pool.close()
+        await _pool.wait_closed()
+        _pool = None
+
+
+def pool_stats() -> Dict[str, Any]:
+    if _pool is None:
+        return {'size': 0, 'idle': 0, 'max': POOL_SIZE}
+    return {'size': _pool.size, 'idle': _pool.freesize, 'max': _pool.maxsize}
+
+
+@asynccontextmanager
+async def connection():
+    """Async ``parts_service.connection``: yields None when the DB is down
+    or the pool stays exhausted for POOL_TIMEOUT seconds."""
+    try:
+        pool = await _get_pool()
+        conn = await asyncio.wait_for(pool.acquire(), POOL_TIMEOUT)
+    except Exception:
+        conn = None
+    if conn is None:
+        yield None
+        return
+    try:
+        yield conn
+    except BaseException:
+        conn.close()
+        raise
+    finally:
+        pool.release(conn)
+
+
+async def _fetch(conn, sql: str, params: tuple, one: bool = False):
+    started = time.perf_counter()
+    try:
+        async with conn.cursor() as cur:
+            await cur.execute(sql, params)
+            return await (cur.fetchone() if one else cur.fetchall())
+    finally:
+        metrics.record_query(time.perf_counter() - started)
+
+
+async def _query(sql: str, params: tuple, one: bool = False):
+    async with connection() as conn:
+        if not conn:
+            raise DBUnavailable()
+        return await _fetch(conn, sql, params, one)
+
+
+# --- parts -----------------------------------------------------------------
+
+async def _load_parts_page(limit, cursor, location=None, min_price=None, max_price=None):
+    sql, params, page = parts_service.page_query(limit, cursor, location, min_price, max_price)
+    return parts_service.page_result(await _query(sql, params), limit, page)
+
+
+async def list_parts_page(
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    location: Optional[str] = None,
+    min_price: Optional[int] = None,
+    max_price: Optional[int] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """See ``parts_service.list_parts_page``."""
+    page = parts_service.decode_cursor(cursor)[2] if cursor else 0
+    filters = (location, min_price, max_price)
+    try:
+        version = await _cache_version(limit, page, *filters)
+        if version is None:
+            return await _load_parts_page(limit, cursor, *filters)
+        return await _cached_parts_page(version, limit, cursor, *filters)
+    except DBUnavailable:
+        return [], None
+
+
+async def _cache_version(limit, page, location, min_price, max_price) -> Optional[int]:
+    """See ``parts_service._cache_version``."""
+    if page >= parts_cache.LIST_PAGES or limit not in parts_service.CACHE_LIMITS \
+            or not parts_service.cacheable_prices(min_price, max_price):
+        return None
+    version = await parts_cache.list_version_async()
+    if version is None or (location is not None and not parts_service.known_location(location, await facet_counts())):
+        return None
+    return version
+
+
+async def _cached_parts_page(version, limit, cursor, location, min_price, max_price):
+    async def load():
+        items, next_cursor = await _load_parts_page(limit, cursor, location, min_price, max_price)
+        return {'items': items, 'next': next_cursor}
+
+    key = parts_cache.list_page_key(version, limit, cursor, parts_service.filters_key(location, min_price, max_price))
+    cached = await parts_cache.read_through_async(key, load, parts_cache.LIST_TTL)
+    return cached['items'], cached['next']
+
+
+async def list_parts(limit: int = 100, cursor: Optional[str] = None) -> List[Dict[str, Any]]:
+    return (await list_parts_page(limit, cursor))[0]
+
+
+async def list_parts_rows(
+    fields: Tuple[str, ...],
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    location: Optional[str] = None,
+    min_price: Optional[int] = None,
+    max_price: Optional[int] = None,
+) -> Tuple[List[tuple], Optional[str]]:
+    """See ``parts_service.list_parts_rows``."""
+    page = parts_service.decode_cursor(cursor)[2] if cursor else 0
+    filters = (location, min_price, max_price)
+    try:
+        version = await _cache_version(limit, page, *filters)
+        if version is not None:
+            items, next_cursor = await _cached_parts_page(version, limit, cursor, *filters)
+            return parts_service.project_parts(items, fields), next_cursor
+        sql, params, page = parts_service.page_query(
+            limit, cursor, *filters, columns=parts_service.projected_columns(fields))
+        return parts_service.projected_page_result(await _query(sql, params), limit, page)
+    except DBUnavailable:
+        return [], None
+
+
+async def _load_facets(location, min_price, max_price):
+    queries = parts_service.facet_queries(location, min_price, max_price)
+    # Two connections, so the facets cost one round trip instead of two.
+    location_rows, price_rows = await asyncio.gather(
+        _query(*queries['location']), _query(*queries['price']))
+    return parts_service.facets_result(location_rows, price_rows)
+
+
+async def facet_counts(location=None, min_price=None, max_price=None) -> Optional[Dict[str, List[Dict[str, Any]]]]:
+    """See ``parts_service.facet_counts``."""
+    filters = (location, min_price, max_price)
+    try:
+        version = await parts_cache.list_version_async() if parts_service.cacheable_prices(min_price, max_price) else None
+        if version is not None and location is not None and \
+                not parts_service.known_location(location, await facet_counts()):
+            version = None
+        if version is None:
+            return await _load_facets(*filters)
+        return await parts_cache.read_through_async(
+            parts_cache.facets_key(version, parts_service.filters_key(*filters) or 'all'),
+            lambda: _load_facets(*filters),
+            parts_cache.LIST_TTL,
+        )
+    except DBUnavailable:
+        return None
+
+
+async def get_part(part_id: int) -> Optional[Dict[str, Any]]:
+    """See ``parts_service.get_part``."""
+    async def load():
+        return parts_service.part_result(await _query(parts_service.PART_QUERY, (part_id,), one=True))
+
+    try:
+        return await parts_cache.read_through_async(
+            parts_cache.part_key(part_id), load, parts_cache.PART_TTL,
+            negative_ttl=parts_cache.NEGATIVE_TTL, generation=parts_cache.part_generation_key(part_id),
+        )
+    except DBUnavailable:
+        return None
+
+
+async def get_parts(ids: Iterable[Any], validated_only: bool = False) -> List[Dict[str, Any]]:
+    """See ``parts_service.get_parts``."""
+    wanted = parts_service.unique_ids(ids)
+    if not wanted:
+        return []
+    found: Dict[int, Dict[str, Any]] = {}
+    async with connection() as conn:
+        if not conn:
+            return []
+        for sql, params in parts_service.parts_queries(wanted, validated_only):
+            for r in await _fetch(conn, sql, params):
+                found[r[0]] = parts_service._row_to_dict(r)
+    return [found[pid] for pid in wanted if pid in found]
+
+
+async def get_parts_rows(ids: Iterable[Any], fields: Tuple[str, ...], validated_only: bool = False) -> List[tuple]:
+    """See ``parts_service.get_parts_rows``."""
+    wanted = parts_service.unique_ids(ids)
+    if not wanted:
+        return []
+    found: Dict[int, tuple] = {}
+    async with connection() as conn:
+        if not conn:
+            return []
+        for sql, params in parts_service.parts_queries(wanted, validated_only, parts_service.projected_columns(fields)):
+            for r in await _fetch(conn, sql, params):
+                found[r[0]] = r
+    return [found[pid] for pid in wanted if pid in found]
+
+
+# --- wishlists -------------------------------------------------------------
+
+async def _change(script: str, wishlist_id: str, part_ids: Iterable[int],
+                  locations: Optional[Dict[int, str]] = None) -> int:
+    call = wishlist_service.change_call(wishlist_id, part_ids, locations)
+    if call is None:
+        return 0
+    r = get_async_redis()
+    return await wishlist_service._script(r, script)(keys=call[0], args=call[1], client=r)
+
+
+async def add_favorite(wishlist_id: str, part_id: int, location: Optional[str] = None) -> bool:
+    return await _change(wishlist_service._ADD_SCRIPT, wishlist_id, [part_id], {int(part_id): location}) == 1
+
+
+async def remove_favorite(wishlist_id: str, part_id: int) -> bool:
+    return await _change(wishlist_service._REMOVE_SCRIPT, wishlist_id, [part_id]) == 1
+
+
+async def add_favorites(wishlist_id: str, part_ids: Iterable[int],
+                        locations: Optional[Dict[int, str]] = None) -> int:
+    return await _change(wishlist_service._ADD_SCRIPT, wishlist_id, part_ids, locations)
+
+
+async def remove_favorites(wishlist_id: str, part_ids: Iterable[int]) -> int:
+    return await _change(wishlist_service._REMOVE_SCRIPT, wishlist_id, part_ids)
+
+
+async def list_favorites(wishlist_id: str) -> Set[int]:
+    vals = await get_async_redis().smembers(wishlist_service.wishlist_key(wishlist_id)) or set()
+    return set(int(x) for x in vals)
+
+
+async def are_favorites(wishlist_id: str, part_ids: Iterable[int]) -> Dict[int, bool]:
+    ids = [int(p) for p in part_ids]
+    if not ids:
+        return {}
+    key = wishlist_service.wishlist_key(wishlist_id)
+    pipe = get_async_redis().pipeline(transaction=False)
+    for pid in ids:
+        pipe.sismember(key, pid)
+    return {pid: bool(flag) for pid, flag in zip(ids, await pipe.execute())}
+
+
+async def merge_wishlist(source_id: str, target_id: str, delete_source: bool = True) -> int:
+    r = get_async_redis()
+    if source_id == target_id:
+        return await r.scard(wishlist_service.wishlist_key(target_id))
+    return await wishlist_service._script(r, wishlist_service._MERGE_SCRIPT)(
+        keys=[wishlist_service.wishlist_key(target_id), wishlist_service.POPULAR_KEY,
+              wishlist_service.POPULAR_LOCATIONS, wishlist_service.wishlist_key(source_id)],
+        args=[wishlist_service.POPULAR_LOCATION_PREFIX, '1' if delete_source else '0'],
+        client=r,
+    )
+
+
+async def top_favorites(limit: int = 10, location: Optional[str] = None) -> List[Tuple[int, int]]:
+    key = wishlist_service.POPULAR_KEY
+    if location is not None:
+        loc = wishlist_service.location_key(location)
+        if loc is None:
+            return []
+        key = wishlist_service.POPULAR_LOCATION_PREFIX + loc
+    rows = await get_async_redis().zrevrange(key, 0, max(0, limit - 1), withscores=True)
+    return [(int(member), int(score)) for member, score in rows]
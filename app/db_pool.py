@@ -0,0 +1,176 @@
+"""Bounded, fork-safe MySQL connection pool.
+
+One pool lives in each worker process. Connections are checked out through
+``ConnectionPool.connection()`` and returned (rolled back) when the block
+exits, so the TCP/auth handshake is paid once per connection instead of once
+per query.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Tuple
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be checked out within the timeout."""
+
+
+class ConnectionPool:
+    def __init__(
+        self,
+        connect: Callable[[], Any],
+        size: int = 5,
+        max_overflow: int = 5,
+        timeout: float = 5.0,
+        max_idle: float = 300.0,
+        ping_after: float = 1.0,
+    ):
+        self._connect = connect
+        self.size = max(1, size)
+        self.max_overflow = max(0, max_overflow)
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.ping_after = ping_after
+        self._reset()
+
+    def _reset(self):
+        # Called on construction and again in a forked child: the inherited
+        # sockets belong to the parent, so drop them without sending COM_QUIT.
+        self._pid = os.getpid()
+        self._cond = threading.Condition(threading.Lock())
+        self._idle: List[Tuple[Any, float]] = []
+        self._open = 0
+        self._in_use = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._timeouts = 0
+        self._created = 0
+        self._discarded = 0
+
+    def _check_pid(self):
+        if self._pid != os.getpid():
+            self._reset()
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _alive(self, conn, idle_for: float) -> bool:
+        if idle_for < self.ping_after:
+            return True
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def checkout(self):
+        self._check_pid()
+        while True:
+            conn, idle_for = self._acquire()
+            if conn is None:
+                break
+            # Liveness checks run outside the lock so a slow ping does not
+            # stall other threads.
+            if idle_for <= self.max_idle and self._alive(conn, idle_for):
+                return conn
+            self._close(conn)
+            with self._cond:
+                self._open -= 1
+                self._in_use -= 1
+                self._discarded += 1
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._created += 1
+        return conn
+
+    def _acquire(self) -> Tuple[Any, float]:
+        """Take an idle connection, or reserve a slot for a new one (None)."""
+        limit = self.size + self.max_overflow
+        deadline = None
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn, since = self._idle.pop()
+                    self._in_use += 1
+                    return conn, time.monotonic() - since
+                if self._open < limit:
+                    self._open += 1
+                    self._in_use += 1
+                    return None, 0.0
+                now = time.monotonic()
+                if deadline is None:
+                    deadline = now + self.timeout
+                    self._waits += 1
+                remaining = deadline - now
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(f"no connection available within {self.timeout}s")
+                self._cond.wait(remaining)
+                self._wait_time += time.monotonic() - now
+
+    def checkin(self, conn, discard: bool = False):
+        if self._pid != os.getpid():
+            # Checked out before a fork; the child must not reuse it.
+            return
+        if not discard:
+            try:
+                # End any implicit transaction so the next user gets a fresh
+                # snapshot and no leftover locks.
+                conn.rollback()
+            except Exception:
+                discard = True
+        with self._cond:
+            self._in_use -= 1
+            if discard or len(self._idle) >= self.size:
+                self._open -= 1
+                self._discarded += 1
+                self._close(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        conn = self.checkout()
+        try:
+            yield conn
+        except Exception:
+            self.checkin(conn, discard=True)
+            raise
+        else:
+            self.checkin(conn)
+
+    def dispose(self):
+        with self._cond:
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._open -= 1
+                self._close(conn)
+
+    def stats(self) -> Dict[str, Any]:
+        self._check_pid()
+        with self._cond:
+            return {
+                "size": self.size,
+                "max_overflow": self.max_overflow,
+                "open": self._open,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "overflow": max(0, self._open - self.size),
+                "created": self._created,
+                "discarded": self._discarded,
+                "waits": self._waits,
+                "wait_time": round(self._wait_time, 6),
+                "timeouts": self._timeouts,
+            }
@@ -0,0 +1,176 @@
+"""Read/write splitting across the primary and optional MySQL replicas.
+
+Writes, and reads that must see them, use the primary pool. Other reads
+take a replica in round-robin order, skipping any that recently failed or
+report more than ``max_lag`` seconds of replication delay. When no replica
+is usable the primary serves the read.
+
+Read-your-writes: once a request has written, the rest of that request
+reads from the primary. The web layer also keeps the client on the primary
+for a short window afterwards (see ``start_request`` / ``finish_request``)
+so a user's own edits stay visible while replicas catch up. Celery tasks
+get the same scope per task (see tasks.py), so a write in one task does
+not pin the worker to the primary for good.
+"""
+import contextvars
+import itertools
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    from db_pool import ConnectionPool, PoolTimeout
+except Exception:
+    from app.db_pool import ConnectionPool, PoolTimeout
+
+# True once this request wrote, or while the client is inside its
+# read-your-writes window. Unset (False) outside requests.
+_pinned: contextvars.ContextVar[bool] = contextvars.ContextVar('db_primary_pinned', default=False)
+_wrote: contextvars.ContextVar[bool] = contextvars.ContextVar('db_wrote', default=False)
+
+
+def start_request(pin_primary: bool = False):
+    return _pinned.set(pin_primary), _wrote.set(False)
+
+
+def finish_request(tokens) -> bool:
+    """Reset the per-request flags; returns True if the request wrote."""
+    wrote = _wrote.get()
+    _pinned.reset(tokens[0])
+    _wrote.reset(tokens[1])
+    return wrote
+
+
+def note_write():
+    """Record a committed write: later reads in this request use the primary."""
+    _pinned.set(True)
+    _wrote.set(True)
+
+
+def primary_pinned() -> bool:
+    return _pinned.get()
+
+
+class Replica:
+    def __init__(self, name: str, pool: ConnectionPool):
+        self.name = name
+        self.pool = pool
+        self.down_until = 0.0
+        self.lag: Optional[float] = None
+        self.lag_checked = 0.0
+        self.lock = threading.Lock()
+
+
+class Router:
+    def __init__(
+        self,
+        primary: ConnectionPool,
+        replicas: List[Tuple[str, ConnectionPool]],
+        max_lag: float = 5.0,
+        lag_check: float = 2.0,
+        retry_after: float = 10.0,
+    ):
+        self.primary = primary
+        self.replicas = [Replica(name, pool) for name, pool in replicas]
+        self.max_lag = max_lag
+        self.lag_check = lag_check
+        self.retry_after = retry_after
+        self._rr = itertools.count()
+        self.fallbacks = 0
+
+    def _candidates(self) -> List[Replica]:
+        if not self.replicas:
+            return []
+        now = time.monotonic()
+        start = next(self._rr)
+        n = len(self.replicas)
+        ordered = [self.replicas[(start + i) % n] for i in range(n)]
+        # Skip replicas known to be down, or lagging as of a fresh check.
+        return [
+            r for r in ordered
+            if r.down_until <= now
+            and not (now - r.lag_checked < self.lag_check and self._too_far_behind(r))
+        ]
+
+    def _too_far_behind(self, replica: Replica) -> bool:
+        # None: replication is configured but stopped or broken.
+        return replica.lag is None or replica.lag > self.max_lag
+
+    def _lagging(self, replica: Replica, conn) -> bool:
+        """Refresh the replica's lag at most every ``lag_check`` seconds."""
+        now = time.monotonic()
+        if now - replica.lag_checked >= self.lag_check:
+            with replica.lock:
+                if now - replica.lag_checked >= self.lag_check:
+                    replica.lag = replication_lag(conn)
+                    replica.lag_checked = now
+        return self._too_far_behind(replica)
+
+    def checkout(self, replica_ok: bool = False) -> Tuple[Any, ConnectionPool]:
+        """A connection and the pool to return it to.
+
+        A replica that fails to connect or to report its lag is skipped for
+        ``retry_after`` seconds; one whose pool is merely exhausted is only
+        skipped for this checkout. Raises whatever the primary pool raises
+        when even that fails.
+        """
+        if replica_ok and not primary_pinned():
+            for replica in self._candidates():
+                try:
+                    conn = replica.pool.checkout()
+                except PoolTimeout:
+                    # Busy, not down: try the next one without benching it.
+                    continue
+                except Exception:
+                    replica.down_until = time.monotonic() + self.retry_after
+                    continue
+                try:
+                    lagging = self._lagging(replica, conn)
+                except Exception:
+                    replica.pool.checkin(conn, discard=True)
+                    replica.down_until = time.monotonic() + self.retry_after
+                    continue
+                if not lagging:
+                    return conn, replica.pool
+                replica.pool.checkin(conn)
+            if self.replicas:
+                self.fallbacks += 1
+        return self.primary.checkout(), self.primary
+
+    def stats(self) -> List[Dict[str, Any]]:
+        now = time.monotonic()
+        return [
+            dict(r.pool.stats(), name=r.name, down=r.down_until > now,
+                 lag=r.lag, lagging=self._too_far_behind(r))
+            for r in self.replicas
+        ]
+
+
+def replication_lag(conn) -> Optional[float]:
+    """Seconds behind the source, 0.0 for a standalone server, None if broken.
+
+    A server with no replication configured (an empty status) counts as up
+    to date, so a second standalone MySQL works as a local stand-in. Lag
+    checks need the REPLICATION CLIENT privilege; without it the replica is
+    assumed current.
+    """
+    cur = conn.cursor()
+    try:
+        try:
+            cur.execute("SHOW REPLICA STATUS")  # MySQL 8.0.22+
+        except Exception as e:
+            code = e.args[0] if e.args else None
+            if code == 1227:  # access denied
+                return 0.0
+            if code != 1064:  # syntax error: older server
+                raise
+            cur.execute("SHOW SLAVE STATUS")
+        row = cur.fetchone()
+        if not row:
+            return 0.0
+        cols = [d[0] for d in cur.description]
+        status = dict(zip(cols, row))
+        lag = status.get('Seconds_Behind_Source', status.get('Seconds_Behind_Master'))
+        return None if lag is None else float(lag)
+    finally:
+        cur.close()
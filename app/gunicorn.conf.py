@@ -0,0 +1,21 @@
+# Loaded automatically by gunicorn from the working directory (/app).
+# Command-line flags in the Dockerfile still take precedence.
+import os
+
+import metrics
+
+# Cooperative workers: an idle /parts/stream client costs a greenlet rather
+# than a whole sync worker. Set GUNICORN_WORKER_CLASS=gthread (with
+# GUNICORN_THREADS) where gevent is not available.
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gevent')
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', '2000'))
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+
+
+def on_starting(server):
+    # Drop samples left over from a previous run before workers start.
+    metrics.reset_multiproc_dir()
+
+
+def child_exit(server, worker):
+    metrics.mark_process_dead(worker.pid)
@@ -0,0 +1,258 @@
+"""Thumbnails for part images.
+
+A part's image, either an ``image_url`` or a file uploaded with the form,
+is turned into a thumbnail by the ``tasks.process_part_image`` Celery task.
+The thumbnail fits THUMB_BOX, twice the size the grid shows it at. It is
+written as WebP, with a JPEG fallback, and the part's ``image_url`` is
+rewritten to the WebP file.
+
+Files are named after a hash of the source bytes and the thumbnail settings.
+A name therefore never changes content, nginx can serve THUMB_DIR with an
+immutable one-year cache, and re-processing the same image is a no-op.
+"""
+import hashlib
+import http.client
+import io
+import ipaddress
+import os
+import socket
+import ssl
+import tempfile
+import urllib.parse
+import uuid
+from typing import Optional
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(HERE, 'static')
+# Shared volume: written by the Celery worker, served by nginx.
+THUMB_DIR = os.getenv('THUMB_DIR', os.path.join(STATIC_DIR, 'thumbs'))
+THUMB_URL = '/static/thumbs/'
+# Shared volume: uploads wait here until the worker has processed them.
+UPLOAD_DIR = os.getenv('UPLOAD_DIR', os.path.join(HERE, 'uploads'))
+
+THUMB_BOX = (int(os.getenv('THUMB_WIDTH', '320')), int(os.getenv('THUMB_HEIGHT', '200')))
+WEBP_QUALITY = int(os.getenv('THUMB_WEBP_QUALITY', '80'))
+JPEG_QUALITY = int(os.getenv('THUMB_JPEG_QUALITY', '82'))
+# Part of every file name, so changing the settings produces new names
+# instead of serving stale bytes under a cached URL.
+PIPELINE_VERSION = f"1:{THUMB_BOX[0]}x{THUMB_BOX[1]}:{WEBP_QUALITY}:{JPEG_QUALITY}"
+
+MAX_SOURCE_BYTES = int(os.getenv('IMAGE_MAX_BYTES', str(10 * 1024 * 1024)))
+# Decompression bomb guard: refuse sources with more pixels than this.
+MAX_PIXELS = int(os.getenv('IMAGE_MAX_PIXELS', str(40_000_000)))
+FETCH_TIMEOUT = float(os.getenv('IMAGE_FETCH_TIMEOUT', '10'))
+# Remote images are only fetched from public addresses unless this is set.
+ALLOW_PRIVATE = os.getenv('IMAGE_FETCH_ALLOW_PRIVATE', 'FALSE').upper() == 'TRUE'
+MAX_REDIRECTS = 3
+REDIRECTS = (301, 302, 303, 307, 308)
+
+
+class ImageError(Exception):
+    """The source cannot be used; retrying will not help."""
+
+
+def is_thumbnail(url: Optional[str]) -> bool:
+    return bool(url) and url.startswith(THUMB_URL)
+
+
+def needs_processing(url: Optional[str]) -> bool:
+    return bool(url and url.strip()) and not is_thumbnail(url)
+
+
+def save_upload(stream) -> str:
+    """Store an uploaded file for the worker; returns its name in UPLOAD_DIR.
+
+    Raises ImageError if it is larger than MAX_SOURCE_BYTES.
+    """
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    name = uuid.uuid4().hex
+    path = os.path.join(UPLOAD_DIR, name)
+    size = 0
+    with open(path, 'wb') as fh:
+        while True:
+            chunk = stream.read(65536)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > MAX_SOURCE_BYTES:
+                fh.close()
+                os.unlink(path)
+                raise ImageError('image too large')
+            fh.write(chunk)
+    return name
+
+
+def upload_path(name: str) -> str:
+    # Names come from save_upload; refuse anything that could leave the directory.
+    if not name or os.path.basename(name) != name:
+        raise ImageError('bad upload name')
+    return os.path.join(UPLOAD_DIR, name)
+
+
+def discard_upload(name: Optional[str]):
+    if not name:
+        return
+    try:
+        os.unlink(upload_path(name))
+    except (OSError, ImageError):
+        pass
+
+
+def _read_limited(fh) -> bytes:
+    data = fh.read(MAX_SOURCE_BYTES + 1)
+    if len(data) > MAX_SOURCE_BYTES:
+        raise ImageError('image too large')
+    return data
+
+
+def _public_address(host: str, port: int) -> str:
+    """The address to connect to for ``host``; every address it resolves
+    to must be public unless ALLOW_PRIVATE is set."""
+    try:
+        infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except socket.gaierror as e:
+        raise ImageError(f"cannot resolve {host}") from e
+    if not infos:
+        raise ImageError(f"cannot resolve {host}")
+    for info in infos:
+        addr = ipaddress.ip_address(info[4][0])
+        if not ALLOW_PRIVATE and not addr.is_global:
+            raise ImageError(f"{host} is not a public address")
+    return infos[0][4][0]
+
+
+class _PinnedHTTP(http.client.HTTPConnection):
+    # Connects to the address that was checked, so a second DNS answer
+    # (rebinding) cannot send the request somewhere else.
+    def __init__(self, host, address, **kwargs):
+        super().__init__(host, **kwargs)
+        self.address = address
+
+    def connect(self):
+        self.sock = socket.create_connection((self.address, self.port), self.timeout)
+
+
+class _PinnedHTTPS(_PinnedHTTP):
+    default_port = 443
+
+    def connect(self):
+        super().connect()
+        # Certificate and SNI still use the host name.
+        self.sock = ssl.create_default_context().wrap_socket(self.sock, server_hostname=self.host)
+
+
+def _get(url: str):
+    """(status, headers, body) of one GET to a public http(s) ``url``."""
+    parsed = urllib.parse.urlsplit(url)
+    if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+        raise ImageError(f"unsupported image URL: {url}")
+    try:
+        port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+    except ValueError as e:
+        raise ImageError(f"bad port in {url}") from e
+    address = _public_address(parsed.hostname, port)
+    cls = _PinnedHTTPS if parsed.scheme == 'https' else _PinnedHTTP
+    conn = cls(parsed.hostname, address, port=port, timeout=FETCH_TIMEOUT)
+    path = (parsed.path or '/') + (f"?{parsed.query}" if parsed.query else '')
+    try:
+        conn.request('GET', path, headers={'User-Agent': 'parts-thumbnailer/1', 'Accept': 'image/*'})
+        resp = conn.getresponse()
+        if resp.status != 200:
+            return resp.status, resp.headers, b''
+        ctype = resp.headers.get('Content-Type', '')
+        if ctype and not ctype.startswith('image/'):
+            raise ImageError(f"not an image: {ctype}")
+        return resp.status, resp.headers, _read_limited(resp)
+    except http.client.HTTPException as e:
+        # Worth retrying, like other network errors.
+        raise OSError(f"bad HTTP response from {parsed.hostname}: {e!r}") from e
+    finally:
+        conn.close()
+
+
+def fetch(url: str) -> bytes:
+    """Bytes of the image at ``url``: a /static/ path or an http(s) URL.
+
+    Redirects are followed up to MAX_REDIRECTS times and every hop is
+    checked like the first one. Raises ImageError for sources that cannot
+    work; network errors (worth retrying) propagate as OSError.
+    """
+    url = url.strip()
+    if url.startswith('/static/'):
+        path = os.path.realpath(os.path.join(STATIC_DIR, urllib.parse.unquote(url[len('/static/'):])))
+        if not path.startswith(os.path.realpath(STATIC_DIR) + os.sep) or not os.path.isfile(path):
+            raise ImageError(f"no such static file: {url}")
+        with open(path, 'rb') as fh:
+            return _read_limited(fh)
+    current = url
+    for _ in range(MAX_REDIRECTS + 1):
+        status, headers, body = _get(current)
+        if status == 200:
+            return body
+        if status in REDIRECTS:
+            location = headers.get('Location')
+            if not location:
+                raise ImageError(f"redirect without Location from {current}")
+            current = urllib.parse.urljoin(current, location)
+            continue
+        if 400 <= status < 500:
+            raise ImageError(f"HTTP {status} for {url}")
+        raise OSError(f"HTTP {status} for {url}")
+    raise ImageError(f"too many redirects for {url}")
+
+
+def _write(path: str, data: bytes):
+    # Write-then-rename so nginx never serves a half-written file.
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(data)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def make_thumbnail(source: bytes) -> str:
+    """Write the WebP and JPEG thumbnails of ``source``; returns the WebP URL."""
+    from PIL import Image, ImageOps
+
+    stem = hashlib.sha256(PIPELINE_VERSION.encode() + b'\0' + source).hexdigest()[:32]
+    webp_path = os.path.join(THUMB_DIR, stem + '.webp')
+    jpeg_path = os.path.join(THUMB_DIR, stem + '.jpg')
+    if os.path.exists(webp_path) and os.path.exists(jpeg_path):
+        return THUMB_URL + stem + '.webp'
+
+    Image.MAX_IMAGE_PIXELS = MAX_PIXELS
+    try:
+        with Image.open(io.BytesIO(source)) as im:
+            if im.width * im.height > MAX_PIXELS:
+                raise ImageError('image has too many pixels')
+            im = ImageOps.exif_transpose(im)
+            im.thumbnail(THUMB_BOX, Image.LANCZOS)
+            im.load()
+    except ImageError:
+        raise
+    except (Image.DecompressionBombError, OSError, ValueError, SyntaxError) as e:
+        raise ImageError(f"cannot decode image: {e}") from e
+
+    has_alpha = im.mode in ('RGBA', 'LA') or (im.mode == 'P' and 'transparency' in im.info)
+    im = im.convert('RGBA' if has_alpha else 'RGB')
+    webp = io.BytesIO()
+    im.save(webp, 'WEBP', quality=WEBP_QUALITY, method=6)
+    if has_alpha:
+        # JPEG has no alpha channel: flatten onto the page background.
+        flat = Image.new('RGB', im.size, (255, 255, 255))
+        flat.paste(im, mask=im.getchannel('A'))
+        im = flat
+    jpeg = io.BytesIO()
+    im.save(jpeg, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+
+    os.makedirs(THUMB_DIR, exist_ok=True)
+    _write(jpeg_path, jpeg.getvalue())
+    _write(webp_path, webp.getvalue())
+    return THUMB_URL + stem + '.webp'
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""Incrementally maintained per-location statistics for /parts/all.
+
+``part_location_stats`` holds, for every location with validated parts, the
+number of parts and of distinct descriptions. ``part_location_descriptions``
+keeps a reference count per (location, description) so a distinct count can
+be decremented correctly. Both are updated by ``apply`` inside the same
+transaction as the write to ``parts``.
+
+Locations and descriptions are keyed by a SHA-1 of their lower-cased,
+stripped text, approximating the case-insensitive grouping MySQL applied
+in the old ``GROUP BY location`` query.
+
+Run as a script to backfill or verify the tables:
+
+    python location_stats.py rebuild
+    python location_stats.py check
+"""
+import hashlib
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+# (location, description, is_validated) of a parts row, or None for "no row".
+PartState = Optional[Tuple[Optional[str], Optional[str], Any]]
+
+# Marker hashed in place of NULL; cannot collide with valid UTF-8 text.
+_NULL = b'\xff'
+
+
+def _hash(value: Optional[str]) -> bytes:
+    if value is None:
+        return hashlib.sha1(_NULL).digest()
+    return hashlib.sha1(value.strip().lower().encode('utf-8')).digest()
+
+
+def _counted(state: PartState) -> bool:
+    return bool(state) and bool(state[2])
+
+
+def _key(state: PartState):
+    return _hash(state[0]), None if state[1] is None else _hash(state[1])
+
+
+def _add(cur, location: Optional[str], description: Optional[str]):
+    loc = _hash(location)
+    new_distinct = 0
+    if description is not None:
+        # COUNT(DISTINCT ...) ignores NULLs, so NULL descriptions are not tracked.
+        cur.execute(
+            "INSERT INTO part_location_descriptions (loc_hash, desc_hash, n) VALUES (%s, %s, 1)"
+            " ON DUPLICATE KEY UPDATE n = n + 1",
+            (loc, _hash(description)),
+        )
+        # affected rows: 1 = inserted (new distinct value), 2 = existing row bumped
+        new_distinct = 1 if cur.rowcount == 1 else 0
+    cur.execute(
+        "INSERT INTO part_location_stats (loc_hash, location, parts, distinct_descriptions) VALUES (%s, %s, 1, %s)"
+        " ON DUPLICATE KEY UPDATE parts = parts + 1, distinct_descriptions = distinct_descriptions + VALUES(distinct_descriptions)",
+        (loc, location, new_distinct),
+    )
+
+
+def _remove(cur, location: Optional[str], description: Optional[str]):
+    loc = _hash(location)
+    gone = 0
+    if description is not None:
+        desc = _hash(description)
+        cur.execute(
+            "UPDATE part_location_descriptions SET n = n - 1 WHERE loc_hash = %s AND desc_hash = %s",
+            (loc, desc),
+        )
+        cur.execute(
+            "DELETE FROM part_location_descriptions WHERE loc_hash = %s AND desc_hash = %s AND n <= 0",
+            (loc, desc),
+        )
+        gone = cur.rowcount
+    cur.execute(
+        "UPDATE part_location_stats SET parts = parts - 1, distinct_descriptions = distinct_descriptions - %s"
+        " WHERE loc_hash = %s",
+        (gone, loc),
+    )
+    cur.execute("DELETE FROM part_location_stats WHERE loc_hash = %s AND parts <= 0", (loc,))
+
+
+def apply(cur, old: PartState, new: PartState):
+    """Move the stats from ``old`` to ``new`` for one parts row.
+
+    Call inside the transaction that changes the row; only validated rows
+    are counted, so validating or un-validating a part moves it in or out.
+    """
+    if _counted(old) and _counted(new) and _key(old) == _key(new):
+        return
+    if _counted(old):
+        _remove(cur, old[0], old[1])
+    if _counted(new):
+        _add(cur, new[0], new[1])
+
+
+def read(conn) -> List[Dict[str, Any]]:
+    """Current per-location counts, unordered."""
+    cur = conn.cursor()
+    cur.execute("SELECT location, distinct_descriptions FROM part_location_stats")
+    return [
+        {'category': r[0], 'distinct_descriptions': int(r[1]) if r[1] is not None else 0}
+        for r in cur.fetchall()
+    ]
+
+
+def _expected(conn, lock: bool = False) -> Tuple[Dict[bytes, list], Dict[Tuple[bytes, bytes], int]]:
+    import pymysql
+    stats: Dict[bytes, list] = {}
+    refs: Dict[Tuple[bytes, bytes], int] = {}
+    # Unbuffered cursor: stream the table instead of holding it in memory.
+    cur = conn.cursor(pymysql.cursors.SSCursor)
+    try:
+        # With lock=True, shared row locks hold off concurrent writers until
+        # the caller commits.
+        cur.execute(
+            "SELECT location, description FROM parts WHERE is_validated=1"
+            + (" LOCK IN SHARE MODE" if lock else "")
+        )
+        for location, description in cur:
+            loc = _hash(location)
+            entry = stats.setdefault(loc, [location, 0, 0])
+            entry[1] += 1
+            if description is not None:
+                key = (loc, _hash(description))
+                if key not in refs:
+                    refs[key] = 0
+                    entry[2] += 1
+                refs[key] += 1
+    finally:
+        cur.close()
+    return stats, refs
+
+
+def rebuild(conn, batch: int = 1000) -> int:
+    """Recompute both tables from ``parts``; returns the number of locations."""
+    stats, refs = _expected(conn, lock=True)
+    cur = conn.cursor()
+    cur.execute("DELETE FROM part_location_descriptions")
+    cur.execute("DELETE FROM part_location_stats")
+    rows = [(loc, v[0], v[1], v[2]) for loc, v in stats.items()]
+    for i in range(0, len(rows), batch):
+        cur.executemany(
+            "INSERT INTO part_location_stats (loc_hash, location, parts, distinct_descriptions) VALUES (%s, %s, %s, %s)",
+            rows[i:i + batch],
+        )
+    ref_rows = [(k[0], k[1], n) for k, n in refs.items()]
+    for i in range(0, len(ref_rows), batch):
+        cur.executemany(
+            "INSERT INTO part_location_descriptions (loc_hash, desc_hash, n) VALUES (%s, %s, %s)",
+            ref_rows[i:i + batch],
+        )
+    conn.commit()
+    return len(rows)
+
+
+def check(conn) -> List[str]:
+    """Compare the summary against ``parts``; returns a list of mismatches."""
+    stats, _ = _expected(conn)
+    cur = conn.cursor()
+    cur.execute("SELECT loc_hash, location, parts, distinct_descriptions FROM part_location_stats")
+    actual = {bytes(r[0]): (r[1], int(r[2]), int(r[3])) for r in cur.fetchall()}
+    problems = []
+    for loc, (location, parts, distinct) in stats.items():
+        got = actual.pop(loc, None)
+        if got is None:
+            problems.append(f"missing location {location!r}")
+        elif (got[1], got[2]) != (parts, distinct):
+            problems.append(f"{location!r}: have parts={got[1]} distinct={got[2]}, expected parts={parts} distinct={distinct}")
+    for location, parts, distinct in actual.values():
+        problems.append(f"stale location {location!r} (parts={parts})")
+    return problems
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    cmd = argv[0] if argv else 'check'
+    if cmd not in ('rebuild', 'check'):
+        print("usage: location_stats.py [rebuild|check]", file=sys.stderr)
+        return 2
+    try:
+        from parts_service import get_conn
+    except Exception:
+        from app.parts_service import get_conn
+    conn = get_conn()
+    if not conn:
+        print("[location_stats] ERROR: DB not available", file=sys.stderr)
+        return 2
+    try:
+        if cmd == 'rebuild':
+            n = rebuild(conn)
+            print(f"[location_stats] rebuilt stats for {n} locations")
+            return 0
+        problems = check(conn)
+        for p in problems:
+            print(f"[location_stats] {p}")
+        print(f"[location_stats] {'OK' if not problems else f'{len(problems)} mismatches'}")
+        return 0 if not problems else 1
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
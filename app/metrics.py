@@ -0,0 +1,255 @@
+"""Prometheus instrumentation shared by the web app and the Celery worker.
+
+Under gunicorn (and Celery's prefork pool) every worker process keeps its own
+counters, so set PROMETHEUS_MULTIPROC_DIR: each process then writes its
+samples to files in that directory and ``render()`` merges them at scrape
+time. Without it, metrics are per-process (fine for ``flask run``).
+"""
+import contextvars
+import functools
+import inspect
+import os
+import shutil
+import time
+from typing import Iterable, Optional, Tuple
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client import REGISTRY, multiprocess
+
+MULTIPROC_DIR = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+if MULTIPROC_DIR:
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+
+_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100, 250)
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'HTTP request latency by route', ['method', 'route', 'status'])
+REQUEST_DB_QUERIES = Histogram(
+    'http_request_db_queries', 'MySQL statements executed per request', ['route'], buckets=_COUNT_BUCKETS)
+REQUEST_DB_TIME = Histogram(
+    'http_request_db_seconds', 'Time spent in MySQL statements per request', ['route'])
+REQUEST_SERVICE_CALLS = Histogram(
+    'http_request_service_calls', 'Service-layer calls per request', ['route', 'service'], buckets=_COUNT_BUCKETS)
+SERVICE_LATENCY = Histogram(
+    'service_call_duration_seconds', 'Latency of parts_service / wishlist_service calls', ['service', 'function'])
+SERVICE_ERRORS = Counter(
+    'service_call_errors_total', 'Service-layer calls that raised', ['service', 'function'])
+DB_QUERY_LATENCY = Histogram(
+    'db_query_duration_seconds', 'Latency of individual MySQL statements')
+REQUEST_REDIS_COMMANDS = Histogram(
+    'http_request_redis_commands', 'Redis commands sent per request', ['route'], buckets=_COUNT_BUCKETS)
+REQUEST_REDIS_ROUND_TRIPS = Histogram(
+    'http_request_redis_round_trips', 'Redis round trips (commands or pipelines) per request', ['route'],
+    buckets=_COUNT_BUCKETS)
+REQUEST_REDIS_TIME = Histogram(
+    'http_request_redis_seconds', 'Time spent waiting on Redis per request', ['route'])
+REDIS_ROUND_TRIP_LATENCY = Histogram(
+    'redis_round_trip_duration_seconds', 'Latency of individual Redis commands and pipelines')
+TEMPLATE_RENDER = Histogram(
+    'template_render_duration_seconds', 'Jinja template render time', ['template'])
+ADMISSION_REJECTED = Counter(
+    'admission_rejected_total', 'Write requests refused by admission control', ['rule', 'reason'])
+TASK_LATENCY = Histogram(
+    'celery_task_duration_seconds', 'Celery task run time', ['task', 'state'],
+    buckets=(.01, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60, 120))
+
+# Per-request tallies; None outside a request (e.g. in Celery or scripts).
+_request_stats: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar('request_stats', default=None)
+# Services with a call already in progress, so nested calls count once.
+_active: contextvars.ContextVar[Tuple[str, ...]] = contextvars.ContextVar('active_services', default=())
+
+
+def reset_multiproc_dir():
+    """Clear stale sample files; call once in the parent before forking workers."""
+    if MULTIPROC_DIR and os.path.isdir(MULTIPROC_DIR):
+        shutil.rmtree(MULTIPROC_DIR)
+        os.makedirs(MULTIPROC_DIR, exist_ok=True)
+
+
+def mark_process_dead(pid: int):
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid)
+
+
+def registry():
+    if MULTIPROC_DIR:
+        reg = CollectorRegistry()
+        multiprocess.MultiProcessCollector(reg)
+        return reg
+    return REGISTRY
+
+
+def render() -> Tuple[bytes, str]:
+    """Exposition body and content type for a /metrics response."""
+    return generate_latest(registry()), CONTENT_TYPE_LATEST
+
+
+def start_request():
+    return _request_stats.set({'db_queries': 0, 'db_time': 0.0, 'redis_commands': 0, 'redis_round_trips': 0,
+                               'redis_time': 0.0, 'services': {}})
+
+
+def finish_request(token, method: str, route: str, status: int, elapsed: float):
+    stats = _request_stats.get()
+    _request_stats.reset(token)
+    REQUEST_LATENCY.labels(method, route, str(status)).observe(elapsed)
+    if stats is None:
+        return
+    REQUEST_DB_QUERIES.labels(route).observe(stats['db_queries'])
+    REQUEST_DB_TIME.labels(route).observe(stats['db_time'])
+    REQUEST_REDIS_COMMANDS.labels(route).observe(stats['redis_commands'])
+    REQUEST_REDIS_ROUND_TRIPS.labels(route).observe(stats['redis_round_trips'])
+    REQUEST_REDIS_TIME.labels(route).observe(stats['redis_time'])
+    for service, calls in stats['services'].items():
+        REQUEST_SERVICE_CALLS.labels(route, service).observe(calls)
+
+
+def record_query(elapsed: float):
+    DB_QUERY_LATENCY.observe(elapsed)
+    stats = _request_stats.get()
+    if stats is not None:
+        stats['db_queries'] += 1
+        stats['db_time'] += elapsed
+
+
+def record_redis(commands: int, elapsed: float):
+    """One Redis round trip carrying ``commands`` commands (1 unless a pipeline)."""
+    REDIS_ROUND_TRIP_LATENCY.observe(elapsed)
+    stats = _request_stats.get()
+    if stats is not None:
+        stats['redis_commands'] += commands
+        stats['redis_round_trips'] += 1
+        stats['redis_time'] += elapsed
+
+
+def instrument_module(module, service: str, names: Iterable[str]):
+    """Replace ``module.<name>`` functions with timed wrappers in place.
+
+    Calls made from inside the module resolve through the module globals,
+    so they are timed too; only the outermost call counts towards the
+    per-request service call tally.
+    """
+    for name in names:
+        fn = getattr(module, name)
+        if getattr(fn, '__wrapped__', None) is not None:
+            continue
+        setattr(module, name, _wrap(fn, service, name))
+
+
+def _wrap(fn, service: str, name: str):
+    hist = SERVICE_LATENCY.labels(service, name)
+    errors = SERVICE_ERRORS.labels(service, name)
+
+    def enter():
+        active = _active.get()
+        if service in active:
+            return None
+        stats = _request_stats.get()
+        if stats is not None:
+            stats['services'][service] = stats['services'].get(service, 0) + 1
+        return _active.set(active + (service,))
+
+    if inspect.iscoroutinefunction(fn):
+        # Time the awaited call, not just creating the coroutine.
+        @functools.wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            token = enter()
+            started = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            except Exception:
+                errors.inc()
+                raise
+            finally:
+                hist.observe(time.perf_counter() - started)
+                if token is not None:
+                    _active.reset(token)
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        token = enter()
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            errors.inc()
+            raise
+        finally:
+            hist.observe(time.perf_counter() - started)
+            if token is not None:
+                _active.reset(token)
+    return wrapper
+
+
+_cursor_classes = {}
+
+
+def instrumented_cursor(base=None):
+    """A PyMySQL cursor class that times every statement it sends."""
+    import pymysql
+    base = base or pymysql.cursors.Cursor
+    cls = _cursor_classes.get(base)
+    if cls is None:
+        class InstrumentedCursor(base):
+            def execute(self, query, args=None):
+                started = time.perf_counter()
+                try:
+                    return super().execute(query, args)
+                finally:
+                    record_query(time.perf_counter() - started)
+
+        cls = _cursor_classes[base] = InstrumentedCursor
+    return cls
+
+
+def instrumented_redis_classes():
+    """Redis client classes that report every round trip to record_redis.
+
+    Plain commands and Lua script calls go through ``execute_command``;
+    a pipeline is one round trip for all of its queued commands.
+    """
+    import redis
+    import redis.asyncio
+
+    class Pipeline(redis.client.Pipeline):
+        def execute(self, raise_on_error=True):
+            commands = len(self.command_stack)
+            started = time.perf_counter()
+            try:
+                return super().execute(raise_on_error)
+            finally:
+                record_redis(commands, time.perf_counter() - started)
+
+    class Redis(redis.Redis):
+        def execute_command(self, *args, **options):
+            started = time.perf_counter()
+            try:
+                return super().execute_command(*args, **options)
+            finally:
+                record_redis(1, time.perf_counter() - started)
+
+        def pipeline(self, transaction=True, shard_hint=None):
+            return Pipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+    class AsyncPipeline(redis.asyncio.client.Pipeline):
+        async def execute(self, raise_on_error=True):
+            commands = len(self.command_stack)
+            started = time.perf_counter()
+            try:
+                return await super().execute(raise_on_error)
+            finally:
+                record_redis(commands, time.perf_counter() - started)
+
+    class AsyncRedis(redis.asyncio.Redis):
+        async def execute_command(self, *args, **options):
+            started = time.perf_counter()
+            try:
+                return await super().execute_command(*args, **options)
+            finally:
+                record_redis(1, time.perf_counter() - started)
+
+        def pipeline(self, transaction=True, shard_hint=None):
+            return AsyncPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+    return Redis, AsyncRedis
@@ -0,0 +1,5 @@
+-- Composite index for the validated listing: serves WHERE is_validated=1
+-- ORDER BY created_at DESC, id DESC (and keyset pages after a cursor) as an
+-- index range scan instead of a full scan plus filesort.
+
+CREATE INDEX idx_parts_validated_created ON parts (is_validated, created_at, id);
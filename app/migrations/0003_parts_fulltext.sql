@@ -0,0 +1,3 @@
+-- FULLTEXT index backing GET /parts/search (MATCH(title, description)).
+
+ALTER TABLE parts ADD FULLTEXT INDEX ft_parts_title_description (title, description);
@@ -0,0 +1,19 @@
+-- Per-location summary for /parts/all, maintained incrementally by
+-- parts_service writes (see location_stats.py). Backfill with
+-- `python location_stats.py rebuild`.
+
+CREATE TABLE IF NOT EXISTS part_location_stats (
+    loc_hash BINARY(20) NOT NULL PRIMARY KEY,
+    location TEXT,
+    parts INTEGER NOT NULL DEFAULT 0,
+    distinct_descriptions INTEGER NOT NULL DEFAULT 0
+)
+ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS part_location_descriptions (
+    loc_hash BINARY(20) NOT NULL,
+    desc_hash BINARY(20) NOT NULL,
+    n INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (loc_hash, desc_hash)
+)
+ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -0,0 +1,6 @@
+-- Row version for conditional GETs (ETag / Last-Modified) on the parts API.
+-- Microsecond precision so two updates within one second differ; MySQL
+-- maintains it on every UPDATE that changes the row.
+
+ALTER TABLE parts
+    ADD COLUMN updated_at TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6);
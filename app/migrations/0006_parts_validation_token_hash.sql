@@ -0,0 +1,21 @@
+-- Validation links are looked up by a SHA-256 of the token through a unique
+-- index instead of scanning parts.validation_token; the raw token only ever
+-- appears in the email. token_created_at drives link expiry and the sweep of
+-- abandoned unvalidated listings (tasks.purge_unvalidated_parts), which uses
+-- idx_parts_unvalidated_token.
+
+ALTER TABLE parts ADD COLUMN validation_token_hash BINARY(32) NULL;
+
+ALTER TABLE parts ADD COLUMN token_created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP;
+
+-- Hash outstanding tokens and drop the raw values. COALESCE keeps the hash if
+-- this file is re-run; updated_at is pinned so ETags stay valid.
+UPDATE parts
+    SET validation_token_hash = COALESCE(UNHEX(SHA2(validation_token, 256)), validation_token_hash),
+        token_created_at = created_at,
+        validation_token = NULL,
+        updated_at = updated_at;
+
+ALTER TABLE parts ADD UNIQUE INDEX uq_parts_validation_token_hash (validation_token_hash);
+
+ALTER TABLE parts ADD INDEX idx_parts_unvalidated_token (is_validated, token_created_at);
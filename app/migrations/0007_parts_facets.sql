@@ -0,0 +1,17 @@
+-- Location/price filters and facet counts on GET /parts.
+-- location_key is the trimmed, lower-cased location (the same grouping
+-- /parts/all uses); as a VIRTUAL column it costs nothing per row, only
+-- its index entries.
+--   idx_parts_location_created: filtered listing in keyset order
+--   idx_parts_location_price:   location facet (with price filter) and
+--                               price facet within a location, index-only
+--   idx_parts_validated_price:  price filter and price facet overall
+
+ALTER TABLE parts
+    ADD COLUMN location_key VARCHAR(191) GENERATED ALWAYS AS (LEFT(LOWER(TRIM(location)), 191)) VIRTUAL;
+
+CREATE INDEX idx_parts_location_created ON parts (is_validated, location_key, created_at, id);
+
+CREATE INDEX idx_parts_location_price ON parts (is_validated, location_key, price);
+
+CREATE INDEX idx_parts_validated_price ON parts (is_validated, price);
@@ -1,25 +1,346 @@
-from flask import Blueprint, jsonify, request, abort, redirect, url_for
+import csv
+import hashlib
+import io
+import itertools
+import json
+import logging
+import time
+from datetime import datetime, timezone
+
+from flask import Blueprint, Response, jsonify, request, abort, redirect, stream_with_context, url_for
+import admission
+import images
+import parts_events
+import parts_json
 import parts_service
 import wishlist_service
 
 bp = Blueprint('parts_api', __name__)
+log = logging.getLogger(__name__)
+
+
+# Page size bounds for GET /parts
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+# GET /parts/popular
+DEFAULT_POPULAR = 10
+MAX_POPULAR = 100
+
+
+# The listing may be micro-cached by nginx (see nginx.conf); single parts
+# carry contact details and are only revalidated, never shared.
+LIST_CACHE_CONTROL = 'public, max-age=5, stale-while-revalidate=30'
+ITEM_CACHE_CONTROL = 'private, no-cache'
+
+
+def parse_ts(value):
+    # updated_at is stored as a UTC TIMESTAMP and serialized as ISO text
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value).replace(tzinfo=timezone.utc)
+    except ValueError:
+        return None
+
+
+def list_etag(limit, next_cursor, facets, parts) -> str:
+    """Strong validator from the row versions on a page (ids + updated_at),
+    so deletions and edits both change it. Shared with asgi.py."""
+    h = hashlib.sha1(f"{limit}|{next_cursor}|{json.dumps(facets, sort_keys=True)}".encode())
+    for p in parts:
+        h.update(f"|{p['id']}:{p.get('updated_at')}".encode())
+    return h.hexdigest()
+
+
+def rows_etag(fields, limit, next_cursor, facets, rows) -> str:
+    """``list_etag`` for the projected rows of a ?fields= page."""
+    h = hashlib.sha1(f"{','.join(fields)}|{limit}|{next_cursor}|{json.dumps(facets, sort_keys=True)}".encode())
+    for r in rows:
+        h.update(f"|{r[0]}:{parts_service._iso(r[2])}".encode())
+    return h.hexdigest()
+
+
+def part_etag(p, fields=None) -> str:
+    etag = f"p{p['id']}-{p.get('updated_at')}"
+    return f"{etag}-{'.'.join(fields)}" if fields else etag
+
+
+def _not_modified(etag, last_modified=None) -> bool:
+    """Evaluate If-None-Match (preferred) or If-Modified-Since."""
+    if request.if_none_match:
+        # Weak comparison: nginx weakens the ETag of responses it gzips.
+        return request.if_none_match.contains_weak(etag)
+    if last_modified and request.if_modified_since:
+        return last_modified.replace(microsecond=0) <= request.if_modified_since
+    return False
+
+
+def fields_arg(args):
+    """Parsed ``?fields=`` (None for all fields); ValueError lists unknown ones."""
+    return parts_service.parse_fields(args.get('fields'))
+
+
+def fields_error(e) -> dict:
+    return {'error': f'unknown fields: {e}', 'fields': list(parts_service.PART_FIELDS)}
+
+
+def _bad_fields(e):
+    return jsonify(fields_error(e)), 400
+
+
+def _304(etag, cache_control, last_modified=None):
+    resp = Response(status=304)
+    resp.set_etag(etag)
+    if last_modified:
+        resp.last_modified = last_modified
+    resp.headers['Cache-Control'] = cache_control
+    return resp
 
 
 @bp.route('/parts', methods=['GET'])
 def parts_list():
-    parts = parts_service.list_parts()
-    return jsonify(parts)
+    """Validated parts, newest first, keyset-paginated.
+
+    Filters: location= (case-insensitive), min_price=, max_price=
+    (inclusive). The first page also carries facet counts per location and
+    price bucket unless facets=0 is given. fields=id,title,... returns
+    only those fields of each item.
+    """
+    try:
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+        min_price = request.args.get('min_price')
+        min_price = int(min_price) if min_price not in (None, '') else None
+        max_price = request.args.get('max_price')
+        max_price = int(max_price) if max_price not in (None, '') else None
+    except Exception:
+        return jsonify({'error': 'limit, min_price and max_price must be integers'}), 400
+    try:
+        fields = fields_arg(request.args)
+    except ValueError as e:
+        return _bad_fields(e)
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    location = request.args.get('location') or None
+    cursor = request.args.get('cursor')
+    try:
+        if fields:
+            rows, next_cursor = parts_service.list_parts_rows(
+                fields, limit=limit, cursor=cursor, location=location, min_price=min_price, max_price=max_price)
+        else:
+            parts, next_cursor = parts_service.list_parts_page(
+                limit=limit, cursor=cursor, location=location, min_price=min_price, max_price=max_price)
+    except ValueError:
+        return jsonify({'error': 'invalid cursor'}), 400
+    facets = None
+    if not cursor and request.args.get('facets') not in ('0', 'false', 'no'):
+        facets = parts_service.facet_counts(location, min_price, max_price)
+    if fields:
+        etag = rows_etag(fields, limit, next_cursor, facets, rows)
+        if _not_modified(etag):
+            return _304(etag, LIST_CACHE_CONTROL)
+        resp = Response(parts_json.page_body(fields, rows, next_cursor, facets), mimetype='application/json')
+        resp.set_etag(etag)
+        resp.headers['Cache-Control'] = LIST_CACHE_CONTROL
+        return resp
+    etag = list_etag(limit, next_cursor, facets, parts)
+    if _not_modified(etag):
+        return _304(etag, LIST_CACHE_CONTROL)
+    body = {'items': parts, 'next': next_cursor}
+    if facets is not None:
+        body['facets'] = facets
+    resp = jsonify(body)
+    resp.set_etag(etag)
+    resp.headers['Cache-Control'] = LIST_CACHE_CONTROL
+    return resp
+
+
+@bp.route('/parts/search', methods=['GET'])
+def parts_search():
+    q = (request.args.get('q') or '').strip()
+    if not q:
+        return jsonify({'error': 'q is required'}), 400
+    try:
+        limit = int(request.args.get('limit', 20))
+        min_price = request.args.get('min_price')
+        min_price = int(min_price) if min_price not in (None, '') else None
+        max_price = request.args.get('max_price')
+        max_price = int(max_price) if max_price not in (None, '') else None
+    except Exception:
+        return jsonify({'error': 'limit, min_price and max_price must be integers'}), 400
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    try:
+        parts, next_cursor = parts_service.search_parts(
+            q,
+            location=request.args.get('location') or None,
+            min_price=min_price,
+            max_price=max_price,
+            limit=limit,
+            cursor=request.args.get('cursor'),
+        )
+    except ValueError:
+        return jsonify({'error': 'invalid cursor'}), 400
+    return jsonify({'items': parts, 'next': next_cursor})
+
+
+@bp.route('/parts/export', methods=['GET'])
+def parts_export():
+    """Stream parts as NDJSON (default) or CSV with constant memory.
+
+    Filters: validated=0|1, since=<created_at>, location=..., after_id=<id>
+    to resume an interrupted export.
+    """
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in ('ndjson', 'csv'):
+        return jsonify({'error': 'format must be ndjson or csv'}), 400
+    validated = request.args.get('validated')
+    try:
+        after_id = int(request.args.get('after_id', 0))
+    except Exception:
+        return jsonify({'error': 'after_id must be integer'}), 400
+    rows = parts_service.iter_parts(
+        validated=None if validated in (None, '') else validated in ('1', 'true', 'yes'),
+        since=request.args.get('since') or None,
+        location=request.args.get('location') or None,
+        after_id=after_id,
+    )
+    # Pull the first row now so an unavailable DB still gets a 503 status.
+    try:
+        first = next(rows, None)
+    except parts_service.DBUnavailable:
+        abort(503)
+
+    def generate():
+        started = time.perf_counter()
+        count = 0
+        pending = [] if first is None else [first]
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        if fmt == 'csv':
+            writer.writerow(parts_service.EXPORT_COLUMNS)
+        for part in itertools.chain(pending, rows):
+            count += 1
+            if fmt == 'csv':
+                writer.writerow([part[c] for c in parts_service.EXPORT_COLUMNS])
+            else:
+                buf.write(json.dumps(part))
+                buf.write('\n')
+            # Flush in ~64KiB chunks rather than one write per row.
+            if buf.tell() >= 65536:
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate()
+        if buf.tell():
+            yield buf.getvalue()
+        elapsed = time.perf_counter() - started
+        log.info("parts export: %d rows in %.2fs (%.0f rows/s)", count, elapsed, count / elapsed if elapsed else 0)
+
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    resp = Response(stream_with_context(generate()), mimetype=mimetype)
+    # Let nginx pass chunks through instead of buffering the whole export.
+    resp.headers['X-Accel-Buffering'] = 'no'
+    resp.headers['Content-Disposition'] = f'attachment; filename=parts.{fmt}'
+    return resp
+
+
+@bp.route('/parts/popular', methods=['GET'])
+def parts_popular():
+    """Most-favourited parts, optionally for one ``location``.
+
+    Each item carries ``favourites``, the number of wishlists holding it.
+    """
+    try:
+        limit = int(request.args.get('limit', DEFAULT_POPULAR))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    limit = max(1, min(limit, MAX_POPULAR))
+    location = request.args.get('location')
+    try:
+        # Over-fetch a little: deleted or unvalidated parts are skipped below.
+        top = wishlist_service.top_favorites(limit * 2, location)
+    except Exception:
+        log.exception("popular: redis unavailable")
+        return jsonify({'error': 'leaderboard unavailable'}), 503
+    counts = dict(top)
+    items = parts_service.get_parts([pid for pid, _ in top], validated_only=True)[:limit]
+    for p in items:
+        p['favourites'] = counts[p['id']]
+    resp = jsonify({'items': items, 'location': location})
+    resp.headers['Cache-Control'] = 'public, max-age=30'
+    return resp
+
+
+@bp.route('/parts/stream', methods=['GET'])
+def parts_stream():
+    """Server-Sent Events feed of listing changes.
+
+    Events are ``created`` (a part was validated and is now listed),
+    ``updated`` and ``deleted``; ``data`` is {"type", "id", "part"}.
+    Reconnecting clients resume from Last-Event-ID; a ``reset`` event means
+    the gap was too large and the listing should be reloaded.
+    """
+    last_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        stream = parts_events.open_stream(last_id)
+    except parts_events.TooManySubscribers:
+        return jsonify({'error': 'too many subscribers'}), 503, {'Retry-After': '5'}
+    except Exception:
+        log.exception("parts stream: redis unavailable")
+        return jsonify({'error': 'event feed unavailable'}), 503, {'Retry-After': '5'}
+    resp = Response(stream, mimetype='text/event-stream')
+    resp.headers['Cache-Control'] = 'no-cache'
+    resp.headers['X-Accel-Buffering'] = 'no'
+    return resp
 
 
 @bp.route('/parts/<int:part_id>', methods=['GET'])
 def parts_get(part_id):
+    try:
+        fields = fields_arg(request.args)
+    except ValueError as e:
+        return _bad_fields(e)
     p = parts_service.get_part(part_id)
     if not p:
         abort(404)
-    return jsonify(p)
+    etag = part_etag(p, fields)
+    last_modified = parse_ts(p.get('updated_at'))
+    if _not_modified(etag, last_modified):
+        return _304(etag, ITEM_CACHE_CONTROL, last_modified)
+    # The cached part is projected here; one row gains nothing from a narrower SELECT.
+    resp = jsonify(parts_json.project(p, fields) if fields else p)
+    resp.set_etag(etag)
+    if last_modified:
+        resp.last_modified = last_modified
+    resp.headers['Cache-Control'] = ITEM_CACHE_CONTROL
+    return resp
+
+
+def save_image_upload():
+    """Save an ``image`` file from a multipart form for the thumbnail task.
+
+    Returns its upload name, None if there is none, or an error response.
+    """
+    f = request.files.get('image')
+    if not f or not f.filename:
+        return None
+    try:
+        return images.save_upload(f.stream)
+    except images.ImageError:
+        return jsonify({'error': f'image larger than {images.MAX_SOURCE_BYTES} bytes'}), 413
+
+
+def queue_image(part_id, upload=None):
+    """Hand a part's new image to the thumbnail task (best effort)."""
+    try:
+        from tasks import process_part_image
+        process_part_image.delay(part_id, upload)
+    except Exception:
+        # Broker down: the original image_url keeps working; the upload is
+        # dropped. tasks.backfill_thumbnails picks up the URL later.
+        images.discard_upload(upload)
 
 
 @bp.route('/parts', methods=['POST'])
+@admission.limit_writes('parts_write')
 def parts_create():
     if request.content_type and request.content_type.startswith('application/json'):
         data = request.get_json() or {}
@@ -33,15 +354,22 @@ def parts_create():
         except Exception:
             return jsonify({'error': 'price must be integer'}), 400
 
-    # generate a validation token and mark as not validated
-    import uuid
-    token = uuid.uuid4().hex
+    upload = save_image_upload()
+    if isinstance(upload, tuple):
+        return upload
+
+    # generate a validation token and mark as not validated; only its hash
+    # is stored, the raw value goes out in the email
+    token = parts_service.new_validation_token()
     data['validation_token'] = token
     data['is_validated'] = False
 
     new_id = parts_service.create_part(data)
     if new_id is None:
+        images.discard_upload(upload)
         abort(503)
+    if upload or images.needs_processing(data.get('image_url')):
+        queue_image(new_id, upload)
     # enqueue validation email if contact_email provided
     email = data.get('contact_email')
     if email:
@@ -57,7 +385,112 @@ def parts_create():
     return jsonify({'id': new_id}), 201
 
 
+# Bulk ingestion limits for POST /parts/bulk
+MAX_BULK_ITEMS = 5000
+EMAIL_BATCH = 100
+
+
+# Text columns a bulk item may set; each must be a string or null.
+BULK_TEXT_FIELDS = ('title', 'description', 'location', 'image_url', 'contact_email', 'contact_phone')
+
+
+def _clean_part(data):
+    """Validate one submitted part; returns (data, error)."""
+    if not isinstance(data, dict):
+        return None, 'item must be an object'
+    for f in BULK_TEXT_FIELDS:
+        if data.get(f) is not None and not isinstance(data[f], str):
+            return None, f'{f} must be a string'
+    if not (data.get('title') or '').strip():
+        return None, 'title is required'
+    if 'price' in data and data.get('price') not in (None, ''):
+        price = data['price']
+        # JSON gives bools, floats, lists and objects too; only whole numbers pass.
+        if isinstance(price, bool) or (isinstance(price, float) and not price.is_integer()):
+            return None, 'price must be integer'
+        try:
+            data['price'] = int(price)
+        except Exception:
+            return None, 'price must be integer'
+    elif 'price' in data:
+        data['price'] = None
+    return data, None
+
+
+def _read_bulk_body():
+    """Parse a JSON array or NDJSON body into a list of (item, parse_error)."""
+    ctype = request.content_type or ''
+    if ctype.startswith('application/json'):
+        body = request.get_json(silent=True)
+        if not isinstance(body, list):
+            return None
+        return [(item, None) for item in body]
+    out = []
+    for line in request.get_data(as_text=True).splitlines():
+        if not line.strip():
+            continue
+        try:
+            out.append((json.loads(line), None))
+        except ValueError:
+            out.append((None, 'invalid JSON'))
+    return out
+
+
+@bp.route('/parts/bulk', methods=['POST'])
+@admission.limit_writes('parts_bulk')
+def parts_create_bulk():
+    """Create many parts from a JSON array or NDJSON body.
+
+    Returns one result per input index: {"index": i, "id": new_id} or
+    {"index": i, "error": "..."}.
+    """
+    entries = _read_bulk_body()
+    if entries is None:
+        return jsonify({'error': 'body must be a JSON array or NDJSON'}), 400
+    if len(entries) > MAX_BULK_ITEMS:
+        return jsonify({'error': f'at most {MAX_BULK_ITEMS} items per request'}), 413
+
+    results = [None] * len(entries)
+    valid = []
+    for i, (item, err) in enumerate(entries):
+        data, err = (None, err) if err else _clean_part(item)
+        if err:
+            results[i] = {'index': i, 'error': err}
+            continue
+        data['validation_token'] = parts_service.new_validation_token()
+        data['is_validated'] = False
+        valid.append((i, data))
+
+    if valid:
+        ids = parts_service.create_parts([d for _, d in valid])
+        if ids is None:
+            abort(503)
+        emails = []
+        for (i, data), new_id in zip(valid, ids):
+            results[i] = {'index': i, 'id': new_id}
+            if images.needs_processing(data.get('image_url')):
+                queue_image(new_id)
+            if data.get('contact_email'):
+                emails.append([data['contact_email'], new_id, data.get('title', ''), data['validation_token']])
+        if emails:
+            try:
+                from celery import group
+                from tasks import send_validation_emails
+                # One broker publish per EMAIL_BATCH messages instead of per row.
+                group(
+                    send_validation_emails.s(emails[j:j + EMAIL_BATCH])
+                    for j in range(0, len(emails), EMAIL_BATCH)
+                ).apply_async()
+            except Exception:
+                # best effort; don't fail creation if broker is not ready
+                pass
+
+    created = sum(1 for r in results if 'id' in r)
+    return jsonify({'created': created, 'failed': len(results) - created, 'results': results}), 201 if created else 400
+
+
 @bp.route('/parts/<int:part_id>', methods=['PUT', 'PATCH'])
+@admission.limit_writes('parts_write')
 def parts_update(part_id):
     if request.content_type and request.content_type.startswith('application/json'):
         data = request.get_json() or {}
@@ -71,10 +504,13 @@ def parts_update(part_id):
     ok = parts_service.update_part(part_id, data)
     if not ok:
         abort(404)
+    if images.needs_processing(data.get('image_url')):
+        queue_image(part_id)
     return jsonify({'updated': part_id})
 
 
 @bp.route('/parts/<int:part_id>', methods=['DELETE'])
+@admission.limit_writes('parts_write')
 def parts_delete(part_id):
     ok = parts_service.delete_part(part_id)
     if not ok:
@@ -83,6 +519,7 @@ def parts_delete(part_id):
 
 
 @bp.route('/parts/<int:part_id>/favourite', methods=['POST'])
+@admission.limit_writes('favourite', shed=False)
 def parts_favourite(part_id):
     # Ensure wishlist id
     wid = request.cookies.get('wishlist_id')
@@ -90,7 +527,9 @@ def parts_favourite(part_id):
     if not wid:
         wid = wishlist_service.new_wishlist_id()
         created = True
-    ok = wishlist_service.add_favorite(wid, part_id)
+    # The part's location files it on the per-location leaderboard.
+    part = parts_service.get_part(part_id)
+    ok = wishlist_service.add_favorite(wid, part_id, part.get('location') if part else None)
     resp = jsonify({'id': part_id, 'favorited': True})
     if created:
         resp.set_cookie('wishlist_id', wid, max_age=60*60*24*365)
@@ -98,6 +537,7 @@ def parts_favourite(part_id):
 
 
 @bp.route('/parts/<int:part_id>/favourite', methods=['DELETE'])
+@admission.limit_writes('favourite', shed=False)
 def parts_unfavourite(part_id):
     wid = request.cookies.get('wishlist_id')
     if not wid:
@@ -110,6 +550,52 @@ def parts_unfavourite(part_id):
 def get_wishlist():
     wid = request.cookies.get('wishlist_id')
     if not wid:
-        return jsonify([])
-    vals = list(wishlist_service.list_favorites(wid))
+        return jsonify({} if request.args.get('ids') else [])
+    # ?ids=1,2,3 returns {id: favourited} for a page of parts in one round trip
+    if request.args.get('ids'):
+        try:
+            ids = [int(x) for x in request.args['ids'].split(',') if x.strip()]
+        except Exception:
+            return jsonify({'error': 'ids must be integers'}), 400
+        return jsonify({str(k): v for k, v in wishlist_service.are_favorites(wid, ids).items()})
+    vals = sorted(wishlist_service.list_favorites(wid))
+    # ?expand=1 returns full part records fetched in one batched query
+    if request.args.get('expand') in ('1', 'true', 'yes'):
+        try:
+            fields = fields_arg(request.args)
+        except ValueError as e:
+            return _bad_fields(e)
+        if fields:
+            return Response(parts_json.list_body(fields, parts_service.get_parts_rows(vals, fields)),
+                            mimetype='application/json')
+        return jsonify(parts_service.get_parts(vals))
     return jsonify(vals)
+
+
+@bp.route('/wishlist', methods=['POST'])
+@admission.limit_writes('favourite', shed=False)
+def update_wishlist():
+    """Bulk edit: {"add": [ids], "remove": [ids], "merge": "<wishlist id>"}."""
+    data = request.get_json(silent=True) or {}
+    wid = request.cookies.get('wishlist_id')
+    created = False
+    if not wid:
+        wid = wishlist_service.new_wishlist_id()
+        created = True
+    try:
+        add = [int(x) for x in data.get('add') or []]
+        remove = [int(x) for x in data.get('remove') or []]
+    except Exception:
+        return jsonify({'error': 'add/remove must be lists of integers'}), 400
+    locations = {p['id']: p.get('location') for p in parts_service.get_parts(add)} if add else {}
+    out = {
+        'added': wishlist_service.add_favorites(wid, add, locations),
+        'removed': wishlist_service.remove_favorites(wid, remove),
+    }
+    if data.get('merge'):
+        # Copy only; the other wishlist is left untouched for its owner.
+        out['size'] = wishlist_service.merge_wishlist(str(data['merge']), wid, delete_source=False)
+    resp = jsonify(out)
+    if created:
+        resp.set_cookie('wishlist_id', wid, max_age=60*60*24*365)
+    return resp
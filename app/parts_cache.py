@@ -0,0 +1,322 @@
+"""Redis read-through cache for part records and listing pages.
+
+Every call degrades to the loader when Redis is unavailable, so the cache can
+never take the site down. Listing pages are keyed by a version counter which
+writers bump instead of hunting down individual page keys. Part records carry
+a generation counter instead: invalidation bumps it, and a loader only stores
+what it read if the generation has not moved since, so a slow load cannot
+put a row back that a concurrent write has just invalidated.
+
+``list_version_async`` and ``read_through_async`` are the asyncio versions
+used by the ASGI app; they share keys, encoding, stats and the backoff.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+try:
+    from redis_client import get_async_redis, get_redis
+except Exception:
+    from app.redis_client import get_async_redis, get_redis
+
+ENABLED = os.getenv('PARTS_CACHE_ENABLED', 'TRUE').upper() == 'TRUE'
+PART_TTL = int(os.getenv('PARTS_CACHE_TTL', '300'))
+NEGATIVE_TTL = int(os.getenv('PARTS_CACHE_NEGATIVE_TTL', '30'))
+LIST_TTL = int(os.getenv('PARTS_CACHE_LIST_TTL', '60'))
+# Only the first N pages of the validated listing are cached.
+LIST_PAGES = int(os.getenv('PARTS_CACHE_LIST_PAGES', '3'))
+# Stampede protection: one process rebuilds a missing key while the others
+# poll for up to LOCK_WAIT seconds before giving up and loading themselves.
+LOCK_TTL_MS = int(os.getenv('PARTS_CACHE_LOCK_MS', '2000'))
+LOCK_WAIT = float(os.getenv('PARTS_CACHE_LOCK_WAIT', '0.5'))
+LOCK_POLL = 0.02
+# After a Redis error, skip the cache for this long instead of paying a
+# connect timeout on every request.
+BACKOFF = float(os.getenv('PARTS_CACHE_BACKOFF', '5'))
+
+LIST_VERSION_KEY = 'parts:list:version'
+
+# Stored in place of a value so "no such row" can be cached too.
+_MISSING = '__missing__'
+
+# KEYS: the value, its generation counter; ARGV: the generation seen before
+# loading ('' for none), value, ttl. Stores only if no invalidation since.
+_SET_IF_GENERATION = """
+if (redis.call('GET', KEYS[2]) or '') ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+return 1
+"""
+_scripts: Dict[int, Any] = {}
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'negative_hits': 0, 'lock_waits': 0, 'errors': 0, 'invalidations': 0}
+
+_down_until = 0.0
+
+
+def _get_redis():
+    if time.monotonic() < _down_until:
+        raise ConnectionError('redis cache backing off')
+    return get_redis()
+
+
+def _get_async_redis():
+    if time.monotonic() < _down_until:
+        raise ConnectionError('redis cache backing off')
+    return get_async_redis()
+
+
+def _script(r):
+    if id(r) not in _scripts:
+        _scripts[id(r)] = r.register_script(_SET_IF_GENERATION)
+    return _scripts[id(r)]
+
+
+def _count(name: str, n: int = 1):
+    with _stats_lock:
+        _stats[name] += n
+
+
+def _fail():
+    global _down_until
+    _count('errors')
+    _down_until = time.monotonic() + BACKOFF
+
+
+def stats() -> Dict[str, Any]:
+    with _stats_lock:
+        out = dict(_stats)
+    lookups = out['hits'] + out['misses']
+    out['hit_ratio'] = round(out['hits'] / lookups, 4) if lookups else None
+    return out
+
+
+def part_key(part_id: int) -> str:
+    return f"part:{int(part_id)}"
+
+
+def part_generation_key(part_id: int) -> str:
+    return f"part:gen:{int(part_id)}"
+
+
+def list_page_key(version: int, limit: int, cursor: Optional[str], filters: str = '') -> str:
+    return f"parts:list:{version}:{limit}:{cursor or 'first'}{':' + filters if filters else ''}"
+
+
+def facets_key(version: int, filters: str) -> str:
+    return f"parts:facets:{version}:{filters}"
+
+
+def list_version() -> Optional[int]:
+    """Current listing version, or None when Redis is unavailable.
+
+    Callers must not cache anything under a None version: without Redis
+    there is no way to learn about later writes.
+    """
+    if not ENABLED:
+        return None
+    try:
+        v = _get_redis().get(LIST_VERSION_KEY)
+        return int(v) if v else 0
+    except Exception:
+        _fail()
+        return None
+
+
+def read_through(key: str, loader: Callable[[], Any], ttl: int, negative_ttl: Optional[int] = None,
+                 generation: Optional[str] = None):
+    """Return the cached value for ``key`` or load, store and return it.
+
+    A loader result of None is cached for ``negative_ttl`` seconds when
+    given. Concurrent misses are coalesced behind a short SET NX lock. With
+    a ``generation`` key, the result is only stored if that counter is
+    unchanged since the lookup.
+    """
+    if not ENABLED:
+        return loader()
+    gen = None
+    try:
+        r = _get_redis()
+        if generation:
+            raw, gen = r.mget(key, generation)
+        else:
+            raw = r.get(key)
+    except Exception:
+        _fail()
+        return loader()
+    if raw is not None:
+        return _decode(raw)
+
+    _count('misses')
+    lock_key = f"lock:{key}"
+    try:
+        have_lock = bool(r.set(lock_key, '1', nx=True, px=LOCK_TTL_MS))
+    except Exception:
+        have_lock = False
+    if not have_lock:
+        # Someone else is rebuilding this key; wait briefly for their result.
+        _count('lock_waits')
+        deadline = time.monotonic() + LOCK_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(LOCK_POLL)
+            try:
+                raw = r.get(key)
+            except Exception:
+                break
+            if raw is not None:
+                return _decode(raw, count=False)
+    try:
+        value = loader()
+        try:
+            if value is None:
+                if negative_ttl:
+                    _store(r, key, _MISSING, negative_ttl, generation, gen)
+            else:
+                _store(r, key, json.dumps(value), ttl, generation, gen)
+        except Exception:
+            _fail()
+        return value
+    finally:
+        if have_lock:
+            try:
+                r.delete(lock_key)
+            except Exception:
+                pass
+
+
+def _store(r, key: str, raw: str, ttl: int, generation: Optional[str], gen):
+    if generation:
+        _script(r)(keys=[key, generation], args=[gen or '', raw, ttl], client=r)
+    else:
+        r.set(key, raw, ex=ttl)
+
+
+async def _store_async(r, key: str, raw: str, ttl: int, generation: Optional[str], gen):
+    if generation:
+        await _script(r)(keys=[key, generation], args=[gen or '', raw, ttl], client=r)
+    else:
+        await r.set(key, raw, ex=ttl)
+
+
+async def list_version_async() -> Optional[int]:
+    if not ENABLED:
+        return None
+    try:
+        v = await _get_async_redis().get(LIST_VERSION_KEY)
+        return int(v) if v else 0
+    except Exception:
+        _fail()
+        return None
+
+
+async def read_through_async(key: str, loader: Callable[[], Awaitable[Any]], ttl: int,
+                             negative_ttl: Optional[int] = None, generation: Optional[str] = None):
+    """``read_through`` for coroutine loaders; waits without blocking the loop."""
+    if not ENABLED:
+        return await loader()
+    gen = None
+    try:
+        r = _get_async_redis()
+        if generation:
+            raw, gen = await r.mget(key, generation)
+        else:
+            raw = await r.get(key)
+    except Exception:
+        _fail()
+        return await loader()
+    if raw is not None:
+        return _decode(raw)
+
+    _count('misses')
+    lock_key = f"lock:{key}"
+    try:
+        have_lock = bool(await r.set(lock_key, '1', nx=True, px=LOCK_TTL_MS))
+    except Exception:
+        have_lock = False
+    if not have_lock:
+        _count('lock_waits')
+        deadline = time.monotonic() + LOCK_WAIT
+        while time.monotonic() < deadline:
+            await asyncio.sleep(LOCK_POLL)
+            try:
+                raw = await r.get(key)
+            except Exception:
+                break
+            if raw is not None:
+                return _decode(raw, count=False)
+    try:
+        value = await loader()
+        try:
+            if value is None:
+                if negative_ttl:
+                    await _store_async(r, key, _MISSING, negative_ttl, generation, gen)
+            else:
+                await _store_async(r, key, json.dumps(value), ttl, generation, gen)
+        except Exception:
+            _fail()
+        return value
+    finally:
+        if have_lock:
+            try:
+                await r.delete(lock_key)
+            except Exception:
+                pass
+
+
+def _decode(raw, count: bool = True):
+    if isinstance(raw, bytes):
+        raw = raw.decode()
+    if raw == _MISSING:
+        if count:
+            _count('hits')
+            _count('negative_hits')
+        return None
+    if count:
+        _count('hits')
+    return json.loads(raw)
+
+
+def invalidate_part(part_id: int, listing: bool = True):
+    """Drop the cached record for ``part_id`` and optionally the listing."""
+    invalidate_parts([part_id], listing=listing)
+
+
+def invalidate_parts(part_ids, listing: bool = True):
+    """Drop many cached records (and optionally the listing) in one round trip."""
+    part_ids = list(part_ids)
+    keys = [part_key(p) for p in part_ids]
+    if not ENABLED or not (keys or listing):
+        return
+    try:
+        r = _get_redis()
+        pipe = r.pipeline(transaction=False)
+        # Bump the generations before deleting, so a load that started
+        # before this write cannot store its result afterwards. They only
+        # need to outlive a load, but PART_TTL is a safe upper bound.
+        for p in part_ids:
+            pipe.incr(part_generation_key(p))
+            pipe.expire(part_generation_key(p), PART_TTL)
+        if keys:
+            pipe.delete(*keys)
+        if listing:
+            pipe.incr(LIST_VERSION_KEY)
+        pipe.execute()
+        _count('invalidations', max(1, len(keys)))
+    except Exception:
+        _fail()
+
+
+def bump_listing():
+    """Invalidate every cached listing page by moving to a new version."""
+    if not ENABLED:
+        return
+    try:
+        _get_redis().incr(LIST_VERSION_KEY)
+        _count('invalidations')
+    except Exception:
+        _fail()
@@ -0,0 +1,298 @@
+"""Listing change feed for ``GET /parts/stream`` (Server-Sent Events).
+
+Writers call ``publish``. Each event is appended to a capped Redis stream,
+which is what Last-Event-ID resume replays. It is also published on a pub/sub
+channel. Each worker process holds one pub/sub subscription and fans
+messages out to its SSE clients through bounded in-memory queues, so idle
+clients cost a queue rather than a Redis connection.
+
+A client that falls behind, or misses messages while the subscription is
+reconnecting, catches up from the stream. If its position has already
+been trimmed from the stream, it gets a ``reset`` event and should reload
+the listing.
+"""
+import json
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    from redis_client import get_redis
+except Exception:
+    from app.redis_client import get_redis
+
+STREAM_KEY = 'parts:events'
+CHANNEL = 'parts:events:live'
+# Approximate number of events kept for Last-Event-ID resume.
+STREAM_MAXLEN = int(os.getenv('PARTS_EVENTS_MAXLEN', '10000'))
+# A client further behind than this is told to reset instead of replaying.
+REPLAY_LIMIT = int(os.getenv('PARTS_EVENTS_REPLAY_LIMIT', '1000'))
+QUEUE_SIZE = int(os.getenv('PARTS_STREAM_QUEUE', '256'))
+# Per worker; keep below gunicorn's worker_connections so ordinary requests
+# still get served when the feed is full.
+MAX_SUBSCRIBERS = int(os.getenv('PARTS_STREAM_MAX_SUBSCRIBERS', '1500'))
+HEARTBEAT = float(os.getenv('PARTS_STREAM_HEARTBEAT', '15'))
+# Streams are closed after this long so clients reconnect (and rebalance
+# across workers); EventSource resumes with Last-Event-ID automatically.
+MAX_AGE = float(os.getenv('PARTS_STREAM_MAX_AGE', '3600'))
+RETRY_MS = 3000
+
+# Queued in place of an event when messages may have been missed.
+_GAP = object()
+
+
+class TooManySubscribers(Exception):
+    """This worker already serves MAX_SUBSCRIBERS streams."""
+
+
+def _parse_id(event_id: Optional[str]) -> Optional[Tuple[int, int]]:
+    if not event_id:
+        return None
+    ms, _, seq = event_id.partition('-')
+    try:
+        return int(ms), int(seq or 0)
+    except ValueError:
+        return None
+
+
+def _str(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def publish(event: str, part_id: int, part: Optional[Dict[str, Any]] = None) -> Optional[str]:
+    """Append an event to the stream and announce it; returns its id.
+
+    Best effort: a Redis outage never fails the write that triggered it.
+    """
+    payload = json.dumps({'type': event, 'id': int(part_id), 'part': part}, default=str)
+    try:
+        r = get_redis()
+        event_id = _str(r.xadd(STREAM_KEY, {'e': payload}, maxlen=STREAM_MAXLEN, approximate=True))
+        r.publish(CHANNEL, f"{event_id} {payload}")
+        return event_id
+    except Exception:
+        return None
+
+
+def latest_id() -> str:
+    entries = get_redis().xrevrange(STREAM_KEY, count=1)
+    return _str(entries[0][0]) if entries else '0-0'
+
+
+def events_since(event_id: str) -> Optional[List[Tuple[str, str]]]:
+    """Events after ``event_id``, oldest first, or None if they are gone.
+
+    None means the stream was trimmed past ``event_id`` or more than
+    REPLAY_LIMIT events have happened since; the client must reset.
+    """
+    after = _parse_id(event_id)
+    r = get_redis()
+    oldest = r.xrange(STREAM_KEY, count=1)
+    if not oldest:
+        return []
+    if after < _parse_id(_str(oldest[0][0])) and after != (0, 0):
+        return None
+    # XRANGE is inclusive (exclusive ranges need Redis 6.2); drop the start.
+    entries = r.xrange(STREAM_KEY, min=event_id, count=REPLAY_LIMIT + 1)
+    out = [(_str(eid), _str(fields.get(b'e') or fields.get('e')))
+           for eid, fields in entries if _parse_id(_str(eid)) > after]
+    if len(out) > REPLAY_LIMIT:
+        return None
+    return out
+
+
+class Subscription:
+    def __init__(self):
+        self._queue: queue.Queue = queue.Queue(QUEUE_SIZE)
+
+    def push(self, item):
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            # Slow client: drop what is queued and let it catch up from the stream.
+            self.reset()
+
+    def reset(self):
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+        try:
+            self._queue.put_nowait(_GAP)
+        except queue.Full:
+            pass
+
+    def get(self, timeout: float):
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class _Hub:
+    """One pub/sub subscription per process, fanned out to local clients."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subs: set = set()
+        self._thread = None
+        self._pid = None
+
+    def subscribe(self) -> Subscription:
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked: the parent's listener thread does not exist here.
+                self._subs = set()
+                self._thread = None
+                self._pid = os.getpid()
+            if len(self._subs) >= MAX_SUBSCRIBERS:
+                raise TooManySubscribers()
+            sub = Subscription()
+            self._subs.add(sub)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='parts-events', daemon=True)
+                self._thread.start()
+            return sub
+
+    def unsubscribe(self, sub: Subscription):
+        with self._lock:
+            self._subs.discard(sub)
+
+    def count(self) -> int:
+        with self._lock:
+            return len(self._subs) if self._pid == os.getpid() else 0
+
+    def _broadcast(self, item):
+        with self._lock:
+            subs = list(self._subs)
+        for sub in subs:
+            if item is _GAP:
+                sub.reset()
+            else:
+                sub.push(item)
+
+    def _run(self):
+        delay = 0.5
+        connected_before = False
+        while True:
+            pubsub = None
+            try:
+                pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(CHANNEL)
+                if connected_before:
+                    # Messages published while we were away are only in the stream.
+                    self._broadcast(_GAP)
+                connected_before = True
+                delay = 0.5
+                while True:
+                    msg = pubsub.get_message(timeout=1.0)
+                    if msg and msg.get('type') == 'message':
+                        event_id, _, payload = _str(msg['data']).partition(' ')
+                        # Format once, not once per client.
+                        self._broadcast((event_id, _format(event_id, payload)))
+            except Exception:
+                time.sleep(delay)
+                delay = min(delay * 2, 10.0)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+
+
+_hub = _Hub()
+
+
+def subscribers() -> int:
+    return _hub.count()
+
+
+def _format(event_id: str, payload: str) -> str:
+    event = json.loads(payload).get('type', 'message')
+    return f"id: {event_id}\nevent: {event}\ndata: {payload}\n\n"
+
+
+def _replay(position: str):
+    events = events_since(position)
+    if events is None:
+        return None
+    return [(event_id, _format(event_id, payload)) for event_id, payload in events]
+
+
+class EventStream:
+    """Iterable of SSE frames; ``close()`` (called by the WSGI server when
+    the client goes away) releases the subscription even if iteration never
+    started."""
+
+    def __init__(self, sub: Subscription, backlog, position: str):
+        self._sub = sub
+        self._frames = _frames(sub, backlog, position)
+
+    def __iter__(self):
+        return self._frames
+
+    def close(self):
+        self._frames.close()
+        _hub.unsubscribe(self._sub)
+
+
+def open_stream(last_event_id: Optional[str] = None) -> EventStream:
+    """Subscribe and return the client's stream of SSE frames.
+
+    Subscribing and the initial replay happen before returning, so Redis
+    errors and TooManySubscribers surface to the caller instead of inside
+    the response body.
+    """
+    sub = _hub.subscribe()
+    try:
+        # Subscribe first, then read the backlog: anything published in
+        # between shows up in both and is deduplicated by id below.
+        if _parse_id(last_event_id) is not None:
+            backlog = _replay(last_event_id)
+            position = last_event_id
+        else:
+            backlog, position = [], latest_id()
+    except Exception:
+        _hub.unsubscribe(sub)
+        raise
+    return EventStream(sub, backlog, position)
+
+
+def _frames(sub: Subscription, backlog, position: str) -> Iterator[str]:
+    last = _parse_id(position)
+    deadline = time.monotonic() + MAX_AGE
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        pending = backlog
+        while time.monotonic() < deadline:
+            if pending is None:
+                # Too far behind to replay: move the client to the head.
+                try:
+                    position = latest_id()
+                except Exception:
+                    return
+                last = _parse_id(position)
+                yield f"id: {position}\nevent: reset\ndata: {{}}\n\n"
+                pending = []
+            for event_id, frame in pending:
+                if _parse_id(event_id) > last:
+                    last = _parse_id(event_id)
+                    yield frame
+            pending = []
+            item = sub.get(timeout=HEARTBEAT)
+            if item is None:
+                yield ": keepalive\n\n"
+            elif item is _GAP:
+                try:
+                    pending = _replay(f"{last[0]}-{last[1]}")
+                except Exception:
+                    # Redis is down; the hub posts another gap once it is back.
+                    pending = []
+            else:
+                pending = [item]
+    finally:
+        _hub.unsubscribe(sub)
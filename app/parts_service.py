@@ -2,24 +2,136 @@
 
 Provides simple functions to list, get, create, update and delete parts.
 """
+import base64
+import hashlib
+import hmac
+import json
 import os
-from typing import List, Optional, Dict, Any
+import secrets
+from contextlib import contextmanager
+from typing import Iterable, Iterator, List, Optional, Dict, Any, Tuple
 
+try:
+    from db_pool import ConnectionPool
+    import db_router
+    import location_stats
+    import metrics
+    import parts_cache
+    import parts_events
+except Exception:
+    from app.db_pool import ConnectionPool
+    from app import db_router, location_stats, metrics, parts_cache, parts_events
 
-def get_conn():
+
+# Connection settings are read once per process rather than on every query.
+DB_SETTINGS = {
+    'host': os.getenv('DB_HOST', os.getenv('DATABASE_HOST', 'db')),
+    'user': os.getenv('DB_USER', os.getenv('DATABASE_USER', 'app')),
+    'password': os.getenv('DB_PASSWORD', os.getenv('DATABASE_PASSWORD', 'appsecret')),
+    'database': os.getenv('DB_NAME', os.getenv('DATABASE_NAME', 'appdb')),
+    'port': int(os.getenv('DB_PORT', os.getenv('DATABASE_PORT', 3306))),
+}
+
+
+def _connect(**overrides):
     # Use PyMySQL to connect to MySQL configured via env vars.
     import pymysql
-    host = os.getenv('DB_HOST', os.getenv('DATABASE_HOST', 'db'))
-    user = os.getenv('DB_USER', os.getenv('DATABASE_USER', 'app'))
-    password = os.getenv('DB_PASSWORD', os.getenv('DATABASE_PASSWORD', 'appsecret'))
-    db = os.getenv('DB_NAME', os.getenv('DATABASE_NAME', 'appdb'))
-    port = int(os.getenv('DB_PORT', os.getenv('DATABASE_PORT', 3306)))
+    kwargs = dict(DB_SETTINGS, cursorclass=metrics.instrumented_cursor(pymysql.cursors.Cursor))
+    kwargs.update(overrides)
+    return pymysql.connect(**kwargs)
+
+
+def get_conn():
+    """Open a dedicated (unpooled) connection, or None if the DB is down.
+
+    Long-running jobs such as the seed script use this; request handlers
+    should go through ``connection()`` instead.
+    """
     try:
-        return pymysql.connect(host=host, user=user, password=password, database=db, port=port, cursorclass=pymysql.cursors.Cursor)
+        return _connect()
     except Exception:
         return None
 
 
+def _new_pool(connect) -> ConnectionPool:
+    return ConnectionPool(
+        connect,
+        size=int(os.getenv('DB_POOL_SIZE', '5')),
+        max_overflow=int(os.getenv('DB_POOL_MAX_OVERFLOW', '5')),
+        timeout=float(os.getenv('DB_POOL_TIMEOUT', '5')),
+        max_idle=float(os.getenv('DB_POOL_MAX_IDLE', '300')),
+        ping_after=float(os.getenv('DB_POOL_PING_AFTER', '1')),
+    )
+
+
+def _replica_pools() -> List[Tuple[str, ConnectionPool]]:
+    # DB_READ_HOSTS=replica1:3306,replica2 ; credentials default to the primary's.
+    pools = []
+    for target in filter(None, (h.strip() for h in os.getenv('DB_READ_HOSTS', '').split(','))):
+        host, _, port = target.partition(':')
+        overrides = {
+            'host': host,
+            'port': int(port or DB_SETTINGS['port']),
+            'user': os.getenv('DB_READ_USER', DB_SETTINGS['user']),
+            'password': os.getenv('DB_READ_PASSWORD', DB_SETTINGS['password']),
+        }
+        pools.append((target, _new_pool(lambda o=overrides: _connect(**o))))
+    return pools
+
+
+_pool = _new_pool(_connect)
+_router = db_router.Router(
+    _pool,
+    _replica_pools(),
+    max_lag=float(os.getenv('DB_REPLICA_MAX_LAG', '5')),
+    lag_check=float(os.getenv('DB_REPLICA_LAG_CHECK', '2')),
+    retry_after=float(os.getenv('DB_REPLICA_RETRY', '10')),
+)
+# How long a client keeps reading from the primary after its own write.
+READ_YOUR_WRITES = float(os.getenv('DB_READ_YOUR_WRITES', '10'))
+
+
+@contextmanager
+def connection(replica_ok: bool = False):
+    """Check out a pooled connection for the duration of the block.
+
+    With ``replica_ok`` the block may be served by a replica (see db_router)
+    and must not write. Reads whose results go into the shared Redis cache
+    stay on the primary: a lagging replica would pin stale rows there for
+    the whole TTL. Yields None when the DB is unreachable or the pool is
+    exhausted past its checkout timeout, mirroring ``get_conn``. The
+    connection is rolled back and returned to its pool on exit, or
+    discarded if the block raised.
+    """
+    try:
+        conn, pool = _router.checkout(replica_ok)
+    except Exception:
+        # PoolTimeout or a failed connect
+        conn = None
+    if conn is None:
+        yield None
+        return
+    try:
+        yield conn
+    except BaseException:
+        pool.checkin(conn, discard=True)
+        raise
+    else:
+        pool.checkin(conn)
+
+
+def pool_stats() -> Dict[str, Any]:
+    stats = _pool.stats()
+    if _router.replicas:
+        stats['replicas'] = _router.stats()
+        stats['replica_fallbacks'] = _router.fallbacks
+    return stats
+
+
+class DBUnavailable(Exception):
+    """Raised by cache loaders so an outage is never cached as "no rows"."""
+
+
 def init_db(seed: bool = True) -> bool:
     conn = get_conn()
     if not conn:
@@ -38,31 +150,37 @@ def init_db(seed: bool = True) -> bool:
                 contact_email TEXT,
                 contact_phone TEXT,
                 validation_token VARCHAR(128),
+                validation_token_hash BINARY(32),
+                token_created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
                 is_validated TINYINT(1) DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+                location_key VARCHAR(191) GENERATED ALWAYS AS (LEFT(LOWER(TRIM(location)), 191)) VIRTUAL,
+                UNIQUE KEY uq_parts_validation_token_hash (validation_token_hash),
+                KEY idx_parts_unvalidated_token (is_validated, token_created_at),
+                KEY idx_parts_location_created (is_validated, location_key, created_at, id),
+                KEY idx_parts_location_price (is_validated, location_key, price),
+                KEY idx_parts_validated_price (is_validated, price)
             )
             """
         )
-        # Ensure migrations for older DBs: add columns if they are missing
-        try:
-            cur.execute("ALTER TABLE parts ADD COLUMN IF NOT EXISTS validation_token VARCHAR(128)")
-            cur.execute("ALTER TABLE parts ADD COLUMN IF NOT EXISTS is_validated TINYINT(1) DEFAULT 0")
-        except Exception:
-            # Some MySQL versions may not support IF NOT EXISTS; fallback to safe checks
-            try:
-                cur.execute("SELECT validation_token FROM parts LIMIT 1")
-            except Exception:
-                try:
-                    cur.execute("ALTER TABLE parts ADD COLUMN validation_token VARCHAR(128)")
-                except Exception:
-                    pass
-            try:
-                cur.execute("SELECT is_validated FROM parts LIMIT 1")
-            except Exception:
-                try:
-                    cur.execute("ALTER TABLE parts ADD COLUMN is_validated TINYINT(1) DEFAULT 0")
-                except Exception:
-                    pass
+        # Ensure migrations for older DBs: add columns if they are missing.
+        # One metadata lookup instead of ALTER/SELECT probes on every start.
+        cur.execute(
+            "SELECT COLUMN_NAME FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'parts'"
+        )
+        have = {r[0].lower() for r in cur.fetchall()}
+        for column, ddl in (
+            ("validation_token", "VARCHAR(128)"),
+            ("is_validated", "TINYINT(1) DEFAULT 0"),
+            ("updated_at", "TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6)"),
+            # Indexes and the backfill come from migrations/0006_parts_validation_token_hash.sql.
+            ("validation_token_hash", "BINARY(32)"),
+            ("token_created_at", "TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP"),
+            ("location_key", "VARCHAR(191) GENERATED ALWAYS AS (LEFT(LOWER(TRIM(location)), 191)) VIRTUAL"),
+        ):
+            if column not in have:
+                cur.execute(f"ALTER TABLE parts ADD COLUMN {column} {ddl}")
         conn.commit()
 
         # Seeding via SQL migrations is handled by the seed job (app/migrations/db_data.sql).      
@@ -73,90 +191,662 @@ def init_db(seed: bool = True) -> bool:
         conn.close()
 
 
-def list_parts(limit: int = 100) -> List[Dict[str, Any]]:
-    conn = get_conn()
-    out: List[Dict[str, Any]] = []
-    if not conn:
-        return out
+# Columns returned by the public listing/bulk reads, in row-tuple order.
+PART_COLUMNS = "id, title, description, price, location, image_url, contact_email, contact_phone, created_at, updated_at"
+# Index of the first column selected after PART_COLUMNS.
+PART_WIDTH = 10
+# Fields of the public part dict; ``?fields=`` picks a subset of these.
+PART_FIELDS = tuple(c.strip() for c in PART_COLUMNS.split(','))
+# Projected rows start with these columns, whatever was asked for: the
+# cursor needs (created_at, id) and the ETag (id, updated_at).
+ROW_HEAD = ('id', 'created_at', 'updated_at')
+
+# Upper bound on ids per ``IN (...)`` query in get_parts.
+GET_PARTS_CHUNK = 500
+
+
+def _iso(value) -> Optional[str]:
+    # created_at may be returned as a datetime or as a string depending on
+    # the DB driver/configuration. Normalize to an ISO string when
+    # possible, otherwise coerce to str.
+    if not value:
+        return None
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+def _row_to_dict(r) -> Dict[str, Any]:
+    """Map a row selected with PART_COLUMNS to the public part dict."""
+    return {
+        "id": r[0],
+        "title": r[1],
+        "description": r[2],
+        "price": r[3],
+        "location": r[4],
+        "image_url": r[5],
+        "contact_email": r[6],
+        "contact_phone": r[7],
+        "created_at": _iso(r[8]),
+        "updated_at": _iso(r[9]),
+    }
+
+
+def _pack_cursor(values: List[Any]) -> str:
+    raw = json.dumps(values)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def _unpack_cursor(cursor: str) -> List[Any]:
     try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise ValueError('invalid cursor')
+    if not isinstance(values, list):
+        raise ValueError('invalid cursor')
+    return values
+
+
+# Listing cursors are signed so that clients cannot forge the page index,
+# which decides what goes into the Redis listing cache. Every app process
+# must share CURSOR_SECRET (docker-compose.yml requires it); without one,
+# cursors only validate in the process that issued them.
+CURSOR_SECRET = os.getenv('CURSOR_SECRET', '').encode()
+if not CURSOR_SECRET:
+    print("[parts_service] CURSOR_SECRET is not set; using a per-process key")
+    CURSOR_SECRET = secrets.token_bytes(32)
+
+
+def _cursor_signature(payload: str) -> str:
+    digest = hmac.new(CURSOR_SECRET, payload.encode(), hashlib.sha256).digest()[:12]
+    return base64.urlsafe_b64encode(digest).decode()
+
+
+def encode_cursor(created_at, part_id: int, page: int = 1) -> str:
+    """Build an opaque, signed keyset cursor from the last row of a page.
+
+    ``page`` is the zero-based index of the page the cursor points at; it
+    only decides whether that page is eligible for the listing cache.
+    """
+    if hasattr(created_at, 'isoformat'):
+        created_at = created_at.isoformat(sep=' ')
+    payload = _pack_cursor([str(created_at) if created_at else None, int(part_id), int(page)])
+    return f"{payload}.{_cursor_signature(payload)}"
+
+
+def decode_cursor(cursor: str) -> Tuple[Optional[str], int, int]:
+    """Inverse of encode_cursor. Raises ValueError on malformed or forged input."""
+    payload, _, signature = cursor.rpartition('.')
+    try:
+        valid = bool(payload) and hmac.compare_digest(signature.encode(), _cursor_signature(payload).encode())
+    except UnicodeError:
+        valid = False
+    if not valid:
+        raise ValueError('invalid cursor')
+    try:
+        created_at, part_id, page = _unpack_cursor(payload)
+        page = int(page)
+    except Exception:
+        raise ValueError('invalid cursor')
+    if page < 1:
+        raise ValueError('invalid cursor')
+    return created_at, int(part_id), page
+
+
+def location_key(location: Optional[str]) -> Optional[str]:
+    """Python twin of the parts.location_key generated column."""
+    if location is None:
+        return None
+    return location.strip(' ').lower()[:191]
+
+
+def _filter_sql(location: Optional[str] = None, min_price: Optional[int] = None,
+                max_price: Optional[int] = None) -> Tuple[str, List[Any]]:
+    """``AND ...`` conditions (and their params) for the listing filters."""
+    sql = ""
+    params: List[Any] = []
+    if location is not None:
+        sql += " AND location_key = %s"
+        params.append(location_key(location))
+    if min_price is not None:
+        sql += " AND price >= %s"
+        params.append(int(min_price))
+    if max_price is not None:
+        sql += " AND price <= %s"
+        params.append(int(max_price))
+    return sql, params
+
+
+def cacheable_prices(min_price: Optional[int], max_price: Optional[int]) -> bool:
+    """Whether price bounds are unset or on facet bucket edges (see facets_result)."""
+    return (min_price is None or min_price in PRICE_BUCKETS) and \
+        (max_price is None or max_price + 1 in PRICE_BUCKETS)
+
+
+def known_location(location: Optional[str], facets: Optional[Dict[str, List[Dict[str, Any]]]]) -> bool:
+    """Whether ``location`` is unset or listed in the unfiltered location facet."""
+    if location is None:
+        return True
+    return facets is not None and location_key(location) in {f['value'] for f in facets['location']}
+
+
+def filters_key(location: Optional[str], min_price: Optional[int], max_price: Optional[int]) -> str:
+    if location is None and min_price is None and max_price is None:
+        return ''
+    return _pack_cursor([location_key(location), min_price, max_price])
+
+
+def list_parts_page(
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    location: Optional[str] = None,
+    min_price: Optional[int] = None,
+    max_price: Optional[int] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Return one page of validated parts, newest first, plus the next cursor.
+
+    Pages are keyset-paginated on (created_at, id) so every page is an index
+    range scan on idx_parts_validated_created (idx_parts_location_created
+    when filtering by location) regardless of depth. ``location`` matches
+    case-insensitively; prices are inclusive bounds. Pass the same filters
+    with the returned cursor, which is None on the last page. The first
+    ``parts_cache.LIST_PAGES`` pages are served from the Redis cache when
+    the request is cache-eligible (see ``_cache_version``).
+    """
+    page = decode_cursor(cursor)[2] if cursor else 0
+    filters = (location, min_price, max_price)
+    try:
+        version = _cache_version(limit, page, *filters)
+        if version is None:
+            # Pages that are not cached may come from a replica.
+            return _load_parts_page(limit, cursor, *filters, replica_ok=True)
+        return _cached_parts_page(version, limit, cursor, *filters)
+    except DBUnavailable:
+        return [], None
+
+
+def _cache_version(limit, page, location, min_price, max_price) -> Optional[int]:
+    """The listing version to cache a page under, or None to skip the cache.
+
+    Every cached page is keyed by its query, so only a bounded set of
+    queries is eligible: the first LIST_PAGES pages at a CACHE_LIMITS page
+    size, with prices on bucket edges and a location from the location
+    facet. Anything else would let clients mint Redis keys at will.
+    """
+    if page >= parts_cache.LIST_PAGES or limit not in CACHE_LIMITS or not cacheable_prices(min_price, max_price):
+        return None
+    version = parts_cache.list_version()
+    if version is None or (location is not None and not known_location(location, facet_counts())):
+        return None
+    return version
+
+
+def _cached_parts_page(version, limit, cursor, location, min_price, max_price):
+    def load():
+        items, next_cursor = _load_parts_page(limit, cursor, location, min_price, max_price)
+        return {'items': items, 'next': next_cursor}
+
+    key = parts_cache.list_page_key(version, limit, cursor, filters_key(location, min_price, max_price))
+    cached = parts_cache.read_through(key, load, parts_cache.LIST_TTL)
+    return cached['items'], cached['next']
+
+
+def page_query(limit: int, cursor: Optional[str], location: Optional[str] = None,
+               min_price: Optional[int] = None, max_price: Optional[int] = None,
+               columns: str = PART_COLUMNS) -> Tuple[str, tuple, int]:
+    """(sql, params, page index) for one listing page; shared with async_service."""
+    filter_sql, params = _filter_sql(location, min_price, max_price)
+    where = "is_validated=1" + filter_sql
+    page = 0
+    if cursor:
+        created_at, last_id, page = decode_cursor(cursor)
+        if created_at is None:
+            where += " AND created_at IS NULL AND id < %s"
+            params.append(last_id)
+        else:
+            where += " AND (created_at < %s OR (created_at = %s AND id < %s))"
+            params.extend([created_at, created_at, last_id])
+    # Fetch one extra row to learn whether another page exists.
+    params.append(limit + 1)
+    sql = f"SELECT {columns} FROM parts WHERE {where} ORDER BY created_at DESC, id DESC LIMIT %s"
+    return sql, tuple(params), page
+
+
+def page_result(rows, limit: int, page: int) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Turn the rows of ``page_query`` into (items, next cursor)."""
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][8], rows[-1][0], page + 1)
+    return [_row_to_dict(r) for r in rows], next_cursor
+
+
+def _load_parts_page(limit: int, cursor: Optional[str], location: Optional[str] = None,
+                     min_price: Optional[int] = None, max_price: Optional[int] = None,
+                     replica_ok: bool = False) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    sql, params, page = page_query(limit, cursor, location, min_price, max_price)
+    with connection(replica_ok) as conn:
+        if not conn:
+            raise DBUnavailable()
         cur = conn.cursor()
-        cur.execute(
-            "SELECT id, title, description, price, location, image_url, contact_email, contact_phone, created_at FROM parts WHERE is_validated=1 ORDER BY created_at DESC LIMIT %s",
-            (limit,),
+        cur.execute(sql, params)
+        rows = cur.fetchall()
+    return page_result(rows, limit, page)
+
+
+def list_parts(limit: int = 100, cursor: Optional[str] = None) -> List[Dict[str, Any]]:
+    return list_parts_page(limit, cursor)[0]
+
+
+def parse_fields(spec: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """The fields named in a ``?fields=a,b`` list, in PART_FIELDS order.
+
+    Returns None (all fields) for an empty list; raises ValueError naming
+    any field that is not in PART_FIELDS.
+    """
+    names = set(f.strip() for f in (spec or '').split(',') if f.strip())
+    if not names:
+        return None
+    unknown = names.difference(PART_FIELDS)
+    if unknown:
+        raise ValueError(', '.join(sorted(unknown)))
+    return tuple(f for f in PART_FIELDS if f in names)
+
+
+def projected_columns(fields: Tuple[str, ...]) -> str:
+    return ', '.join(ROW_HEAD + fields)
+
+
+def project_parts(parts: List[Dict[str, Any]], fields: Tuple[str, ...]) -> List[tuple]:
+    """Projected rows (see projected_columns) from public part dicts."""
+    return [(p['id'], p['created_at'], p['updated_at']) + tuple(p[f] for f in fields) for p in parts]
+
+
+def projected_page_result(rows, limit: int, page: int) -> Tuple[List[tuple], Optional[str]]:
+    """``page_result`` for rows selected with projected_columns."""
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][1], rows[-1][0], page + 1)
+    return list(rows), next_cursor
+
+
+def _load_projected_page(limit, cursor, location, min_price, max_price, fields):
+    sql, params, page = page_query(limit, cursor, location, min_price, max_price,
+                                   columns=projected_columns(fields))
+    with connection(replica_ok=True) as conn:
+        if not conn:
+            raise DBUnavailable()
+        cur = conn.cursor()
+        cur.execute(sql, params)
+        rows = cur.fetchall()
+    return projected_page_result(rows, limit, page)
+
+
+def list_parts_rows(
+    fields: Tuple[str, ...],
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    location: Optional[str] = None,
+    min_price: Optional[int] = None,
+    max_price: Optional[int] = None,
+) -> Tuple[List[tuple], Optional[str]]:
+    """``list_parts_page`` as projected rows holding only ``fields``.
+
+    Pages that list_parts_page would serve from Redis are projected from
+    that cache entry, so projections share it instead of each caching their
+    own copy. Other pages select only the projected columns, which keeps
+    ``description`` off the wire when it is not wanted. Time columns may be
+    datetimes or ISO strings; parts_json encodes both alike.
+    """
+    page = decode_cursor(cursor)[2] if cursor else 0
+    filters = (location, min_price, max_price)
+    try:
+        version = _cache_version(limit, page, *filters)
+        if version is not None:
+            items, next_cursor = _cached_parts_page(version, limit, cursor, *filters)
+            return project_parts(items, fields), next_cursor
+        return _load_projected_page(limit, cursor, *filters, fields)
+    except DBUnavailable:
+        return [], None
+
+
+# Upper edges of the price facet buckets; the last bucket is open-ended.
+PRICE_BUCKETS = (25, 50, 100, 250, 500, 1000)
+# Most common locations returned in the location facet.
+FACET_LOCATIONS = 50
+# Page sizes whose listing pages may be cached: the index grid and the API
+# default.
+CACHE_LIMITS = frozenset(int(n) for n in os.getenv('PARTS_CACHE_LIMITS', '50,100').split(',') if n.strip())
+
+
+def facet_counts(
+    location: Optional[str] = None,
+    min_price: Optional[int] = None,
+    max_price: Optional[int] = None,
+) -> Optional[Dict[str, List[Dict[str, Any]]]]:
+    """Counts of validated parts per location and per price bucket.
+
+    Each facet applies every filter except its own, so the counts say what
+    choosing another value would return. Both are GROUP BY queries answered
+    from idx_parts_location_price / idx_parts_validated_price without
+    touching rows. Cached with the listing when the filters are
+    cache-eligible; None if the DB is down.
+    """
+    filters = (location, min_price, max_price)
+    try:
+        version = parts_cache.list_version() if cacheable_prices(min_price, max_price) else None
+        if version is not None and location is not None and not known_location(location, facet_counts()):
+            version = None
+        if version is None:
+            return _load_facets(*filters, replica_ok=True)
+        return parts_cache.read_through(
+            parts_cache.facets_key(version, filters_key(*filters) or 'all'),
+            lambda: _load_facets(*filters),
+            parts_cache.LIST_TTL,
         )
-        for r in cur.fetchall():
-            # created_at may be returned as a datetime or as a string depending on
-            # the DB driver/configuration. Normalize to an ISO string when
-            # possible, otherwise coerce to str.
-            created = None
-            if r[8]:
-                if hasattr(r[8], 'isoformat'):
-                    created = r[8].isoformat()
-                else:
-                    created = str(r[8])
-            out.append(
-                {
-                    "id": r[0],
-                    "title": r[1],
-                    "description": r[2],
-                    "price": r[3],
-                    "location": r[4],
-                    "image_url": r[5],
-                    "contact_email": r[6],
-                    "contact_phone": r[7],
-                    "created_at": created,
-                }
-            )
-        return out
-    finally:
-        conn.close()
+    except DBUnavailable:
+        return None
+
+
+def facet_queries(location=None, min_price=None, max_price=None) -> Dict[str, Tuple[str, tuple]]:
+    """(sql, params) per facet; exposed so benchmarks can EXPLAIN them."""
+    price_sql, price_params = _filter_sql(None, min_price, max_price)
+    loc_sql, loc_params = _filter_sql(location)
+    edges = ', '.join(str(int(e)) for e in PRICE_BUCKETS)
+    return {
+        'location': (
+            "SELECT location_key, COUNT(*) AS n FROM parts"
+            f" WHERE is_validated=1 AND location_key IS NOT NULL{price_sql}"
+            " GROUP BY location_key ORDER BY n DESC, location_key LIMIT %s",
+            (*price_params, FACET_LOCATIONS),
+        ),
+        # INTERVAL(price, e1, e2, ...) is the index of the bucket price falls in.
+        'price': (
+            f"SELECT INTERVAL(price, {edges}) AS bucket, COUNT(*) FROM parts"
+            f" WHERE is_validated=1 AND price IS NOT NULL{loc_sql} GROUP BY bucket",
+            tuple(loc_params),
+        ),
+    }
+
+
+def _load_facets(location, min_price, max_price, replica_ok: bool = False) -> Dict[str, List[Dict[str, Any]]]:
+    queries = facet_queries(location, min_price, max_price)
+    with connection(replica_ok) as conn:
+        if not conn:
+            raise DBUnavailable()
+        cur = conn.cursor()
+        cur.execute(*queries['location'])
+        location_rows = cur.fetchall()
+        cur.execute(*queries['price'])
+        price_rows = cur.fetchall()
+    return facets_result(location_rows, price_rows)
+
+
+def facets_result(location_rows, price_rows) -> Dict[str, List[Dict[str, Any]]]:
+    """Shape the rows of the two ``facet_queries`` for the API."""
+    locations = [{'value': r[0], 'count': int(r[1])} for r in location_rows]
+    by_bucket = {int(r[0]): int(r[1]) for r in price_rows}
+    prices = []
+    lower = None
+    for i, upper in enumerate(PRICE_BUCKETS + (None,)):
+        # min is inclusive, max exclusive; usable as min_price / max_price - 1
+        prices.append({'min': lower, 'max': upper, 'count': by_bucket.get(i, 0)})
+        lower = upper
+    return {'location': locations, 'price': prices}
 
 
 def get_part(part_id: int) -> Optional[Dict[str, Any]]:
-    conn = get_conn()
-    if not conn:
-        return None
+    """Fetch one part (read-through cached; misses are negatively cached)."""
     try:
+        return parts_cache.read_through(
+            parts_cache.part_key(part_id),
+            lambda: _load_part(part_id),
+            parts_cache.PART_TTL,
+            negative_ttl=parts_cache.NEGATIVE_TTL,
+            generation=parts_cache.part_generation_key(part_id),
+        )
+    except DBUnavailable:
+        return None
+
+
+PART_QUERY = f"SELECT {PART_COLUMNS}, is_validated FROM parts WHERE id = %s"
+
+
+def part_result(r) -> Optional[Dict[str, Any]]:
+    if not r:
+        return None
+    part = _row_to_dict(r)
+    part["is_validated"] = bool(r[PART_WIDTH])
+    return part
+
+
+def _load_part(part_id: int) -> Optional[Dict[str, Any]]:
+    with connection(replica_ok=not parts_cache.ENABLED) as conn:
+        if not conn:
+            raise DBUnavailable()
+        cur = conn.cursor()
+        cur.execute(PART_QUERY, (part_id,))
+        return part_result(cur.fetchone())
+
+
+def get_parts(ids: Iterable[Any], validated_only: bool = False) -> List[Dict[str, Any]]:
+    """Fetch many parts with one ``WHERE id IN (...)`` query per chunk.
+
+    Results follow the order of ``ids`` (first occurrence wins for
+    duplicates); ids that are invalid or have no row are skipped, as are
+    unvalidated parts when ``validated_only`` is set.
+    """
+    wanted = unique_ids(ids)
+    if not wanted:
+        return []
+    found: Dict[int, Dict[str, Any]] = {}
+    with connection(replica_ok=True) as conn:
+        if not conn:
+            return []
+        cur = conn.cursor()
+        for sql, params in parts_queries(wanted, validated_only):
+            cur.execute(sql, params)
+            for r in cur.fetchall():
+                found[r[0]] = _row_to_dict(r)
+    return [found[pid] for pid in wanted if pid in found]
+
+
+def unique_ids(ids: Iterable[Any]) -> List[int]:
+    """Valid integer ids in first-seen order, without duplicates."""
+    wanted: List[int] = []
+    seen = set()
+    for pid in ids:
+        try:
+            pid = int(pid)
+        except (TypeError, ValueError):
+            continue
+        if pid not in seen:
+            seen.add(pid)
+            wanted.append(pid)
+    return wanted
+
+
+def get_parts_rows(ids: Iterable[Any], fields: Tuple[str, ...], validated_only: bool = False) -> List[tuple]:
+    """``get_parts`` as projected rows, selecting only the projected columns."""
+    wanted = unique_ids(ids)
+    if not wanted:
+        return []
+    found: Dict[int, tuple] = {}
+    with connection(replica_ok=True) as conn:
+        if not conn:
+            return []
+        cur = conn.cursor()
+        for sql, params in parts_queries(wanted, validated_only, projected_columns(fields)):
+            cur.execute(sql, params)
+            for r in cur.fetchall():
+                found[r[0]] = r
+    return [found[pid] for pid in wanted if pid in found]
+
+
+def parts_queries(wanted: List[int], validated_only: bool = False,
+                  columns: str = PART_COLUMNS) -> Iterator[Tuple[str, tuple]]:
+    """One ``IN (...)`` query per GET_PARTS_CHUNK ids."""
+    for i in range(0, len(wanted), GET_PARTS_CHUNK):
+        chunk = wanted[i:i + GET_PARTS_CHUNK]
+        placeholders = ','.join(['%s'] * len(chunk))
+        yield (
+            f"SELECT {columns} FROM parts WHERE id IN ({placeholders})"
+            + (" AND is_validated = 1" if validated_only else ""),
+            tuple(chunk),
+        )
+
+
+def search_parts(
+    q: str,
+    location: Optional[str] = None,
+    min_price: Optional[int] = None,
+    max_price: Optional[int] = None,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Full-text search over validated parts, best matches first.
+
+    Uses the ft_parts_title_description FULLTEXT index in natural language
+    mode. Pages are keyset-paginated on (score, id); each result carries its
+    relevance ``score``. Raises ValueError on a malformed cursor.
+    """
+    out: List[Dict[str, Any]] = []
+    match = "MATCH(title, description) AGAINST (%s IN NATURAL LANGUAGE MODE)"
+    where = ["is_validated=1", match]
+    params: List[Any] = [q, q]
+    if location:
+        where.append("location = %s")
+        params.append(location)
+    if min_price is not None:
+        where.append("price >= %s")
+        params.append(min_price)
+    if max_price is not None:
+        where.append("price <= %s")
+        params.append(max_price)
+    having = ""
+    if cursor:
+        try:
+            score, last_id = _unpack_cursor(cursor)
+            score, last_id = float(score), int(last_id)
+        except Exception:
+            raise ValueError('invalid cursor')
+        having = " HAVING (score < %s OR (score = %s AND id < %s))"
+        params.extend([score, score, last_id])
+    params.append(limit + 1)
+    with connection(replica_ok=True) as conn:
+        if not conn:
+            return out, None
         cur = conn.cursor()
         cur.execute(
-            "SELECT id, title, description, price, location, image_url, contact_email, contact_phone, created_at, is_validated, validation_token FROM parts WHERE id = %s",
-            (part_id,),
+            f"SELECT {PART_COLUMNS}, {match} AS score FROM parts"
+            f" WHERE {' AND '.join(where)}{having} ORDER BY score DESC, id DESC LIMIT %s",
+            tuple(params),
         )
-        r = cur.fetchone()
-        if not r:
-            return None
-        # Normalize created_at as above
-        created = None
-        if r[8]:
-            if hasattr(r[8], 'isoformat'):
-                created = r[8].isoformat()
-            else:
-                created = str(r[8])
-        return {
-            "id": r[0],
-            "title": r[1],
-            "description": r[2],
-            "price": r[3],
-            "location": r[4],
-            "image_url": r[5],
-            "contact_email": r[6],
-            "contact_phone": r[7],
-            "created_at": created,
-            "is_validated": bool(r[9]),
-            "validation_token": r[10],
-        }
-    finally:
-        conn.close()
+        rows = cur.fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _pack_cursor([rows[-1][PART_WIDTH], rows[-1][0]])
+    for r in rows:
+        part = _row_to_dict(r)
+        part["score"] = r[PART_WIDTH]
+        out.append(part)
+    return out, next_cursor
 
 
-def create_part(data: Dict[str, Any]) -> Optional[int]:
-    conn = get_conn()
-    if not conn:
+EXPORT_COLUMNS = ["id", "title", "description", "price", "location", "image_url", "contact_email", "contact_phone", "created_at", "updated_at", "is_validated"]
+
+
+def iter_parts(
+    validated: Optional[bool] = None,
+    since: Optional[str] = None,
+    location: Optional[str] = None,
+    after_id: int = 0,
+    batch: int = 1000,
+) -> Iterator[Dict[str, Any]]:
+    """Stream parts in id order through an unbuffered server-side cursor.
+
+    Memory stays flat regardless of table size. ``after_id`` resumes an
+    interrupted export from the last id received. Raises DBUnavailable if
+    no connection can be checked out.
+    """
+    import pymysql
+    where = ["id > %s"]
+    params: List[Any] = [after_id]
+    if validated is not None:
+        where.append("is_validated = %s")
+        params.append(1 if validated else 0)
+    if since:
+        where.append("created_at >= %s")
+        params.append(since)
+    if location:
+        where.append("location = %s")
+        params.append(location)
+    with connection(replica_ok=True) as conn:
+        if not conn:
+            raise DBUnavailable()
+        cur = conn.cursor(metrics.instrumented_cursor(pymysql.cursors.SSCursor))
+        cur.execute(
+            f"SELECT {PART_COLUMNS}, is_validated FROM parts WHERE {' AND '.join(where)} ORDER BY id",
+            tuple(params),
+        )
+        # If the consumer stops early, GeneratorExit propagates and the pool
+        # discards the connection rather than draining the rest of the result.
+        while True:
+            rows = cur.fetchmany(batch)
+            if not rows:
+                break
+            for r in rows:
+                part = _row_to_dict(r)
+                part["is_validated"] = bool(r[PART_WIDTH])
+                yield part
+        cur.close()
+
+
+# Validation links stop working after TOKEN_TTL seconds; unvalidated rows
+# older than PURGE_AFTER are deleted by purge_unvalidated in batches.
+TOKEN_TTL = int(os.getenv('VALIDATION_TOKEN_TTL', str(7 * 24 * 3600)))
+PURGE_AFTER = int(os.getenv('UNVALIDATED_PURGE_AFTER', str(TOKEN_TTL)))
+PURGE_BATCH = int(os.getenv('UNVALIDATED_PURGE_BATCH', '500'))
+PURGE_MAX_BATCHES = int(os.getenv('UNVALIDATED_PURGE_MAX_BATCHES', '20'))
+
+
+def new_validation_token() -> str:
+    """A fresh URL-safe token; only its hash is stored."""
+    return secrets.token_urlsafe(32)
+
+
+def hash_token(token: Optional[str]) -> Optional[bytes]:
+    """SHA-256 digest stored in (and looked up by) parts.validation_token_hash."""
+    if not token:
         return None
-    try:
+    return hashlib.sha256(token.encode('utf-8')).digest()
+
+
+def _flag(value) -> int:
+    """``is_validated`` as the 0/1 MySQL stores; form posts send strings like "0"."""
+    if isinstance(value, str):
+        return 0 if value.strip().lower() in ('', '0', 'false', 'no', 'off') else 1
+    return 1 if value else 0
+
+
+def _lock_stats_state(cur, part_id: int):
+    """(location, description, is_validated) of a row, locked for update."""
+    cur.execute("SELECT location, description, is_validated FROM parts WHERE id = %s FOR UPDATE", (part_id,))
+    r = cur.fetchone()
+    return tuple(r) if r else None
+
+
+def create_part(data: Dict[str, Any]) -> Optional[int]:
+    validated = _flag(data.get("is_validated"))
+    with connection() as conn:
+        if not conn:
+            return None
         cur = conn.cursor()
         cur.execute(
-            "INSERT INTO parts (title, description, price, location, image_url, contact_email, contact_phone, validation_token, is_validated) VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s)",
+            "INSERT INTO parts (title, description, price, location, image_url, contact_email, contact_phone, validation_token_hash, is_validated) VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s)",
             (
                 data.get("title"),
                 data.get("description"),
@@ -165,72 +855,241 @@ def create_part(data: Dict[str, Any]) -> Optional[int]:
                 data.get("image_url"),
                 data.get("contact_email"),
                 data.get("contact_phone"),
-                data.get("validation_token"),
-                1 if data.get("is_validated") else 0,
+                hash_token(data.get("validation_token")),
+                validated,
             ),
         )
         new_id = cur.lastrowid
+        location_stats.apply(cur, None, (data.get("location"), data.get("description"), validated))
         conn.commit()
-        return new_id
-    finally:
-        conn.close()
+        db_router.note_write()
+    # Clear any negative entry for the new id; only validated rows are listed.
+    parts_cache.invalidate_part(new_id, listing=bool(validated))
+    return new_id
+
+
+# Rows per multi-row INSERT in create_parts.
+CREATE_BATCH = 500
+
+_INSERT_COLUMNS = ["title", "description", "price", "location", "image_url", "contact_email", "contact_phone", "validation_token_hash", "is_validated"]
+
+
+def create_parts(items: List[Dict[str, Any]], batch: int = CREATE_BATCH) -> Optional[List[int]]:
+    """Insert many parts; returns their new ids in input order.
+
+    Each batch is one multi-row INSERT, and all batches share a single
+    transaction: if any of them fails, nothing is committed, so there are
+    no rows the caller has no ids (and sends no validation emails) for.
+    Every item must carry a unique ``validation_token``, which is used to
+    map rows back to ids through its hash (auto-increment values of a
+    multi-row insert are not guaranteed to be consecutive). Returns None if
+    the DB is down.
+    """
+    ids: List[int] = []
+    with connection() as conn:
+        if not conn:
+            return None
+        cur = conn.cursor()
+        for i in range(0, len(items), batch):
+            chunk = items[i:i + batch]
+            rows = []
+            hashes = []
+            for d in chunk:
+                row = [d.get(k) for k in _INSERT_COLUMNS]
+                row[-2] = hash_token(d["validation_token"])
+                row[-1] = _flag(d.get("is_validated"))
+                rows.append(tuple(row))
+                hashes.append(row[-2])
+            # Every id allocated below is above the current maximum, which
+            # bounds the token lookup to a primary-key range scan.
+            cur.execute("SELECT COALESCE(MAX(id), 0) FROM parts")
+            floor_id = cur.fetchone()[0]
+            # PyMySQL turns executemany on INSERT ... VALUES into multi-row statements.
+            cur.executemany(
+                f"INSERT INTO parts ({', '.join(_INSERT_COLUMNS)}) VALUES ({','.join(['%s'] * len(_INSERT_COLUMNS))})",
+                rows,
+            )
+            cur.execute(
+                f"SELECT id, validation_token_hash FROM parts WHERE id > %s AND validation_token_hash IN ({','.join(['%s'] * len(hashes))})",
+                (floor_id, *hashes),
+            )
+            by_hash = {bytes(r[1]): r[0] for r in cur.fetchall()}
+            for d, row in zip(chunk, rows):
+                if row[-1]:
+                    location_stats.apply(cur, None, (d.get("location"), d.get("description"), 1))
+            ids.extend(by_hash[h] for h in hashes)
+        conn.commit()
+        db_router.note_write()
+    parts_cache.invalidate_parts(ids, listing=any(_flag(d.get("is_validated")) for d in items))
+    return ids
 
 
 def update_part(part_id: int, data: Dict[str, Any]) -> bool:
     # Build a dynamic update statement for provided fields
-    allowed = ["title", "description", "price", "location", "image_url", "contact_email", "contact_phone", "is_validated", "validation_token"]
+    allowed = ["title", "description", "price", "location", "image_url", "contact_email", "contact_phone", "is_validated"]
+    if "is_validated" in data:
+        # Normalise once so the UPDATE and the location_stats delta agree.
+        data = dict(data, is_validated=_flag(data["is_validated"]))
     set_parts = []
     params = []
     for k in allowed:
         if k in data:
             set_parts.append(f"{k} = %s")
             params.append(data[k])
+    if "validation_token" in data:
+        # Reissuing a token restarts its expiry clock.
+        set_parts.append("validation_token_hash = %s, token_created_at = CURRENT_TIMESTAMP")
+        params.append(hash_token(data["validation_token"]))
     if not set_parts:
         return False
     params.append(part_id)
     sql = f"UPDATE parts SET {', '.join(set_parts)} WHERE id = %s"
-    conn = get_conn()
-    if not conn:
-        return False
-    try:
+    tracked = ("location", "description", "is_validated")
+    with connection() as conn:
+        if not conn:
+            return False
         cur = conn.cursor()
+        old = None
+        if any(k in data for k in tracked):
+            old = _lock_stats_state(cur, part_id)
         cur.execute(sql, tuple(params))
         if cur.rowcount == 0:
             return False
+        if old is not None:
+            new = tuple(data[k] if k in data else old[i] for i, k in enumerate(tracked))
+            location_stats.apply(cur, old, new)
         conn.commit()
-        return True
-    finally:
-        conn.close()
+        db_router.note_write()
+    parts_cache.invalidate_part(part_id)
+    # Only listed (validated) parts appear in the public feed.
+    part = get_part(part_id)
+    if part and part.get("is_validated"):
+        parts_events.publish("updated", part_id, part)
+    elif old is not None and old[2]:
+        parts_events.publish("deleted", part_id)
+    return True
+
+
+def replace_image_url(part_id: int, expected: Optional[str], image_url: str) -> bool:
+    """Point a part at its processed image, unless it changed meanwhile.
+
+    Compare-and-set on the old value, so an edit that lands while the
+    thumbnail is being made is not overwritten. Returns True if updated.
+    """
+    with connection() as conn:
+        if not conn:
+            return False
+        cur = conn.cursor()
+        cur.execute(
+            "UPDATE parts SET image_url = %s WHERE id = %s AND image_url <=> %s",
+            (image_url, part_id, expected),
+        )
+        if cur.rowcount == 0:
+            return False
+        conn.commit()
+        db_router.note_write()
+    parts_cache.invalidate_part(part_id)
+    part = get_part(part_id)
+    if part and part.get("is_validated"):
+        parts_events.publish("updated", part_id, part)
+    return True
+
+
+def parts_with_unprocessed_images(thumb_prefix: str, after_id: int = 0, limit: int = 500) -> Optional[List[Tuple[int, str]]]:
+    """(id, image_url) of parts whose image is not under ``thumb_prefix`` yet."""
+    with connection(replica_ok=True) as conn:
+        if not conn:
+            return None
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT id, image_url FROM parts WHERE id > %s AND image_url IS NOT NULL AND image_url <> ''"
+            " AND image_url NOT LIKE %s ORDER BY id LIMIT %s",
+            (after_id, thumb_prefix.replace('%', r'\%').replace('_', r'\_') + '%', limit),
+        )
+        return [(r[0], r[1]) for r in cur.fetchall()]
 
 
 def delete_part(part_id: int) -> bool:
-    conn = get_conn()
-    if not conn:
-        return False
-    try:
+    with connection() as conn:
+        if not conn:
+            return False
         cur = conn.cursor()
+        old = _lock_stats_state(cur, part_id)
         cur.execute("DELETE FROM parts WHERE id = %s", (part_id,))
         if cur.rowcount == 0:
             return False
+        location_stats.apply(cur, old, None)
         conn.commit()
-        return True
-    finally:
-        conn.close()
+        db_router.note_write()
+    parts_cache.invalidate_part(part_id)
+    if old and old[2]:
+        parts_events.publish("deleted", part_id)
+    return True
 
 
 def validate_token(token: str) -> bool:
-    """Mark a part as validated by token. Returns True if a row was updated."""
+    """Mark a part as validated by token. Returns True if a row was updated.
+
+    Expired tokens (older than TOKEN_TTL) are rejected.
+    """
     if not token:
         return False
-    conn = get_conn()
-    if not conn:
-        return False
-    try:
+    with connection() as conn:
+        if not conn:
+            return False
         cur = conn.cursor()
-        cur.execute("UPDATE parts SET is_validated=1, validation_token=NULL WHERE validation_token = %s", (token,))
-        if cur.rowcount == 0:
+        # Look up the row first so the cache and location stats can follow it.
+        # The unique index on the hash keeps this to a single-row lock.
+        cur.execute(
+            "SELECT id, location, description, is_validated FROM parts"
+            " WHERE validation_token_hash = %s AND token_created_at >= NOW() - INTERVAL %s SECOND FOR UPDATE",
+            (hash_token(token), TOKEN_TTL),
+        )
+        r = cur.fetchone()
+        if not r:
             return False
+        part_id = r[0]
+        cur.execute("UPDATE parts SET is_validated=1, validation_token_hash=NULL WHERE id = %s", (part_id,))
+        location_stats.apply(cur, (r[1], r[2], r[3]), (r[1], r[2], 1))
         conn.commit()
-        return True
-    finally:
-        conn.close()
+        db_router.note_write()
+    parts_cache.invalidate_part(part_id)
+    parts_events.publish("created", part_id, get_part(part_id))
+    return True
+
+
+def purge_unvalidated(older_than: Optional[int] = None, batch: int = PURGE_BATCH,
+                      max_batches: int = PURGE_MAX_BATCHES) -> Optional[int]:
+    """Delete unvalidated parts created more than ``older_than`` seconds ago.
+
+    Works in batches of ``batch`` rows, each its own short transaction, and
+    stops after ``max_batches`` so one run never holds locks for long.
+    Returns the number of rows deleted, or None if the DB is down.
+    """
+    older_than = PURGE_AFTER if older_than is None else older_than
+    deleted = 0
+    for _ in range(max_batches):
+        with connection() as conn:
+            if not conn:
+                return deleted or None
+            cur = conn.cursor()
+            cur.execute(
+                "SELECT id FROM parts WHERE is_validated = 0 AND token_created_at < NOW() - INTERVAL %s SECOND"
+                " ORDER BY token_created_at LIMIT %s",
+                (older_than, batch),
+            )
+            ids = [r[0] for r in cur.fetchall()]
+            if not ids:
+                break
+            # Re-check is_validated: a link may have been clicked in between.
+            # Unvalidated rows are not in location_stats, so nothing to move.
+            cur.execute(
+                f"DELETE FROM parts WHERE is_validated = 0 AND id IN ({','.join(['%s'] * len(ids))})",
+                tuple(ids),
+            )
+            deleted += cur.rowcount
+            conn.commit()
+        parts_cache.invalidate_parts(ids, listing=False)
+        if len(ids) < batch:
+            break
+    return deleted
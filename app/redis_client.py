@@ -0,0 +1,69 @@
+"""Shared, fork-safe Redis client.
+
+Each worker process gets one ``redis.ConnectionPool`` which every service
+shares. The pool is rebuilt after a fork so children never reuse sockets
+opened by their parent. ``get_async_redis`` is the ``redis.asyncio``
+counterpart for the ASGI app (see asgi.py), with the same settings. Both
+clients count their round trips in the per-request metrics.
+"""
+import os
+import threading
+
+try:
+    import metrics
+except Exception:
+    from app import metrics
+
+_lock = threading.Lock()
+_client = None
+_client_pid = None
+_async_client = None
+_async_pid = None
+
+
+def _settings():
+    return {
+        'url': os.getenv('REDIS_URL', os.getenv('REDIS', 'redis://redis:6379/0')),
+        'max_connections': int(os.getenv('REDIS_MAX_CONNECTIONS', '20')),
+        'socket_timeout': float(os.getenv('REDIS_SOCKET_TIMEOUT', '1')),
+        'socket_connect_timeout': float(os.getenv('REDIS_CONNECT_TIMEOUT', '1')),
+        'health_check_interval': 30,
+    }
+
+
+def get_redis():
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is not None and _client_pid == pid:
+        return _client
+    with _lock:
+        if _client is None or _client_pid != pid:
+            import redis
+            pool = redis.ConnectionPool.from_url(**_settings())
+            _client = metrics.instrumented_redis_classes()[0](connection_pool=pool)
+            _client_pid = pid
+    return _client
+
+
+def get_async_redis():
+    """The process's ``redis.asyncio`` client.
+
+    Only use it from one event loop per process (uvicorn runs one per
+    worker); connections are opened lazily on that loop.
+    """
+    global _async_client, _async_pid
+    pid = os.getpid()
+    if _async_client is None or _async_pid != pid:
+        import redis.asyncio
+        pool = redis.asyncio.ConnectionPool.from_url(**_settings())
+        _async_client = metrics.instrumented_redis_classes()[1](connection_pool=pool)
+        _async_pid = pid
+    return _async_client
+
+
+async def close_async_redis():
+    global _async_client
+    if _async_client is not None and _async_pid == os.getpid():
+        await _async_client.close()
+        await _async_client.connection_pool.disconnect()
+    _async_client = None
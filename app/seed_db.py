@@ -15,10 +15,166 @@ except Exception:
     from app.parts_service import init_db, get_conn
 
 
+# Commit after this many statements while executing a file.
+COMMIT_EVERY = int(os.getenv('SEED_COMMIT_EVERY', '50'))
+# Seconds between progress lines for long files.
+PROGRESS_EVERY = float(os.getenv('SEED_PROGRESS_EVERY', '5'))
+
+# MySQL errors that mean "already there" when re-running a file against a DB
+# that predates the migration ledger: table/column/key exists, duplicate row,
+# can't drop a missing key.
+BENIGN_ERRORS = {1050, 1060, 1061, 1062, 1091}
+
+LEDGER_DDL = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    filename VARCHAR(255) NOT NULL PRIMARY KEY,
+    checksum CHAR(64) NOT NULL,
+    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+
+def iter_statements(fh):
+    """Yield SQL statements from a file object without reading it whole.
+
+    Splits on ``;`` outside quotes, backticks and comments. ``--``/``#``
+    line comments are dropped; ``/* ... */`` blocks are kept because
+    mysqldump uses ``/*!40101 ... */`` for version-gated statements. Each
+    statement is assembled from a list of slices, so long extended-INSERT
+    lines are handled in linear time.
+    """
+    parts = []
+    quote = None        # one of ' " ` while inside a quoted string/identifier
+    block = False       # inside /* ... */
+    escape = False      # previous char was a backslash inside a string
+    for line in fh:
+        i = 0
+        start = 0
+        n = len(line)
+        while i < n:
+            c = line[i]
+            if escape:
+                escape = False
+            elif quote:
+                if c == '\\' and quote != '`':
+                    escape = True
+                elif c == quote:
+                    quote = None
+            elif block:
+                if c == '*' and line.startswith('*/', i):
+                    block = False
+                    i += 1
+            elif c in ("'", '"', '`'):
+                quote = c
+            elif c == '/' and line.startswith('/*', i):
+                block = True
+                i += 1
+            elif c == '#' or (c == '-' and line.startswith('--', i) and (i + 2 >= n or line[i + 2] in ' \t\r\n')):
+                # Keep the line break so the tokens around the comment stay apart.
+                parts.append(line[start:i])
+                parts.append('\n')
+                start = n
+                break
+            elif c == ';':
+                parts.append(line[start:i])
+                stmt = ''.join(parts).strip()
+                if stmt:
+                    yield stmt
+                parts = []
+                start = i + 1
+            i += 1
+        if start < n:
+            parts.append(line[start:])
+    stmt = ''.join(parts).strip()
+    if stmt:
+        yield stmt
+
+
+def _checksum(path: str) -> str:
+    import hashlib
+    h = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _execute_file(conn, path: str, label: str) -> bool:
+    """Stream and execute one SQL file; returns False if a statement failed."""
+    import time
+    cur = conn.cursor()
+    ok = True
+    statements = rows = 0
+    started = last_report = time.monotonic()
+    with open(path, 'r', encoding='utf-8') as fh:
+        for stmt in iter_statements(fh):
+            try:
+                cur.execute(stmt)
+                if cur.rowcount and cur.rowcount > 0:
+                    rows += cur.rowcount
+            except Exception as e:
+                code = e.args[0] if getattr(e, 'args', None) else None
+                if code in BENIGN_ERRORS:
+                    print(f"[seed_db] {label}: skipping (already applied): {e}")
+                else:
+                    # Keep going to report every failure; the file stays
+                    # unrecorded and apply_migrations fails startup.
+                    print(f"[seed_db] ERROR: {label} statement failed: {e}", file=sys.stderr)
+                    ok = False
+            statements += 1
+            if statements % COMMIT_EVERY == 0:
+                conn.commit()
+            now = time.monotonic()
+            if now - last_report >= PROGRESS_EVERY:
+                print(f"[seed_db] {label}: {statements} statements, {rows} rows ({rows / (now - started):.0f} rows/s)")
+                last_report = now
+    conn.commit()
+    elapsed = time.monotonic() - started
+    print(f"[seed_db] {label}: done, {statements} statements, {rows} rows in {elapsed:.2f}s"
+          f" ({rows / elapsed if elapsed else 0:.0f} rows/s)")
+    return ok
+
+
+def _applied(conn):
+    cur = conn.cursor()
+    cur.execute(LEDGER_DDL)
+    cur.execute("SELECT filename, checksum FROM schema_migrations")
+    applied = dict(cur.fetchall())
+    conn.commit()
+    return applied
+
+
+def _apply_file(conn, applied, path: str, label: str) -> bool:
+    """Execute ``path`` unless the ledger already has it; record it on success.
+
+    Returns False if a statement failed. The file is then left out of the
+    ledger and would run again, partly applied, on the next start.
+    """
+    name = os.path.basename(path)
+    checksum = _checksum(path)
+    if name in applied:
+        if applied[name] != checksum:
+            print(f"[seed_db] WARNING: {name} changed since it was applied; not re-applying", file=sys.stderr)
+        return True
+    print(f"[seed_db] {label}: {name}")
+    if not _execute_file(conn, path, name):
+        print(f"[seed_db] ERROR: {name} failed and was not recorded; fix it before restarting", file=sys.stderr)
+        return False
+    cur = conn.cursor()
+    cur.execute("INSERT INTO schema_migrations (filename, checksum) VALUES (%s, %s)", (name, checksum))
+    conn.commit()
+    applied[name] = checksum
+    return True
+
+
 def apply_migrations():
     """Apply SQL migration files found in app/migrations/ in alphabetical order.
-    Each file is executed as a single SQL script using the same DB connection
-    parameters the application uses.
+
+    Files are streamed statement by statement using the same DB connection
+    parameters the application uses. Applied files are recorded with their
+    SHA-256 in ``schema_migrations`` and skipped on later runs, so startup
+    against an existing database only costs one ledger query. Returns False,
+    failing startup, if a file could not be applied in full.
     """
     migrations_dir = os.path.join(os.path.dirname(__file__), 'migrations')
     if not os.path.isdir(migrations_dir):
@@ -43,53 +199,18 @@ def apply_migrations():
         print("[seed_db] ERROR: DB not available to apply migrations", file=sys.stderr)
         return False
     try:
-        cur = conn.cursor()
+        applied = _applied(conn)
         for fname in files:
-            path = os.path.join(migrations_dir, fname)
-            print(f"[seed_db] applying migration: {fname}")
-            with open(path, 'r') as fh:
-                sql = fh.read()
-            # Execute the SQL script. Some drivers do not support executescript,
-            # so split on semicolon and execute individual statements.
-            stmt = ''
-            for line in sql.splitlines():
-                stmt += line + '\n'
-                if line.strip().endswith(';'):
-                    try:
-                        cur.execute(stmt)
-                    except Exception as e:
-                        # Log and continue; CREATE TABLE IF NOT EXISTS is idempotent
-                        print(f"[seed_db] migration statement failed: {e}")
-                    stmt = ''
-            if stmt.strip():
-                try:
-                    cur.execute(stmt)
-                except Exception as e:
-                    print(f"[seed_db] migration final statement failed: {e}")
-        conn.commit()
+            # Stop at the first failure: later files may depend on it.
+            if not _apply_file(conn, applied, os.path.join(migrations_dir, fname), 'applying migration'):
+                return False
         # Optionally import a SQL data-only dump after migrations are applied.
         import_dump = os.getenv('IMPORT_DUMP', 'FALSE').upper() == 'TRUE'
         if import_dump:
             dump_path = os.getenv('DUMP_FILE', os.path.join(migrations_dir, 'db_data.sql'))
             if os.path.isfile(dump_path):
-                print(f"[seed_db] importing data dump from: {dump_path}")
-                with open(dump_path, 'r') as fh:
-                    dump_sql = fh.read()
-                stmt = ''
-                for line in dump_sql.splitlines():
-                    stmt += line + '\n'
-                    if line.strip().endswith(';'):
-                        try:
-                            cur.execute(stmt)
-                        except Exception as e:
-                            print(f"[seed_db] data import statement failed: {e}")
-                        stmt = ''
-                if stmt.strip():
-                    try:
-                        cur.execute(stmt)
-                    except Exception as e:
-                        print(f"[seed_db] data import final statement failed: {e}")
-                conn.commit()
+                if not _apply_file(conn, applied, dump_path, 'importing data dump'):
+                    return False
             else:
                 print(f"[seed_db] data dump file not found at {dump_path}; skipping import")
         return True
@@ -97,6 +218,28 @@ def apply_migrations():
         conn.close()
 
 
+def backfill_location_stats():
+    """Populate part_location_stats on first run (e.g. after a dump import)."""
+    try:
+        import location_stats
+    except Exception:
+        from app import location_stats
+    conn = get_conn()
+    if not conn:
+        return
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT EXISTS(SELECT 1 FROM part_location_stats)")
+        if cur.fetchone()[0]:
+            return
+        n = location_stats.rebuild(conn)
+        print(f"[seed_db] backfilled location stats for {n} locations")
+    except Exception as e:
+        print(f"[seed_db] location stats backfill failed: {e}")
+    finally:
+        conn.close()
+
+
 def main():
     # First attempt to apply any SQL migrations bundled with the app, then
     # delegate to the existing init_db (which will perform any missing
@@ -109,6 +252,7 @@ def main():
     seed = True
     ok = init_db(seed=seed)
     if ok:
+        backfill_location_stats()
         print("[seed_db] OK: DB initialized/seeded")
         return 0
     else:
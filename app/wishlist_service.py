@@ -1,38 +1,275 @@
-import os
 import uuid
-from typing import Set, Optional
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Set, Optional, Tuple
+
+try:
+    from redis_client import get_redis
+except Exception:
+    from app.redis_client import get_redis
 
 
 def _get_redis():
-    import redis
-    url = os.getenv('REDIS_URL', os.getenv('REDIS', 'redis://redis:6379/0'))
-    return redis.from_url(url)
+    # One pooled client per worker process (see redis_client.get_redis)
+    return get_redis()
+
+
+def wishlist_key(wishlist_id: str) -> str:
+    return f"wishlist:{wishlist_id}"
+
+
+def _ids(part_ids: Iterable[int]) -> List[int]:
+    return [int(p) for p in part_ids]
+
+
+# Favourite counts: a global sorted set plus one per location, scored by
+# the number of wishlists holding each part. POPULAR_LOCATIONS remembers
+# each part's location so removals and merges can find its per-location set.
+POPULAR_KEY = 'popular:all'
+POPULAR_LOCATION_PREFIX = 'popular:loc:'
+POPULAR_LOCATIONS = 'popular:locations'
+
+# Counters move only when SADD/SREM actually changed the set, inside the
+# same script, so retries and double clicks never double count.
+_COUNT_CHANGES = """
+local function bump(id, loc, delta)
+  local score = tonumber(redis.call('ZINCRBY', KEYS[2], delta, id))
+  if score <= 0 then redis.call('ZREM', KEYS[2], id) end
+  if loc then
+    local key = ARGV[1] .. loc
+    score = tonumber(redis.call('ZINCRBY', key, delta, id))
+    if score <= 0 then redis.call('ZREM', key, id) end
+  end
+end
+local function location(id, given)
+  if given and given ~= '' then
+    redis.call('HSET', KEYS[3], id, given)
+    return given
+  end
+  return redis.call('HGET', KEYS[3], id)
+end
+"""
+
+_ADD_SCRIPT = _COUNT_CHANGES + """
+local changed = 0
+for i = 3, #ARGV, 2 do
+  local loc = location(ARGV[i], ARGV[i + 1])
+  if redis.call('SADD', KEYS[1], ARGV[i]) == 1 then
+    changed = changed + 1
+    bump(ARGV[i], loc, 1)
+  end
+end
+return changed
+"""
+
+_REMOVE_SCRIPT = _COUNT_CHANGES + """
+local changed = 0
+for i = 3, #ARGV, 2 do
+  if redis.call('SREM', KEYS[1], ARGV[i]) == 1 then
+    changed = changed + 1
+    bump(ARGV[i], location(ARGV[i], nil), -1)
+  end
+end
+return changed
+"""
+
+# KEYS[1] target, KEYS[4] source; ARGV[2] == '1' deletes the source.
+_MERGE_SCRIPT = _COUNT_CHANGES + """
+local drop = ARGV[2] == '1'
+for _, id in ipairs(redis.call('SMEMBERS', KEYS[4])) do
+  local delta = redis.call('SADD', KEYS[1], id)
+  if drop then delta = delta - 1 end
+  if delta ~= 0 then bump(id, location(id, nil), delta) end
+end
+if drop then redis.call('DEL', KEYS[4]) end
+return redis.call('SCARD', KEYS[1])
+"""
+
+_scripts: Dict[Tuple[int, str], object] = {}
+
+
+def _script(r, source: str):
+    # register_script caches the SHA and falls back to EVAL on NOSCRIPT;
+    # works for both the sync and the redis.asyncio client.
+    key = (id(r), source)
+    if key not in _scripts:
+        _scripts[key] = r.register_script(source)
+    return _scripts[key]
+
+
+def location_key(location: Optional[str]) -> Optional[str]:
+    """Normalised location used in per-location leaderboard keys."""
+    if not location or not location.strip():
+        return None
+    return location.strip().lower()
+
+
+def change_call(wishlist_id: str, part_ids: Iterable[int],
+                locations: Optional[Dict[int, str]] = None) -> Optional[Tuple[List[str], List]]:
+    """(keys, args) for _ADD_SCRIPT / _REMOVE_SCRIPT, or None if there is nothing to do.
+
+    Shared with the asyncio client in async_service.
+    """
+    ids = _ids(part_ids)
+    if not ids:
+        return None
+    locations = locations or {}
+    args: List = [POPULAR_LOCATION_PREFIX, '']
+    for pid in ids:
+        args.extend([pid, location_key(locations.get(pid)) or ''])
+    return [wishlist_key(wishlist_id), POPULAR_KEY, POPULAR_LOCATIONS], args
+
+
+def _change(script: str, wishlist_id: str, part_ids: Iterable[int], locations: Optional[Dict[int, str]] = None) -> int:
+    call = change_call(wishlist_id, part_ids, locations)
+    if call is None:
+        return 0
+    r = _get_redis()
+    return _script(r, script)(keys=call[0], args=call[1], client=r)
 
 
 def new_wishlist_id() -> str:
     return uuid.uuid4().hex
 
 
-def add_favorite(wishlist_id: str, part_id: int) -> bool:
-    r = _get_redis()
-    key = f"wishlist:{wishlist_id}"
-    return r.sadd(key, int(part_id)) == 1
+def add_favorite(wishlist_id: str, part_id: int, location: Optional[str] = None) -> bool:
+    """Favourite a part; ``location`` files it on that location's leaderboard."""
+    return _change(_ADD_SCRIPT, wishlist_id, [part_id], {int(part_id): location}) == 1
 
 
 def remove_favorite(wishlist_id: str, part_id: int) -> bool:
-    r = _get_redis()
-    key = f"wishlist:{wishlist_id}"
-    return r.srem(key, int(part_id)) == 1
+    return _change(_REMOVE_SCRIPT, wishlist_id, [part_id]) == 1
 
 
 def list_favorites(wishlist_id: str) -> Set[int]:
     r = _get_redis()
-    key = f"wishlist:{wishlist_id}"
+    key = wishlist_key(wishlist_id)
     vals = r.smembers(key) or set()
     return set(int(x) for x in vals)
 
 
 def is_favorite(wishlist_id: str, part_id: int) -> bool:
     r = _get_redis()
-    key = f"wishlist:{wishlist_id}"
+    key = wishlist_key(wishlist_id)
     return r.sismember(key, int(part_id))
+
+
+def add_favorites(wishlist_id: str, part_ids: Iterable[int], locations: Optional[Dict[int, str]] = None) -> int:
+    """Add many parts in one round trip. Returns how many were new.
+
+    ``locations`` maps part ids to their location for the per-location
+    leaderboards.
+    """
+    return _change(_ADD_SCRIPT, wishlist_id, part_ids, locations)
+
+
+def remove_favorites(wishlist_id: str, part_ids: Iterable[int]) -> int:
+    """Remove many parts in one round trip. Returns how many were present."""
+    return _change(_REMOVE_SCRIPT, wishlist_id, part_ids)
+
+
+def are_favorites(wishlist_id: str, part_ids: Iterable[int]) -> Dict[int, bool]:
+    """Favourite flag for each of ``part_ids``, pipelined into one round trip."""
+    ids = _ids(part_ids)
+    if not ids:
+        return {}
+    key = wishlist_key(wishlist_id)
+    # SMISMEMBER needs Redis 6.2; a pipeline of SISMEMBER works everywhere.
+    pipe = _get_redis().pipeline(transaction=False)
+    for pid in ids:
+        pipe.sismember(key, pid)
+    return {pid: bool(flag) for pid, flag in zip(ids, pipe.execute())}
+
+
+def merge_wishlist(source_id: str, target_id: str, delete_source: bool = True) -> int:
+    """Merge ``source_id`` into ``target_id`` atomically; returns the new size.
+
+    Typically used to fold an anonymous wishlist into another one.
+    """
+    r = _get_redis()
+    if source_id == target_id:
+        return r.scard(wishlist_key(target_id))
+    return _script(r, _MERGE_SCRIPT)(
+        keys=[wishlist_key(target_id), POPULAR_KEY, POPULAR_LOCATIONS, wishlist_key(source_id)],
+        args=[POPULAR_LOCATION_PREFIX, '1' if delete_source else '0'],
+        client=r,
+    )
+
+
+def top_favorites(limit: int = 10, location: Optional[str] = None) -> List[Tuple[int, int]]:
+    """Most-favourited parts as (part_id, wishlists) pairs, highest first."""
+    key = POPULAR_KEY
+    if location is not None:
+        loc = location_key(location)
+        if loc is None:
+            return []
+        key = POPULAR_LOCATION_PREFIX + loc
+    rows = _get_redis().zrevrange(key, 0, max(0, limit - 1), withscores=True)
+    return [(int(member), int(score)) for member, score in rows]
+
+
+def rebuild_popularity(location_of: Callable[[List[int]], Dict[int, Optional[str]]],
+                       scan_count: int = 1000, batch: int = 1000) -> Dict[str, int]:
+    """Recompute the leaderboards from the wishlists themselves.
+
+    Wishlist keys are walked with SCAN and each set with SSCAN, so Redis is
+    never blocked for long. ``location_of`` maps part ids to locations and
+    leaves out parts that no longer exist, which drops them from the boards.
+    New sets are built under temporary keys and swapped in with RENAME;
+    favourites changed while the scan runs may be off by one until the
+    next run.
+    """
+    r = _get_redis()
+    counts: Counter = Counter()
+    wishlists = 0
+    for key in r.scan_iter(match=wishlist_key('*'), count=scan_count):
+        wishlists += 1
+        for member in r.sscan_iter(key, count=scan_count):
+            counts[int(member)] += 1
+
+    ids = list(counts)
+    locations: Dict[int, Optional[str]] = {}
+    for i in range(0, len(ids), batch):
+        locations.update(location_of(ids[i:i + batch]))
+
+    tmp = 'popular:rebuild:'
+    by_location: Dict[str, Dict[int, int]] = {}
+    pipe = r.pipeline(transaction=False)
+    pipe.delete(tmp + 'all', tmp + 'locations')
+    kept = [pid for pid in ids if pid in locations]
+    for i in range(0, len(kept), batch):
+        chunk = kept[i:i + batch]
+        pipe.zadd(tmp + 'all', {pid: counts[pid] for pid in chunk})
+        mapping = {}
+        for pid in chunk:
+            loc = location_key(locations[pid])
+            if loc:
+                mapping[pid] = loc
+                by_location.setdefault(loc, {})[pid] = counts[pid]
+        if mapping:
+            pipe.hset(tmp + 'locations', mapping=mapping)
+        pipe.execute()
+    for loc, scores in by_location.items():
+        pipe.delete(tmp + 'loc:' + loc)
+        pipe.zadd(tmp + 'loc:' + loc, scores)
+    pipe.execute()
+
+    # Swap in the new boards and drop locations that no longer have any.
+    stale = set(r.scan_iter(match=POPULAR_LOCATION_PREFIX + '*', count=scan_count))
+    pipe = r.pipeline(transaction=True)
+    # RENAME fails on a missing source, so empty boards are deleted instead.
+    if kept:
+        pipe.rename(tmp + 'all', POPULAR_KEY)
+    else:
+        pipe.delete(POPULAR_KEY)
+    if by_location:
+        pipe.rename(tmp + 'locations', POPULAR_LOCATIONS)
+    else:
+        pipe.delete(POPULAR_LOCATIONS)
+    for loc in by_location:
+        pipe.rename(tmp + 'loc:' + loc, POPULAR_LOCATION_PREFIX + loc)
+        stale.discard((POPULAR_LOCATION_PREFIX + loc).encode())
+        stale.discard(POPULAR_LOCATION_PREFIX + loc)
+    if stale:
+        pipe.delete(*stale)
+    pipe.execute()
+    return {'wishlists': wishlists, 'parts': len(kept), 'locations': len(by_location)}
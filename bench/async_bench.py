@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""Sync (gunicorn) vs async (uvicorn asgi:app) throughput under I/O latency.
+
+Drives the read and wishlist scenarios of load_test against both servers
+at increasing concurrency and reports requests/s and p50/p95/p99 for each,
+plus the async/sync throughput ratio. The gain only shows when requests
+spend their time waiting, so put latency between the servers and their
+backends, either with ``tc qdisc add dev eth0 root netem delay 20ms`` on
+the db/redis containers or with the delay proxy built in here:
+
+    python bench/async_bench.py proxy --listen 13306 --target 127.0.0.1:3306 --delay-ms 20 &
+    python bench/async_bench.py proxy --listen 16379 --target 127.0.0.1:6379 --delay-ms 20 &
+    # start both servers with DB_PORT=13306 REDIS_URL=redis://127.0.0.1:16379/0
+    (cd app && gunicorn -w 2 -k sync -b 127.0.0.1:8000 app:app) &
+    (cd app && uvicorn --workers 2 --port 8001 asgi:app) &
+    DB_HOST=127.0.0.1 REDIS_URL=redis://127.0.0.1:6379/0 python bench/async_bench.py run \\
+        --sync-url http://127.0.0.1:8000 --async-url http://127.0.0.1:8001
+
+Compare like with like: the same number of worker processes on each side.
+"""
+import argparse
+import asyncio
+import sys
+
+from common import bench_part_ids, compare, emit, git_revision, seed_parts, seed_wishlists
+from load_test import run_scenario, scenarios
+
+SCENARIOS = ('index', 'parts_list', 'parts_get', 'favourite_add', 'wishlist')
+
+
+def bench_scenarios(part_ids, wishlists):
+    available = scenarios(part_ids, wishlists)
+
+    def wishlist(rng):
+        return 'GET', '/wishlist?expand=1', None, {'Cookie': f"wishlist_id={rng.choice(wishlists)}"}
+
+    available['wishlist'] = wishlist
+    return {name: available[name] for name in SCENARIOS}
+
+
+def run(args):
+    seed_parts(args.rows)
+    part_ids = bench_part_ids()
+    if not part_ids:
+        raise SystemExit("no validated synthetic parts to read")
+    wishlists = seed_wishlists(args.wishlists, args.wishlist_size, part_ids)
+    available = bench_scenarios(part_ids, wishlists)
+    names = args.only.split(',') if args.only else list(available)
+    levels = [int(c) for c in args.concurrency.split(',')]
+
+    report = {
+        'benchmark': 'async_bench',
+        'revision': git_revision(),
+        'rows': args.rows,
+        'duration_s': args.duration,
+        'scenarios': {},
+    }
+    for i, name in enumerate(names):
+        by_level = report['scenarios'][name] = {}
+        for concurrency in levels:
+            row = by_level[f"c{concurrency}"] = {}
+            for mode, url in (('sync', args.sync_url), ('async', args.async_url)):
+                print(f"[bench] {name} c={concurrency} {mode} ...", file=sys.stderr)
+                row[mode] = run_scenario(url, available[name], concurrency, args.duration, seed=i * 1000)
+            if row['sync']['rps'] and row['async']['rps']:
+                row['async_over_sync_rps'] = round(row['async']['rps'] / row['sync']['rps'], 2)
+    if args.baseline:
+        compare(report, args.baseline)
+    emit(report, args.output)
+    return 0
+
+
+async def _pipe(reader, writer, delay):
+    try:
+        while True:
+            chunk = await reader.read(65536)
+            if not chunk:
+                break
+            if delay:
+                await asyncio.sleep(delay)
+            writer.write(chunk)
+            await writer.drain()
+    except (ConnectionError, asyncio.CancelledError):
+        pass
+    finally:
+        writer.close()
+
+
+async def _proxy(listen, target, delay):
+    host, _, port = target.partition(':')
+
+    async def handle(client_reader, client_writer):
+        try:
+            server_reader, server_writer = await asyncio.open_connection(host, int(port))
+        except OSError:
+            client_writer.close()
+            return
+        # Delay client -> server only: each request/response exchange gains one ``delay``.
+        await asyncio.gather(
+            _pipe(client_reader, server_writer, delay),
+            _pipe(server_reader, client_writer, 0),
+        )
+
+    server = await asyncio.start_server(handle, '127.0.0.1', listen)
+    print(f"[bench] proxy 127.0.0.1:{listen} -> {target} (+{delay * 1000:.0f}ms)", file=sys.stderr)
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = ap.add_subparsers(dest='command', required=True)
+
+    r = sub.add_parser('run', help='benchmark both servers')
+    r.add_argument('--sync-url', default='http://127.0.0.1:8000')
+    r.add_argument('--async-url', default='http://127.0.0.1:8001')
+    r.add_argument('--rows', type=int, default=10000)
+    r.add_argument('--wishlists', type=int, default=100)
+    r.add_argument('--wishlist-size', type=int, default=20)
+    r.add_argument('--concurrency', default='4,16,64,256', help='comma-separated client counts')
+    r.add_argument('--duration', type=float, default=10.0, help='seconds per scenario and level')
+    r.add_argument('--only', help='comma-separated scenario names')
+    r.add_argument('--baseline', help='earlier JSON report to compare against')
+    r.add_argument('--output')
+
+    p = sub.add_parser('proxy', help='TCP proxy that adds latency to every request')
+    p.add_argument('--listen', type=int, required=True)
+    p.add_argument('--target', required=True, help='host:port')
+    p.add_argument('--delay-ms', type=float, default=20.0)
+
+    args = ap.parse_args(argv)
+    if args.command == 'proxy':
+        try:
+            asyncio.run(_proxy(args.listen, args.target, args.delay_ms / 1000.0))
+        except KeyboardInterrupt:
+            pass
+        return 0
+    return run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
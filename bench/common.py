@@ -0,0 +1,177 @@
+"""Shared helpers for the benchmark scripts in this directory.
+
+The scripts talk to the MySQL/Redis configured through the same DB_* and
+REDIS_URL env vars as the app, so point them at a local throwaway instance
+(for example ``docker compose up db redis``), never at production.
+"""
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app')
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+import parts_service  # noqa: E402
+import wishlist_service  # noqa: E402
+
+# Marks synthetic rows so they can be told apart from real listings.
+BENCH_EMAIL = 'bench@example.com'
+
+WORDS = (
+    "brake pad rotor caliper oil filter air alternator starter battery headlight "
+    "taillight bumper fender mirror radiator hose belt pump spark plug coil "
+    "sensor gasket clutch gearbox axle strut shock spring wheel tire rim"
+).split()
+ADJECTIVES = "new used rebuilt oem aftermarket front rear left right heavy duty".split()
+LOCATIONS = [
+    "Austin, TX", "San Antonio, TX", "Houston, TX", "Dallas, TX", "El Paso, TX",
+    "Denver, CO", "Phoenix, AZ", "Tulsa, OK", "Memphis, TN", "Omaha, NE",
+]
+
+
+def fake_part(rng: random.Random):
+    noun = rng.choice(WORDS)
+    title = f"{rng.choice(ADJECTIVES).title()} {noun.title()} {rng.choice(WORDS)}"
+    description = " ".join(rng.choice(ADJECTIVES + WORDS) for _ in range(rng.randint(6, 20)))
+    return (
+        title,
+        description,
+        rng.randint(5, 2000),
+        rng.choice(LOCATIONS),
+        f"/static/images/{rng.choice(['brake', 'oil', 'tires', 'alternator', 'airfilter', 'headlight'])}.png",
+        BENCH_EMAIL,
+        "512-555-0199",
+        1 if rng.random() < 0.9 else 0,
+    )
+
+
+def count_bench_rows() -> int:
+    conn = parts_service.get_conn()
+    if not conn:
+        raise SystemExit("database unavailable; check DB_* env vars")
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT COUNT(*) FROM parts WHERE contact_email = %s", (BENCH_EMAIL,))
+        return int(cur.fetchone()[0])
+    finally:
+        conn.close()
+
+
+def seed_parts(rows: int, batch: int = 5000, seed: int = 42) -> int:
+    """Top up the synthetic rows in ``parts`` to ``rows``; returns rows inserted."""
+    have = count_bench_rows()
+    need = max(0, rows - have)
+    if not need:
+        return 0
+    rng = random.Random(seed + have)
+    conn = parts_service.get_conn()
+    if not conn:
+        raise SystemExit("database unavailable; check DB_* env vars")
+    started = time.perf_counter()
+    try:
+        cur = conn.cursor()
+        done = 0
+        while done < need:
+            n = min(batch, need - done)
+            # PyMySQL rewrites executemany INSERT ... VALUES into one multi-row statement.
+            cur.executemany(
+                "INSERT INTO parts (title, description, price, location, image_url, contact_email, contact_phone, is_validated)"
+                " VALUES (%s,%s,%s,%s,%s,%s,%s,%s)",
+                [fake_part(rng) for _ in range(n)],
+            )
+            conn.commit()
+            done += n
+            elapsed = time.perf_counter() - started
+            print(f"[bench] seeded {done}/{need} rows ({done / elapsed:.0f} rows/s)", file=sys.stderr)
+    finally:
+        conn.close()
+    return need
+
+
+def bench_part_ids(limit: int = 10000):
+    """Ids of (validated) synthetic parts, for read benchmarks."""
+    conn = parts_service.get_conn()
+    if not conn:
+        raise SystemExit("database unavailable; check DB_* env vars")
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT id FROM parts WHERE contact_email = %s AND is_validated = 1 ORDER BY id DESC LIMIT %s",
+            (BENCH_EMAIL, limit),
+        )
+        return [r[0] for r in cur.fetchall()]
+    finally:
+        conn.close()
+
+
+def seed_wishlists(count: int, size: int, part_ids, seed: int = 42):
+    """Create ``count`` synthetic wishlists of ``size`` parts; returns their ids."""
+    rng = random.Random(seed)
+    ids = []
+    for i in range(count):
+        wid = f"bench{i:06d}"
+        wishlist_service.add_favorites(wid, rng.sample(part_ids, min(size, len(part_ids))))
+        ids.append(wid)
+    return ids
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL, text=True,
+        ).strip()
+    except Exception:
+        return None
+
+
+def compare(report, baseline_path):
+    """Attach per-metric ratios against a previous JSON report (current / baseline)."""
+    with open(baseline_path) as fh:
+        baseline = json.load(fh)
+
+    def walk(cur, base):
+        out = {}
+        for k, v in cur.items():
+            b = base.get(k) if isinstance(base, dict) else None
+            if isinstance(v, dict):
+                sub = walk(v, b or {})
+                if sub:
+                    out[k] = sub
+            elif isinstance(v, (int, float)) and not isinstance(v, bool) and isinstance(b, (int, float)) and b:
+                out[k] = round(v / b, 3)
+        return out
+
+    report['baseline'] = {'revision': baseline.get('revision'), 'ratio': walk(report, baseline)}
+    return report
+
+
+def percentiles(samples, points=(50, 95, 99)):
+    """Nearest-rank percentiles of ``samples`` (seconds) in milliseconds."""
+    if not samples:
+        return {f"p{p}": None for p in points}
+    ordered = sorted(samples)
+    out = {}
+    for p in points:
+        idx = max(0, min(len(ordered) - 1, int(round(p / 100.0 * len(ordered))) - 1))
+        out[f"p{p}"] = round(ordered[idx] * 1000, 3)
+    return out
+
+
+def timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - started, result
+
+
+def emit(report, path=None):
+    """Print the JSON report and optionally write it to ``path``."""
+    text = json.dumps(report, indent=2, sort_keys=True)
+    print(text)
+    if path:
+        with open(path, 'w') as fh:
+            fh.write(text + '\n')
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""Throughput benchmark for the streaming parts export.
+
+Measures rows/s and peak Python heap while draining
+parts_service.iter_parts, and optionally GET /parts/export over HTTP.
+
+    DB_HOST=127.0.0.1 python bench/export_bench.py --rows 1000000
+    python bench/export_bench.py --url http://localhost:8000 --format csv
+"""
+import argparse
+import sys
+import time
+import tracemalloc
+import urllib.request
+
+from common import emit, parts_service, seed_parts
+
+
+def bench_service(batch):
+    tracemalloc.start()
+    started = time.perf_counter()
+    count = 0
+    for _ in parts_service.iter_parts(batch=batch):
+        count += 1
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'rows': count, 'seconds': round(elapsed, 3),
+            'rows_per_sec': round(count / elapsed) if elapsed else None,
+            'peak_heap_kib': peak // 1024}
+
+
+def bench_http(url, fmt):
+    started = time.perf_counter()
+    lines = 0
+    size = 0
+    with urllib.request.urlopen(f"{url.rstrip('/')}/parts/export?format={fmt}") as resp:
+        for line in resp:
+            lines += 1
+            size += len(line)
+    elapsed = time.perf_counter() - started
+    rows = lines - 1 if fmt == 'csv' else lines
+    return {'rows': rows, 'bytes': size, 'seconds': round(elapsed, 3),
+            'rows_per_sec': round(rows / elapsed) if elapsed else None}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--rows', type=int, default=0, help='seed at least this many synthetic rows first')
+    ap.add_argument('--batch', type=int, default=1000)
+    ap.add_argument('--url', help='also stream GET /parts/export from this base URL')
+    ap.add_argument('--format', default='ndjson', choices=['ndjson', 'csv'])
+    ap.add_argument('--output')
+    args = ap.parse_args(argv)
+
+    if args.rows:
+        seed_parts(args.rows)
+    report = {'benchmark': 'export', 'service': bench_service(args.batch)}
+    if args.url:
+        report['http'] = bench_http(args.url, args.format)
+    emit(report, args.output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
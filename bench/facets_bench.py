@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""Latency benchmark for filtered listings and facet counts (GET /parts).
+
+Seeds at least ``--rows`` synthetic parts (default one million) and, with
+the Redis cache off, times facet_counts and list_parts_page under random
+location / price filters. Every facet query is EXPLAINed and must be
+answered from an index alone ("Using index"). Exits 1 when a plan touches
+rows or p95 misses ``--p95-ms``.
+
+    DB_HOST=127.0.0.1 python bench/facets_bench.py --rows 1000000 --p95-ms 250
+"""
+import argparse
+import random
+import sys
+
+from common import LOCATIONS, emit, parts_service, percentiles, seed_parts, timed
+
+
+def explain(location=None, min_price=None, max_price=None):
+    plans = {}
+    with parts_service.connection() as conn:
+        if not conn:
+            raise SystemExit("database unavailable; check DB_* env vars")
+        cur = conn.cursor()
+        for name, (sql, params) in parts_service.facet_queries(location, min_price, max_price).items():
+            cur.execute("EXPLAIN " + sql, params)
+            cols = [d[0].lower() for d in cur.description]
+            row = dict(zip(cols, cur.fetchone()))
+            plans[name] = {'key': row.get('key'), 'extra': row.get('extra'),
+                           'index_only': 'Using index' in (row.get('extra') or '')}
+    return plans
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--rows', type=int, default=1_000_000)
+    ap.add_argument('--queries', type=int, default=200)
+    ap.add_argument('--limit', type=int, default=100)
+    ap.add_argument('--p95-ms', type=float, default=250.0)
+    ap.add_argument('--output')
+    args = ap.parse_args(argv)
+
+    parts_service.parts_cache.ENABLED = False
+    seed_parts(args.rows)
+    rng = random.Random(11)
+    samples = {'facets_all': [], 'facets_location': [], 'facets_price': [],
+               'list_location': [], 'list_price': [], 'list_location_price_page2': []}
+    for _ in range(args.queries):
+        loc = rng.choice(LOCATIONS)
+        lo = rng.randint(5, 1500)
+        samples['facets_all'].append(timed(parts_service.facet_counts)[0])
+        samples['facets_location'].append(timed(parts_service.facet_counts, loc)[0])
+        samples['facets_price'].append(timed(parts_service.facet_counts, None, lo, lo + 200)[0])
+        samples['list_location'].append(timed(parts_service.list_parts_page, args.limit, None, loc)[0])
+        samples['list_price'].append(timed(parts_service.list_parts_page, args.limit, None, None, lo, lo + 200)[0])
+        _, (_, nxt) = timed(parts_service.list_parts_page, args.limit, None, loc, lo, lo + 500)
+        if nxt:
+            samples['list_location_price_page2'].append(
+                timed(parts_service.list_parts_page, args.limit, nxt, loc, lo, lo + 500)[0])
+
+    report = {'benchmark': 'facets', 'rows': args.rows, 'limit': args.limit, 'target_p95_ms': args.p95_ms}
+    ok = True
+    for name, vals in samples.items():
+        report[name] = dict(percentiles(vals), samples=len(vals))
+        if vals and report[name]['p95'] > args.p95_ms:
+            ok = False
+    report['plans'] = {
+        'unfiltered': explain(),
+        'location': explain(LOCATIONS[0]),
+        'price': explain(None, 100, 500),
+    }
+    for plans in report['plans'].values():
+        ok = ok and all(p['index_only'] for p in plans.values())
+    report['passed'] = ok
+    emit(report, args.output)
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""Fixed-concurrency HTTP load test for the main endpoints.
+
+Seeds ``--rows`` synthetic parts and ``--wishlists`` synthetic wishlists
+(MySQL and Redis from the DB_* / REDIS_URL env vars), then drives each
+scenario for ``--duration`` seconds with ``--concurrency`` keep-alive
+clients against ``--url``. Reports requests/s, error count and
+p50/p95/p99 latency per scenario as JSON; ``--baseline`` adds ratios
+against an earlier report so runs can be compared across commits. Start
+the server with RATE_LIMIT_ENABLED=FALSE, or the write scenarios mostly
+measure 429s.
+
+    DB_HOST=127.0.0.1 REDIS_URL=redis://127.0.0.1:6379/0 \
+        python bench/load_test.py --url http://127.0.0.1:8000 --rows 10000
+"""
+import argparse
+import http.client
+import json
+import random
+import sys
+import threading
+import time
+import urllib.parse
+
+from common import bench_part_ids, compare, emit, git_revision, percentiles, seed_parts, seed_wishlists
+
+
+def scenarios(part_ids, wishlists):
+    """name -> function(rng) returning (method, path, body, headers)."""
+    def cookie(rng):
+        return {'Cookie': f"wishlist_id={rng.choice(wishlists)}"} if wishlists else {}
+
+    def post_part(rng):
+        body = json.dumps({
+            'title': f"Bench part {rng.randint(0, 1 << 30)}",
+            'description': 'load test listing',
+            'price': rng.randint(5, 500),
+            'location': 'Austin, TX',
+        })
+        return 'POST', '/parts', body, {'Content-Type': 'application/json'}
+
+    return {
+        'index': lambda rng: ('GET', '/', None, cookie(rng)),
+        'parts_list': lambda rng: ('GET', '/parts', None, {}),
+        'parts_get': lambda rng: ('GET', f"/parts/{rng.choice(part_ids)}", None, {}),
+        'parts_create': post_part,
+        'favourite_add': lambda rng: ('POST', f"/parts/{rng.choice(part_ids)}/favourite", None, cookie(rng)),
+        'favourite_remove': lambda rng: ('DELETE', f"/parts/{rng.choice(part_ids)}/favourite", None, cookie(rng)),
+        'parts_all': lambda rng: ('GET', '/parts/all', None, {}),
+    }
+
+
+def run_scenario(base_url, make_request, concurrency, duration, seed):
+    parsed = urllib.parse.urlsplit(base_url)
+    samples = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client(n):
+        rng = random.Random(seed + n)
+        conn = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=30)
+        mine = []
+        failed = 0
+        while time.perf_counter() < deadline:
+            method, path, body, headers = make_request(rng)
+            started = time.perf_counter()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                resp = conn.getresponse()
+                resp.read()
+                if resp.status >= 400:
+                    failed += 1
+            except Exception:
+                failed += 1
+                conn.close()
+                conn = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=30)
+            mine.append(time.perf_counter() - started)
+        conn.close()
+        with lock:
+            samples.extend(mine)
+            errors[0] += failed
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    return dict(
+        percentiles(samples),
+        requests=len(samples),
+        errors=errors[0],
+        rps=round(len(samples) / elapsed, 1) if elapsed else None,
+    )
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--url', default='http://127.0.0.1:8000')
+    ap.add_argument('--rows', type=int, default=10000, help='synthetic parts to seed (10k to 1M)')
+    ap.add_argument('--wishlists', type=int, default=100)
+    ap.add_argument('--wishlist-size', type=int, default=20)
+    ap.add_argument('--concurrency', type=int, default=16)
+    ap.add_argument('--duration', type=float, default=15.0, help='seconds per scenario')
+    ap.add_argument('--only', help='comma-separated scenario names')
+    ap.add_argument('--baseline', help='earlier JSON report to compare against')
+    ap.add_argument('--output')
+    args = ap.parse_args(argv)
+
+    seed_parts(args.rows)
+    part_ids = bench_part_ids()
+    if not part_ids:
+        raise SystemExit("no validated synthetic parts to read")
+    wishlists = seed_wishlists(args.wishlists, args.wishlist_size, part_ids)
+
+    available = scenarios(part_ids, wishlists)
+    names = args.only.split(',') if args.only else list(available)
+    report = {
+        'benchmark': 'load_test',
+        'revision': git_revision(),
+        'rows': args.rows,
+        'concurrency': args.concurrency,
+        'duration_s': args.duration,
+        'scenarios': {},
+    }
+    for i, name in enumerate(names):
+        print(f"[bench] {name} ...", file=sys.stderr)
+        report['scenarios'][name] = run_scenario(args.url, available[name], args.concurrency, args.duration, seed=i * 1000)
+    if args.baseline:
+        compare(report, args.baseline)
+    emit(report, args.output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
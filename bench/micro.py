@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""Micro-benchmarks for parts_service functions.
+
+Calls each service function ``--iterations`` times in-process (no HTTP)
+against the seeded database and reports p50/p95/p99 and calls/s as JSON.
+Use ``--no-cache`` to measure MySQL rather than the Redis read-through
+cache, and ``--baseline`` to compare with an earlier report.
+
+    DB_HOST=127.0.0.1 python bench/micro.py --rows 100000 --no-cache
+"""
+import argparse
+import random
+import sys
+import time
+
+from common import bench_part_ids, compare, emit, git_revision, parts_service, percentiles, seed_parts, timed
+
+
+def deep_cursor(limit: int, pages: int):
+    """Cursor of page ``pages`` of the listing, past the cached pages."""
+    cursor = None
+    for _ in range(pages):
+        _, cursor = parts_service.list_parts_page(limit, cursor)
+        if cursor is None:
+            break
+    return cursor
+
+
+def cases(part_ids):
+    batch = part_ids[:200]
+    deep = deep_cursor(100, 20)
+    return {
+        'list_parts_50': lambda rng: parts_service.list_parts(limit=50),
+        'list_parts_page_deep': lambda rng: parts_service.list_parts_page(limit=100, cursor=deep),
+        'get_part': lambda rng: parts_service.get_part(rng.choice(part_ids)),
+        'get_parts_200': lambda rng: parts_service.get_parts(batch),
+        'search_parts': lambda rng: parts_service.search_parts(rng.choice(['brake', 'oil filter', 'rear strut'])),
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--rows', type=int, default=10000)
+    ap.add_argument('--iterations', type=int, default=500)
+    ap.add_argument('--no-cache', action='store_true', help='bypass the Redis read-through cache')
+    ap.add_argument('--only', help='comma-separated case names')
+    ap.add_argument('--baseline')
+    ap.add_argument('--output')
+    args = ap.parse_args(argv)
+
+    if args.no_cache:
+        parts_service.parts_cache.ENABLED = False
+    seed_parts(args.rows)
+    part_ids = bench_part_ids()
+    available = cases(part_ids)
+    names = args.only.split(',') if args.only else list(available)
+    rng = random.Random(1)
+    report = {'benchmark': 'micro', 'revision': git_revision(), 'rows': args.rows,
+              'cache': not args.no_cache, 'cases': {}}
+    for name in names:
+        fn = available[name]
+        fn(rng)  # warm the pool / cache
+        samples = []
+        started = time.perf_counter()
+        for _ in range(args.iterations):
+            samples.append(timed(fn, rng)[0])
+        elapsed = time.perf_counter() - started
+        report['cases'][name] = dict(percentiles(samples), calls_per_sec=round(args.iterations / elapsed, 1))
+    report['pool'] = parts_service.pool_stats()
+    if args.baseline:
+        compare(report, args.baseline)
+    emit(report, args.output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""Check read/write routing against a primary and its replicas.
+
+Point DB_* at the primary and DB_READ_HOSTS at one or more replicas (a
+second standalone MySQL works as a stand-in). Reports which server
+(@@server_uuid / @@port) answered replica-eligible reads, primary reads
+and reads made after a write in the same request, plus replica lag and
+pool stats. Exits 1 if read-your-writes reads did not hit the primary.
+
+    docker run -d --name db-replica -p 3307:3306 -e MYSQL_ROOT_PASSWORD=x \\
+        -e MYSQL_DATABASE=appdb -e MYSQL_USER=app -e MYSQL_PASSWORD=appsecret mysql:8.0
+    DB_HOST=127.0.0.1 DB_READ_HOSTS=127.0.0.1:3307 python bench/router_check.py
+"""
+import argparse
+import collections
+import sys
+
+from common import emit, parts_service
+
+import db_router  # noqa: E402  (on sys.path via common)
+
+
+def whoami(replica_ok):
+    with parts_service.connection(replica_ok=replica_ok) as conn:
+        if not conn:
+            return None
+        cur = conn.cursor()
+        cur.execute("SELECT @@server_uuid, @@port")
+        uuid, port = cur.fetchone()
+        return f"{uuid}:{port}"
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--reads', type=int, default=20)
+    ap.add_argument('--output')
+    args = ap.parse_args(argv)
+
+    if not parts_service._router.replicas:
+        raise SystemExit("DB_READ_HOSTS is not set; nothing to route")
+    primary = whoami(False)
+    replica_reads = collections.Counter(whoami(True) for _ in range(args.reads))
+
+    tokens = db_router.start_request(False)
+    db_router.note_write()
+    after_write = collections.Counter(whoami(True) for _ in range(args.reads))
+    db_router.finish_request(tokens)
+
+    tokens = db_router.start_request(True)
+    pinned = collections.Counter(whoami(True) for _ in range(args.reads))
+    db_router.finish_request(tokens)
+
+    ok = set(after_write) == {primary} and set(pinned) == {primary}
+    report = {
+        'benchmark': 'router_check',
+        'primary': primary,
+        'replica_ok_reads': dict(replica_reads),
+        'reads_after_write': dict(after_write),
+        'reads_in_ryw_window': dict(pinned),
+        'replicas_used': any(server != primary for server in replica_reads),
+        'pool': parts_service.pool_stats(),
+        'passed': ok,
+    }
+    emit(report, args.output)
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""Latency benchmark for parts_service.search_parts (GET /parts/search).
+
+Seeds at least ``--rows`` synthetic parts (default one million), then runs
+random single- and two-term queries with and without filters and checks
+p95 against ``--p95-ms``. Exits 1 when the target is missed.
+
+    DB_HOST=127.0.0.1 python bench/search_bench.py --rows 1000000 --p95-ms 50
+"""
+import argparse
+import random
+import sys
+
+from common import LOCATIONS, WORDS, emit, parts_service, percentiles, seed_parts, timed
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--rows', type=int, default=1_000_000)
+    ap.add_argument('--queries', type=int, default=500)
+    ap.add_argument('--limit', type=int, default=20)
+    ap.add_argument('--p95-ms', type=float, default=50.0)
+    ap.add_argument('--output')
+    args = ap.parse_args(argv)
+
+    seed_parts(args.rows)
+    rng = random.Random(7)
+    samples = {'plain': [], 'filtered': [], 'second_page': []}
+    for _ in range(args.queries):
+        q = " ".join(rng.sample(WORDS, rng.choice([1, 2])))
+        t, (items, nxt) = timed(parts_service.search_parts, q, limit=args.limit)
+        samples['plain'].append(t)
+        if nxt:
+            t, _ = timed(parts_service.search_parts, q, limit=args.limit, cursor=nxt)
+            samples['second_page'].append(t)
+        lo = rng.randint(5, 1000)
+        t, _ = timed(
+            parts_service.search_parts, q,
+            location=rng.choice(LOCATIONS), min_price=lo, max_price=lo + 500, limit=args.limit,
+        )
+        samples['filtered'].append(t)
+
+    report = {'benchmark': 'search_parts', 'rows': args.rows, 'limit': args.limit, 'target_p95_ms': args.p95_ms}
+    ok = True
+    for name, vals in samples.items():
+        report[name] = dict(percentiles(vals), samples=len(vals))
+        if vals and report[name]['p95'] > args.p95_ms:
+            ok = False
+    report['passed'] = ok
+    emit(report, args.output)
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""Serialization cost and size of GET /parts bodies, full vs ?fields=.
+
+For each case, encodes ``--limit``-row pages and reports the median
+microseconds per row and the bytes per row, raw and gzipped at nginx's
+gzip_comp_level. With ``--fetch`` it also times the page query itself with
+the Redis cache off. That query selects every column for full pages and only
+the projected columns otherwise. The cases are:
+
+    before        _row_to_dict + jsonify encoding, all fields (full pages)
+    dicts:<f>     ?fields=<f> with PARTS_FAST_JSON=FALSE (dicts + json.dumps)
+    fast:<f>      ?fields=<f> on the tuple encoder in parts_json
+    fast:all      the tuple encoder with every field
+
+Rows come from the seeded database, or from ``--synthetic`` in-process rows
+when no database is at hand:
+
+    DB_HOST=127.0.0.1 python bench/serialize_bench.py --rows 10000 --fetch
+    python bench/serialize_bench.py --synthetic
+"""
+import argparse
+import datetime
+import random
+import statistics
+import sys
+import time
+import zlib
+
+from common import BENCH_EMAIL, compare, emit, fake_part, git_revision, parts_service, percentiles, seed_parts, timed
+
+import parts_json  # noqa: E402
+
+# Matches gzip_comp_level in nginx.conf.
+GZIP_LEVEL = 5
+ALL = parts_service.PART_FIELDS
+
+
+def synthetic_rows(count: int, seed: int = 42):
+    rng = random.Random(seed)
+    now = datetime.datetime(2024, 6, 1, 12, 0, 0)
+    rows = []
+    for i in range(count, 0, -1):
+        title, description, price, location, image_url, email, phone, _ = fake_part(rng)
+        created = now - datetime.timedelta(seconds=37 * (count - i))
+        rows.append((i, created, created, i, title, description, price, location, image_url, email, phone,
+                     created, created))
+    return rows
+
+
+def database_rows(count: int):
+    """Projected rows (all fields) of synthetic parts, as list_parts_rows returns them."""
+    with parts_service.connection() as conn:
+        if not conn:
+            raise SystemExit("database unavailable; check DB_* env vars")
+        cur = conn.cursor()
+        cur.execute(
+            f"SELECT {parts_service.projected_columns(ALL)} FROM parts"
+            " WHERE contact_email = %s AND is_validated = 1 ORDER BY created_at DESC, id DESC LIMIT %s",
+            (BENCH_EMAIL, count),
+        )
+        return list(cur.fetchall())
+
+
+def project(rows, fields):
+    head = len(parts_service.ROW_HEAD)
+    idx = [head + ALL.index(f) for f in fields]
+    return [r[:head] + tuple(r[i] for i in idx) for r in rows]
+
+
+def full_dicts_body(rows):
+    # The pre-projection path: rows -> part dicts -> jsonify.
+    head = len(parts_service.ROW_HEAD)
+    parts = [parts_service._row_to_dict(r[head:]) for r in rows]
+    return parts_json.dumps({'items': parts, 'next': None}) + '\n'
+
+
+def measure(encode, pages, repeat):
+    per_row = []
+    rows = sum(len(p) for p in pages)
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for page in pages:
+            encode(page)
+        per_row.append((time.perf_counter() - started) / rows * 1e6)
+    raw = gz = 0
+    for page in pages:
+        body = encode(page).encode()
+        raw += len(body)
+        gz += len(zlib.compress(body, GZIP_LEVEL))
+    return {
+        'us_per_row': round(statistics.median(per_row), 3),
+        'bytes_per_row': round(raw / rows, 1),
+        'gzip_bytes_per_row': round(gz / rows, 1),
+    }
+
+
+def fetch_times(fields, limit, queries):
+    """p50/p95 of uncached first pages, full (fields=None) or projected."""
+    parts_service.parts_cache.ENABLED = False
+    samples = []
+    for _ in range(queries):
+        if fields:
+            samples.append(timed(parts_service.list_parts_rows, fields, limit)[0])
+        else:
+            samples.append(timed(parts_service.list_parts_page, limit)[0])
+    return percentiles(samples, (50, 95))
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--rows', type=int, default=10000, help='rows to encode (and seed)')
+    ap.add_argument('--limit', type=int, default=100, help='rows per page')
+    ap.add_argument('--fields', action='append',
+                    help='projection to measure; repeatable (default: the grid card and id,title,price)')
+    ap.add_argument('--repeat', type=int, default=7)
+    ap.add_argument('--synthetic', action='store_true', help='encode generated rows; no database needed')
+    ap.add_argument('--fetch', action='store_true', help='also time the page queries (needs the database)')
+    ap.add_argument('--queries', type=int, default=200)
+    ap.add_argument('--baseline', help='earlier JSON report to compare against')
+    ap.add_argument('--output')
+    args = ap.parse_args(argv)
+
+    projections = [parts_service.parse_fields(f) for f in
+                   (args.fields or ['id,title,price,location,image_url', 'id,title,price'])]
+    if args.synthetic:
+        rows = synthetic_rows(args.rows)
+    else:
+        seed_parts(args.rows)
+        rows = database_rows(args.rows)
+    if not rows:
+        raise SystemExit("no rows to encode")
+
+    def paged(rs):
+        return [rs[i:i + args.limit] for i in range(0, len(rs), args.limit)]
+
+    cases = {'before': (full_dicts_body, paged(rows))}
+    for fields in projections:
+        pages = paged(project(rows, fields))
+        name = ','.join(fields)
+        cases[f"dicts:{name}"] = (lambda page, f=fields: parts_json.page_body(f, page, None), pages, False)
+        cases[f"fast:{name}"] = (lambda page, f=fields: parts_json.page_body(f, page, None), pages, True)
+    cases['fast:all'] = (lambda page: parts_json.page_body(ALL, page, None), paged(rows), True)
+
+    report = {
+        'benchmark': 'serialize',
+        'revision': git_revision(),
+        'rows': len(rows),
+        'limit': args.limit,
+        'source': 'synthetic' if args.synthetic else 'database',
+        'cases': {},
+    }
+    for name, (encode, pages, *fast) in cases.items():
+        if fast:
+            parts_json.FAST = fast[0]
+        print(f"[bench] {name} ...", file=sys.stderr)
+        report['cases'][name] = measure(encode, pages, args.repeat)
+    parts_json.FAST = True
+    before = report['cases']['before']
+    for stats in report['cases'].values():
+        stats['speedup'] = round(before['us_per_row'] / stats['us_per_row'], 2)
+        stats['size_ratio'] = round(stats['bytes_per_row'] / before['bytes_per_row'], 3)
+
+    if args.fetch:
+        report['fetch_ms'] = {'before': fetch_times(None, args.limit, args.queries)}
+        for fields in projections:
+            report['fetch_ms'][','.join(fields)] = fetch_times(fields, args.limit, args.queries)
+    if args.baseline:
+        compare(report, args.baseline)
+    emit(report, args.output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""Email throughput benchmark against a local SMTP sink.
+
+Starts a minimal in-process SMTP sink (standing in for MailHog) unless
+``--host``/``--port`` point at a real one, then sends ``--messages``
+validation emails with a fresh connection per message (the old behaviour)
+and over the worker's persistent session (tasks.send_message).
+
+    python bench/smtp_bench.py --messages 2000
+"""
+import argparse
+import os
+import socketserver
+import sys
+import threading
+import time
+
+from common import APP_DIR, emit  # noqa: F401  (puts app/ on sys.path)
+
+
+class _SinkHandler(socketserver.StreamRequestHandler):
+    """Accepts and discards mail; just enough SMTP for smtplib."""
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        self.reply("220 sink ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            cmd = line.decode(errors='replace').strip().upper()
+            if cmd.startswith(("EHLO", "HELO")):
+                self.reply("250 sink")
+            elif cmd == "DATA":
+                self.reply("354 end with .")
+                while self.rfile.readline() not in (b".\r\n", b".\n", b""):
+                    pass
+                self.server.received += 1
+                self.reply("250 queued")
+            elif cmd == "QUIT":
+                self.reply("221 bye")
+                return
+            else:
+                self.reply("250 ok")
+
+
+class _Sink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    received = 0
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--messages', type=int, default=1000)
+    ap.add_argument('--host')
+    ap.add_argument('--port', type=int)
+    ap.add_argument('--output')
+    args = ap.parse_args(argv)
+
+    sink = None
+    if not args.host:
+        sink = _Sink(('127.0.0.1', 0), _SinkHandler)
+        threading.Thread(target=sink.serve_forever, daemon=True).start()
+        args.host, args.port = sink.server_address
+    os.environ['SMTP_HOST'] = args.host
+    os.environ['SMTP_PORT'] = str(args.port or 1025)
+
+    import tasks
+    items = [[f"user{i}@example.com", i, f"Part {i}", f"{i:032x}"] for i in range(args.messages)]
+
+    started = time.perf_counter()
+    for item in items:
+        with tasks._smtp() as s:
+            s.send_message(tasks._build_message(*item))
+    per_message = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for item in items:
+        tasks.send_message(tasks._build_message(*item))
+    persistent = time.perf_counter() - started
+    tasks._close_smtp()
+
+    report = {
+        'benchmark': 'smtp',
+        'messages': args.messages,
+        'connection_per_message': {'seconds': round(per_message, 3), 'msgs_per_sec': round(args.messages / per_message)},
+        'persistent_session': {'seconds': round(persistent, 3), 'msgs_per_sec': round(args.messages / persistent)},
+        'speedup': round(per_message / persistent, 2),
+    }
+    if sink:
+        report['sink_received'] = sink.received
+        sink.shutdown()
+    emit(report, args.output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,75 @@
+import pytest
+
+fakeredis = pytest.importorskip('fakeredis')
+pytest.importorskip('lupa')
+admission = pytest.importorskip('admission')
+
+ROUTE = 'POST /parts'
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    r = fakeredis.FakeRedis()
+    monkeypatch.setattr(admission, 'ENABLED', True)
+    monkeypatch.setattr(admission, '_down_until', 0.0)
+    monkeypatch.setattr(admission, 'RULES', {'parts_write': (3, 60.0)})
+    monkeypatch.setattr(admission, 'get_redis', lambda: r)
+    return r
+
+
+def test_bucket_allows_a_burst_then_refuses(redis):
+    assert [admission.check('parts_write', ROUTE, '10.0.0.1') for _ in range(3)] == [None, None, None]
+    retry_after = admission.check('parts_write', ROUTE, '10.0.0.1')
+    # One token refills every 20s.
+    assert 19 <= retry_after <= 20
+
+
+def test_buckets_are_per_client_and_route(redis):
+    for _ in range(3):
+        admission.check('parts_write', ROUTE, '10.0.0.1')
+    assert admission.check('parts_write', ROUTE, '10.0.0.2') is None
+    assert admission.check('parts_write', 'PUT /parts/<int:part_id>', '10.0.0.1') is None
+
+
+def test_refused_request_charges_no_bucket(redis):
+    for _ in range(3):
+        admission.check('parts_write', ROUTE, None, 'wl-1')
+    # The IP bucket is full, the cookie bucket empty: refused, and the IP
+    # bucket keeps all its tokens.
+    assert admission.check('parts_write', ROUTE, '10.0.0.9', 'wl-1')
+    assert [admission.check('parts_write', ROUTE, '10.0.0.9') for _ in range(3)] == [None, None, None]
+
+
+def test_unknown_rule_and_no_identity_are_not_limited(redis):
+    assert admission.check('other', ROUTE, '10.0.0.1') is None
+    assert admission.check('parts_write', ROUTE, None, None) is None
+    assert redis.keys() == []
+
+
+def test_fails_open_without_redis(monkeypatch):
+    def broken():
+        raise ConnectionError("down")
+    monkeypatch.setattr(admission, 'ENABLED', True)
+    monkeypatch.setattr(admission, '_down_until', 0.0)
+    monkeypatch.setattr(admission, 'get_redis', broken)
+    assert admission.check('parts_write', ROUTE, '10.0.0.1') is None
+    assert admission._down_until > 0
+
+
+@pytest.mark.parametrize('proxies, remote, expected', [
+    ([], '10.0.0.5', '10.0.0.5'),
+    (['10.0.0.0/24'], '10.0.0.5', '203.0.113.7'),
+    (['10.0.0.0/24'], '192.0.2.1', '192.0.2.1'),
+    (['127.0.0.1'], '127.0.0.1', '203.0.113.7'),
+])
+def test_x_real_ip_only_from_trusted_proxies(monkeypatch, proxies, remote, expected):
+    monkeypatch.setattr(admission, 'TRUSTED_PROXIES', proxies)
+    monkeypatch.setattr(admission, '_proxies_resolved_at', None)
+    assert admission.client_ip({'X-Real-IP': '203.0.113.7'}, remote) == expected
+
+
+def test_unresolvable_proxy_is_logged(monkeypatch, caplog):
+    monkeypatch.setattr(admission, 'TRUSTED_PROXIES', ['no-such-host.invalid'])
+    monkeypatch.setattr(admission, '_proxies_resolved_at', None)
+    assert admission.client_ip({'X-Real-IP': '203.0.113.7'}, '10.0.0.5') == '10.0.0.5'
+    assert 'no-such-host.invalid' in caplog.text
@@ -0,0 +1,84 @@
+import json
+
+import pytest
+
+parts_api = pytest.importorskip('parts_api')
+flask = pytest.importorskip('flask')
+
+parts_service = parts_api.parts_service
+
+
+@pytest.fixture
+def client(monkeypatch):
+    created = []
+
+    def create_parts(items):
+        created.extend(items)
+        return list(range(100, 100 + len(items)))
+
+    monkeypatch.setattr(parts_api.admission, 'ENABLED', False)
+    monkeypatch.setattr(parts_api.admission, '_pool_has_headroom', lambda: True)
+    monkeypatch.setattr(parts_service, 'create_parts', create_parts)
+    app = flask.Flask(__name__)
+    app.register_blueprint(parts_api.bp)
+    client = app.test_client()
+    client.created = created
+    return client
+
+
+@pytest.mark.parametrize('item, error', [
+    ('not an object', 'item must be an object'),
+    ({}, 'title is required'),
+    ({'title': '  '}, 'title is required'),
+    ({'title': 123}, 'title must be a string'),
+    ({'title': 'x', 'description': {'a': 1}}, 'description must be a string'),
+    ({'title': 'x', 'location': ['a']}, 'location must be a string'),
+    ({'title': 'x', 'contact_email': 5}, 'contact_email must be a string'),
+    ({'title': 'x', 'price': 'ten'}, 'price must be integer'),
+    ({'title': 'x', 'price': [1]}, 'price must be integer'),
+    ({'title': 'x', 'price': True}, 'price must be integer'),
+    ({'title': 'x', 'price': 1.5}, 'price must be integer'),
+])
+def test_clean_part_rejects(item, error):
+    assert parts_api._clean_part(item) == (None, error)
+
+
+def test_clean_part_normalises_price():
+    assert parts_api._clean_part({'title': 'x', 'price': '12'})[0]['price'] == 12
+    assert parts_api._clean_part({'title': 'x', 'price': 3.0})[0]['price'] == 3
+    assert parts_api._clean_part({'title': 'x', 'price': ''})[0]['price'] is None
+    assert parts_api._clean_part({'title': 'x', 'description': None})[1] is None
+
+
+def test_bulk_reports_errors_per_index(client):
+    body = [{'title': 'ok'}, {'title': 123}, {'title': 'x', 'image_url': {'u': 1}}, {'title': 'ok too', 'price': 5}]
+    resp = client.post('/parts/bulk', json=body)
+    assert resp.status_code == 201
+    assert resp.get_json() == {
+        'created': 2,
+        'failed': 2,
+        'results': [
+            {'index': 0, 'id': 100},
+            {'index': 1, 'error': 'title must be a string'},
+            {'index': 2, 'error': 'image_url must be a string'},
+            {'index': 3, 'id': 101},
+        ],
+    }
+    assert [d['title'] for d in client.created] == ['ok', 'ok too']
+    assert all(d['validation_token'] and d['is_validated'] is False for d in client.created)
+
+
+def test_bulk_ndjson_with_only_bad_lines(client):
+    body = '{"title": 1}\nnot json\n\n'
+    resp = client.post('/parts/bulk', data=body, content_type='application/x-ndjson')
+    assert resp.status_code == 400
+    assert resp.get_json()['results'] == [
+        {'index': 0, 'error': 'title must be a string'},
+        {'index': 1, 'error': 'invalid JSON'},
+    ]
+    assert client.created == []
+
+
+def test_bulk_rejects_non_array(client):
+    resp = client.post('/parts/bulk', data=json.dumps({'title': 'x'}), content_type='application/json')
+    assert resp.status_code == 400
@@ -0,0 +1,81 @@
+from contextlib import contextmanager
+
+import pytest
+
+parts_service = pytest.importorskip('parts_service')
+
+
+class FakeCursor:
+    """Answers the statements create_parts issues against an in-memory table."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self._result = []
+
+    def execute(self, sql, params=()):
+        if sql.startswith("SELECT COALESCE(MAX(id)"):
+            self._result = [(max(self.conn.pending, default=0),)]
+        elif sql.startswith("SELECT id, validation_token_hash"):
+            wanted = set(params[1:])
+            self._result = [(i, h) for i, h in self.conn.pending.items() if i > params[0] and h in wanted]
+        else:
+            # location_stats statements
+            self.rowcount = 1
+
+    def executemany(self, sql, rows):
+        self.conn.batches += 1
+        if self.conn.batches == self.conn.fail_on_batch:
+            raise RuntimeError("deadlock")
+        for row in rows:
+            self.conn.pending[len(self.conn.pending) + 1] = row[-2]
+
+    def fetchone(self):
+        return self._result[0]
+
+    def fetchall(self):
+        return self._result
+
+
+class FakeConn:
+    def __init__(self, fail_on_batch=None):
+        self.pending = {}
+        self.batches = 0
+        self.commits = 0
+        self.fail_on_batch = fail_on_batch
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+
+@pytest.fixture
+def db(monkeypatch):
+    conns = []
+
+    @contextmanager
+    def connection(replica_ok=False):
+        yield conns[-1]
+
+    monkeypatch.setattr(parts_service, 'connection', connection)
+    monkeypatch.setattr(parts_service.db_router, 'note_write', lambda: None)
+    monkeypatch.setattr(parts_service.parts_cache, 'invalidate_parts', lambda ids, listing=True: None)
+    return conns
+
+
+def items(n):
+    return [{'title': f'part {i}', 'validation_token': f'token-{i}', 'is_validated': False} for i in range(n)]
+
+
+def test_ids_in_input_order_with_one_commit(db):
+    db.append(FakeConn())
+    assert parts_service.create_parts(items(5), batch=2) == [1, 2, 3, 4, 5]
+    assert db[0].batches == 3 and db[0].commits == 1
+
+
+def test_failed_batch_commits_nothing(db):
+    db.append(FakeConn(fail_on_batch=2))
+    with pytest.raises(RuntimeError):
+        parts_service.create_parts(items(5), batch=2)
+    assert db[0].commits == 0
@@ -0,0 +1,53 @@
+import pytest
+
+parts_service = pytest.importorskip('parts_service')
+
+FACETS = {'location': [{'value': 'austin, tx', 'count': 4}], 'price': []}
+
+
+def test_cursor_round_trip():
+    cursor = parts_service.encode_cursor('2024-06-01 12:00:00', 42, 2)
+    assert parts_service.decode_cursor(cursor) == ('2024-06-01 12:00:00', 42, 2)
+
+
+@pytest.mark.parametrize('mangle', [
+    lambda c: c.replace('.', 'x.', 1),
+    lambda c: c[:-2] + ('AA' if c[-2:] != 'AA' else 'BB'),
+    lambda c: c.rpartition('.')[0],
+    lambda c: c + '\u00e9',
+    lambda c: 'garbage',
+], ids=['payload', 'signature', 'unsigned', 'non-ascii', 'garbage'])
+def test_tampered_cursor_is_rejected(mangle):
+    cursor = parts_service.encode_cursor('2024-06-01 12:00:00', 42, 2)
+    with pytest.raises(ValueError):
+        parts_service.decode_cursor(mangle(cursor))
+
+
+def test_signed_page_below_one_is_rejected():
+    payload = parts_service._pack_cursor(['2024-06-01 12:00:00', 42, 0])
+    with pytest.raises(ValueError):
+        parts_service.decode_cursor(f"{payload}.{parts_service._cursor_signature(payload)}")
+
+
+@pytest.fixture
+def listing(monkeypatch):
+    monkeypatch.setattr(parts_service.parts_cache, 'list_version', lambda: 7)
+    monkeypatch.setattr(parts_service, 'facet_counts', lambda *a: FACETS)
+
+
+@pytest.mark.parametrize('limit, page, location, min_price, max_price, version', [
+    (100, 0, None, None, None, 7),
+    (50, 1, 'Austin, TX ', 25, 99, 7),
+    (100, parts_service.parts_cache.LIST_PAGES, None, None, None, None),
+    (37, 0, None, None, None, None),
+    (100, 0, 'Nowhere', None, None, None),
+    (100, 0, None, 26, None, None),
+    (100, 0, None, None, 100, None),
+])
+def test_only_bounded_queries_are_cached(listing, limit, page, location, min_price, max_price, version):
+    assert parts_service._cache_version(limit, page, location, min_price, max_price) == version
+
+
+def test_no_cache_without_redis(monkeypatch):
+    monkeypatch.setattr(parts_service.parts_cache, 'list_version', lambda: None)
+    assert parts_service._cache_version(100, 0, None, None, None) is None
@@ -0,0 +1,124 @@
+import threading
+import time
+
+import pytest
+
+from db_pool import ConnectionPool, PoolTimeout
+
+
+class FakeConn:
+    def __init__(self, fail_rollback=False, fail_ping=False):
+        self.closed = False
+        self.rollbacks = 0
+        self.fail_rollback = fail_rollback
+        self.fail_ping = fail_ping
+
+    def rollback(self):
+        if self.fail_rollback:
+            raise OSError("connection lost")
+        self.rollbacks += 1
+
+    def ping(self, reconnect=False):
+        if self.fail_ping:
+            raise OSError("gone away")
+
+    def close(self):
+        self.closed = True
+
+
+def make_pool(**kwargs):
+    made = []
+
+    def connect():
+        made.append(FakeConn())
+        return made[-1]
+    return ConnectionPool(connect, **kwargs), made
+
+
+def test_connections_are_reused():
+    pool, made = make_pool(size=2)
+    with pool.connection() as a:
+        pass
+    with pool.connection() as b:
+        pass
+    assert a is b and len(made) == 1
+    assert a.rollbacks == 2
+    assert pool.stats()['idle'] == 1
+
+
+def test_timeout_when_exhausted():
+    pool, _ = make_pool(size=1, max_overflow=1, timeout=0.05)
+    first, second = pool.checkout(), pool.checkout()
+    started = time.monotonic()
+    with pytest.raises(PoolTimeout):
+        pool.checkout()
+    assert time.monotonic() - started >= 0.05
+    stats = pool.stats()
+    assert stats['timeouts'] == 1 and stats['waits'] == 1
+    assert stats['open'] == 2 and stats['in_use'] == 2
+    pool.checkin(first)
+    pool.checkin(second)
+
+
+def test_waiter_gets_returned_connection():
+    pool, made = make_pool(size=1, max_overflow=0, timeout=2.0)
+    held = pool.checkout()
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.checkout()))
+    waiter.start()
+    time.sleep(0.05)
+    pool.checkin(held)
+    waiter.join(1.0)
+    assert got == [held] and len(made) == 1
+    assert pool.stats()['waits'] == 1
+
+
+def test_error_in_block_discards_connection():
+    pool, made = make_pool(size=2)
+    with pytest.raises(ValueError):
+        with pool.connection():
+            raise ValueError("boom")
+    assert made[0].closed
+    stats = pool.stats()
+    assert stats['open'] == 0 and stats['in_use'] == 0 and stats['discarded'] == 1
+    with pool.connection() as conn:
+        assert conn is made[1]
+
+
+def test_failed_rollback_discards_connection():
+    pool, _ = make_pool(size=2)
+    conn = pool.checkout()
+    conn.fail_rollback = True
+    pool.checkin(conn)
+    assert conn.closed
+    assert pool.stats()['idle'] == 0 and pool.stats()['discarded'] == 1
+
+
+def test_overflow_is_closed_on_checkin():
+    pool, made = make_pool(size=1, max_overflow=1)
+    a, b = pool.checkout(), pool.checkout()
+    assert pool.stats()['overflow'] == 1
+    pool.checkin(a)
+    pool.checkin(b)
+    assert not a.closed and b.closed
+    assert pool.stats()['open'] == 1
+
+
+def test_dead_idle_connection_is_replaced():
+    pool, made = make_pool(size=1, ping_after=0.0)
+    with pool.connection() as conn:
+        conn.fail_ping = True
+    with pool.connection() as fresh:
+        pass
+    assert fresh is not conn and conn.closed
+    assert pool.stats()['discarded'] == 1 and pool.stats()['created'] == 2
+
+
+def test_failed_connect_releases_slot():
+    def connect():
+        raise OSError("refused")
+    pool = ConnectionPool(connect, size=1, max_overflow=0, timeout=0.05)
+    for _ in range(2):
+        with pytest.raises(OSError):
+            pool.checkout()
+    assert pool.stats()['open'] == 0 and pool.stats()['timeouts'] == 0
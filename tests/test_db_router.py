@@ -0,0 +1,83 @@
+import pytest
+
+import db_router
+from db_pool import PoolTimeout
+
+
+class FakePool:
+    def __init__(self, name, error=None):
+        self.name = name
+        self.error = error
+        self.checkouts = 0
+        self.returned = []
+
+    def checkout(self):
+        self.checkouts += 1
+        if self.error:
+            raise self.error
+        return f"{self.name}-conn"
+
+    def checkin(self, conn, discard=False):
+        self.returned.append((conn, discard))
+
+    def stats(self):
+        return {}
+
+
+@pytest.fixture(autouse=True)
+def request_scope():
+    tokens = db_router.start_request()
+    yield
+    db_router.finish_request(tokens)
+
+
+def make_router(*replicas, lag=0.0):
+    router = db_router.Router(FakePool('primary'), [(p.name, p) for p in replicas])
+    router._lagging = lambda replica, conn: lag > router.max_lag
+    return router
+
+
+def test_reads_go_to_replicas_round_robin():
+    a, b = FakePool('a'), FakePool('b')
+    router = make_router(a, b)
+    got = [router.checkout(replica_ok=True)[0] for _ in range(4)]
+    assert sorted(got) == ['a-conn', 'a-conn', 'b-conn', 'b-conn']
+
+
+def test_writes_and_pinned_reads_use_primary():
+    router = make_router(FakePool('a'))
+    assert router.checkout()[0] == 'primary-conn'
+    db_router.note_write()
+    assert router.checkout(replica_ok=True)[0] == 'primary-conn'
+
+
+def test_failed_replica_is_benched():
+    a = FakePool('a', error=OSError("refused"))
+    router = make_router(a)
+    assert router.checkout(replica_ok=True)[0] == 'primary-conn'
+    assert router.replicas[0].down_until > 0
+    router.checkout(replica_ok=True)
+    assert a.checkouts == 1 and router.fallbacks == 2
+
+
+def test_exhausted_replica_is_not_benched():
+    a = FakePool('a', error=PoolTimeout("busy"))
+    router = make_router(a)
+    assert router.checkout(replica_ok=True)[0] == 'primary-conn'
+    assert router.replicas[0].down_until == 0.0
+    a.error = None
+    assert router.checkout(replica_ok=True)[0] == 'a-conn'
+
+
+def test_lagging_replica_falls_back_to_primary():
+    a = FakePool('a')
+    router = make_router(a, lag=60.0)
+    assert router.checkout(replica_ok=True)[0] == 'primary-conn'
+    assert a.returned == [('a-conn', False)]
+
+
+def test_finish_request_clears_the_pin():
+    tokens = db_router.start_request()
+    db_router.note_write()
+    assert db_router.finish_request(tokens) is True
+    assert not db_router.primary_pinned()
@@ -0,0 +1,71 @@
+import io
+
+import pytest
+
+seed_db = pytest.importorskip('seed_db')
+
+
+def split(text):
+    return list(seed_db.iter_statements(io.StringIO(text)))
+
+
+def test_splits_on_semicolons():
+    assert split("SELECT 1;\nSELECT 2;\n") == ["SELECT 1", "SELECT 2"]
+
+
+def test_trailing_statement_without_semicolon():
+    assert split("SELECT 1;\nSELECT 2") == ["SELECT 1", "SELECT 2"]
+
+
+def test_blank_statements_are_skipped():
+    assert split(";;\n  ;\nSELECT 1;") == ["SELECT 1"]
+
+
+def test_semicolons_inside_quotes():
+    sql = "INSERT INTO t VALUES ('a;b', \"c;d\");\nSELECT `we;ird` FROM t;"
+    assert split(sql) == ["INSERT INTO t VALUES ('a;b', \"c;d\")", "SELECT `we;ird` FROM t"]
+
+
+def test_backslash_escapes_inside_strings():
+    sql = "INSERT INTO t VALUES ('it\\'s; fine', 'back\\\\');\nSELECT 2;"
+    assert split(sql) == ["INSERT INTO t VALUES ('it\\'s; fine', 'back\\\\')", "SELECT 2"]
+
+
+def test_doubled_quotes_inside_strings():
+    assert split("SELECT 'a''; b';\nSELECT 2;") == ["SELECT 'a''; b'", "SELECT 2"]
+
+
+def test_backslash_is_literal_inside_backticks():
+    assert split("SELECT `a\\`; SELECT 2;") == ["SELECT `a\\`", "SELECT 2"]
+
+
+def test_statement_spanning_lines():
+    assert split("INSERT INTO t\nVALUES ('x\ny');\n") == ["INSERT INTO t\nVALUES ('x\ny')"]
+
+
+def test_line_comments_are_dropped():
+    sql = "-- header; not a statement\n# also; a comment\nSELECT 1 -- trailing; comment\n FROM t;\n"
+    assert split(sql) == ["SELECT 1 \n FROM t"]
+
+
+def test_comment_without_space_keeps_tokens_apart():
+    assert split("SELECT a# c\nFROM t;") == ["SELECT a\nFROM t"]
+    assert split("SELECT a-- c\nFROM t;") == ["SELECT a\nFROM t"]
+
+
+def test_double_dash_needs_whitespace():
+    assert split("SELECT 1--1;") == ["SELECT 1--1"]
+
+
+def test_comment_markers_inside_strings_are_text():
+    assert split("SELECT '-- x; # y', '/* z; */';") == ["SELECT '-- x; # y', '/* z; */'"]
+
+
+def test_block_comments_are_kept():
+    sql = "/*!40101 SET NAMES utf8mb4 */;\n/* a; b */ SELECT 1;\n"
+    assert split(sql) == ["/*!40101 SET NAMES utf8mb4 */", "/* a; b */ SELECT 1"]
+
+
+def test_block_comment_spanning_lines():
+    sql = "/*!40103 SET @OLD_TZ=@@TIME_ZONE;\n SET TIME_ZONE='+00:00' */;\nSELECT 1;"
+    assert split(sql) == ["/*!40103 SET @OLD_TZ=@@TIME_ZONE;\n SET TIME_ZONE='+00:00' */", "SELECT 1"]
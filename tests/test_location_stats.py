@@ -0,0 +1,110 @@
+import random
+
+import pytest
+
+import location_stats
+
+parts_service = pytest.importorskip('parts_service')
+
+
+class StatsCursor:
+    """Runs location_stats' statements against two in-memory tables."""
+
+    def __init__(self):
+        self.stats = {}   # loc_hash -> [location, parts, distinct]
+        self.refs = {}    # (loc_hash, desc_hash) -> n
+        self.rowcount = 0
+
+    def execute(self, sql, params):
+        if sql.startswith("INSERT INTO part_location_descriptions"):
+            key = params
+            self.rowcount = 2 if key in self.refs else 1
+            self.refs[key] = self.refs.get(key, 0) + 1
+        elif sql.startswith("INSERT INTO part_location_stats"):
+            loc, location, new_distinct = params
+            entry = self.stats.setdefault(loc, [location, 0, 0])
+            entry[1] += 1
+            entry[2] += new_distinct
+        elif sql.startswith("UPDATE part_location_descriptions"):
+            self.refs[params] -= 1
+        elif sql.startswith("DELETE FROM part_location_descriptions"):
+            gone = self.refs.get(params, 1) <= 0
+            if gone:
+                del self.refs[params]
+            self.rowcount = int(gone)
+        elif sql.startswith("UPDATE part_location_stats"):
+            gone, loc = params
+            self.stats[loc][1] -= 1
+            self.stats[loc][2] -= gone
+        elif sql.startswith("DELETE FROM part_location_stats"):
+            if self.stats[params[0]][1] <= 0:
+                del self.stats[params[0]]
+        else:
+            raise AssertionError(sql)
+
+    def summary(self):
+        return {loc: (parts, distinct) for loc, (_, parts, distinct) in self.stats.items()}
+
+
+def expected(rows):
+    """What ``GROUP BY location`` over the validated rows would give."""
+    out = {}
+    for location, description, validated in rows.values():
+        if not validated:
+            continue
+        loc = location_stats._hash(location)
+        parts, descs = out.get(loc, (0, set()))
+        if description is not None:
+            descs = descs | {location_stats._hash(description)}
+        out[loc] = (parts + 1, descs)
+    return {loc: (parts, len(descs)) for loc, (parts, descs) in out.items()}
+
+
+def test_validating_and_moving_a_part():
+    cur = StatsCursor()
+    draft = ('Austin', 'brake pads', 0)
+    location_stats.apply(cur, None, draft)
+    assert cur.summary() == {}
+    live = ('Austin', 'brake pads', 1)
+    location_stats.apply(cur, draft, live)
+    assert cur.summary() == {location_stats._hash('austin'): (1, 1)}
+    # Case and surrounding spaces do not make a new location.
+    location_stats.apply(cur, None, (' AUSTIN ', 'Brake Pads', 1))
+    assert cur.summary() == {location_stats._hash('austin'): (2, 1)}
+    location_stats.apply(cur, live, ('Dallas', 'brake pads', 1))
+    assert cur.summary() == {location_stats._hash('austin'): (1, 1), location_stats._hash('dallas'): (1, 1)}
+
+
+def test_string_flags_do_not_count_drafts():
+    # The edit form posts is_validated as text.
+    cur = StatsCursor()
+    old = ('Austin', 'pads', 1)
+    location_stats.apply(cur, None, old)
+    location_stats.apply(cur, old, ('Austin', 'pads', parts_service._flag("0")))
+    assert cur.summary() == {}
+    assert [parts_service._flag(v) for v in ("1", "true", " off ", "", None, 0, 2)] == [1, 1, 0, 0, 0, 0, 1]
+
+
+def test_random_edits_match_a_full_recount():
+    rng = random.Random(7)
+    locations = ['Austin', 'austin ', 'Dallas', None]
+    descriptions = ['pads', 'PADS', 'rotor', None]
+    flags = [0, 1, "0", "1", True, "false"]
+    cur = StatsCursor()
+    rows = {}
+    for step in range(2000):
+        part_id = rng.randrange(40)
+        old = rows.get(part_id)
+        if old is not None and rng.random() < 0.15:
+            new = None
+        else:
+            new = (rng.choice(locations), rng.choice(descriptions), parts_service._flag(rng.choice(flags)))
+        location_stats.apply(cur, old, new)
+        if new is None:
+            rows.pop(part_id, None)
+        else:
+            rows[part_id] = new
+        if step % 100 == 0:
+            assert cur.summary() == expected(rows)
+    assert cur.summary() == expected(rows)
+    assert all(n > 0 for n in cur.refs.values())
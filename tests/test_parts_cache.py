@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+fakeredis = pytest.importorskip('fakeredis')
+pytest.importorskip('lupa')
+parts_cache = pytest.importorskip('parts_cache')
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    server = fakeredis.FakeServer()
+    r = fakeredis.FakeRedis(server=server)
+    monkeypatch.setattr(parts_cache, 'ENABLED', True)
+    monkeypatch.setattr(parts_cache, '_down_until', 0.0)
+    monkeypatch.setattr(parts_cache, 'get_redis', lambda: r)
+    monkeypatch.setattr(parts_cache, 'get_async_redis', lambda: fakeredis.aioredis.FakeRedis(server=server))
+    return r
+
+
+def get_part(part_id, loader):
+    return parts_cache.read_through(parts_cache.part_key(part_id), loader, 60, negative_ttl=30,
+                                    generation=parts_cache.part_generation_key(part_id))
+
+
+def test_miss_then_hit(redis):
+    calls = []
+
+    def load():
+        calls.append(1)
+        return {'id': 1, 'title': 'old'}
+    assert get_part(1, load) == {'id': 1, 'title': 'old'}
+    assert get_part(1, load) == {'id': 1, 'title': 'old'}
+    assert len(calls) == 1
+
+
+def test_missing_rows_are_negatively_cached(redis):
+    assert get_part(2, lambda: None) is None
+    assert get_part(2, lambda: {'id': 2}) is None
+    assert redis.ttl(parts_cache.part_key(2)) <= 30
+
+
+def test_invalidation_drops_record_and_bumps_listing(redis):
+    get_part(1, lambda: {'id': 1, 'title': 'old'})
+    version = parts_cache.list_version()
+    parts_cache.invalidate_part(1)
+    assert redis.get(parts_cache.part_key(1)) is None
+    assert parts_cache.list_version() == version + 1
+    assert get_part(1, lambda: {'id': 1, 'title': 'new'}) == {'id': 1, 'title': 'new'}
+
+
+def test_invalidation_during_load_is_not_overwritten(redis):
+    def slow_load():
+        row = {'id': 1, 'title': 'old'}
+        # A write commits and invalidates while this load is in flight.
+        parts_cache.invalidate_part(1)
+        return row
+    assert get_part(1, slow_load) == {'id': 1, 'title': 'old'}
+    assert redis.get(parts_cache.part_key(1)) is None
+    assert get_part(1, lambda: {'id': 1, 'title': 'new'}) == {'id': 1, 'title': 'new'}
+    assert get_part(1, lambda: None) == {'id': 1, 'title': 'new'}
+
+
+def test_async_invalidation_during_load_is_not_overwritten(redis):
+    async def slow_load():
+        parts_cache.invalidate_part(1)
+        return {'id': 1, 'title': 'old'}
+
+    async def fresh_load():
+        return {'id': 1, 'title': 'new'}
+
+    async def run():
+        key, gen = parts_cache.part_key(1), parts_cache.part_generation_key(1)
+        await parts_cache.read_through_async(key, slow_load, 60, generation=gen)
+        assert redis.get(key) is None
+        return await parts_cache.read_through_async(key, fresh_load, 60, generation=gen)
+    assert asyncio.run(run()) == {'id': 1, 'title': 'new'}
+
+
+def test_listing_pages_follow_the_version(redis):
+    version = parts_cache.list_version()
+    key = parts_cache.list_page_key(version, 100, None)
+    parts_cache.read_through(key, lambda: {'items': [1]}, 60)
+    parts_cache.bump_listing()
+    assert parts_cache.list_page_key(parts_cache.list_version(), 100, None) != key
+
+
+def test_redis_down_falls_back_to_loader(monkeypatch):
+    def broken():
+        raise ConnectionError("down")
+    monkeypatch.setattr(parts_cache, 'ENABLED', True)
+    monkeypatch.setattr(parts_cache, '_down_until', 0.0)
+    monkeypatch.setattr(parts_cache, 'get_redis', broken)
+    assert get_part(1, lambda: {'id': 1}) == {'id': 1}
+    assert parts_cache.list_version() is None
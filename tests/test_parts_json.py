@@ -0,0 +1,59 @@
+import datetime
+
+import pytest
+
+parts_json = pytest.importorskip('parts_json')
+flask = pytest.importorskip('flask')
+
+parts_service = parts_json.parts_service
+HEAD = (None,) * parts_json.HEAD
+
+FIELDS = parts_service.PART_FIELDS
+ROWS = [
+    HEAD + (1, 'Brake pads', 'Front "axle"\nset', 1999, 'Nairobi', None, 'a@example.com', '+254 700 000000',
+            datetime.datetime(2024, 6, 1, 12, 0, 0), None),
+    HEAD + (2, 'Caf\u00e9 \u2603 \U0001f697', '', 0, None, '/static/thumbs/x.jpg', None, None,
+            None, datetime.datetime(2024, 6, 2, 8, 30, 15, 250000)),
+]
+
+
+def jsonify_text(obj):
+    app = flask.Flask(__name__)
+    with app.app_context():
+        return flask.jsonify(obj).get_data(as_text=True)
+
+
+def projected(fields):
+    idx = [parts_json.HEAD + FIELDS.index(f) for f in fields]
+    return [HEAD + tuple(r[i] for i in idx) for r in ROWS]
+
+
+@pytest.fixture(params=[True, False], ids=['fast', 'dicts'])
+def fast(request, monkeypatch):
+    monkeypatch.setattr(parts_json, 'FAST', request.param)
+
+
+@pytest.mark.parametrize('fields', [FIELDS, ('price', 'id', 'title'), ('updated_at',)])
+def test_page_body_matches_jsonify(fast, fields):
+    rows = projected(fields)
+    dicts = [parts_json.row_dict(fields, r) for r in rows]
+    expected = jsonify_text({'items': dicts, 'next': 'abc'})
+    assert parts_json.page_body(fields, rows, 'abc') == expected
+
+
+def test_page_body_with_facets_matches_jsonify(fast):
+    facets = {'location': [{'value': 'Nairobi', 'count': 3}]}
+    dicts = [parts_json.row_dict(FIELDS, r) for r in ROWS]
+    expected = jsonify_text({'facets': facets, 'items': dicts, 'next': None})
+    assert parts_json.page_body(FIELDS, ROWS, None, facets) == expected
+
+
+def test_list_body_matches_jsonify(fast):
+    dicts = [parts_json.row_dict(FIELDS, r) for r in ROWS]
+    assert parts_json.list_body(FIELDS, ROWS) == jsonify_text(dicts)
+
+
+def test_row_dict_matches_row_to_dict():
+    # A full projection is the same part dict the unprojected path builds.
+    for row in ROWS:
+        assert parts_json.row_dict(FIELDS, row) == parts_service._row_to_dict(row[parts_json.HEAD:])